@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+On-disk caches shared by the alignment benchmarks.
+
+Entries are content-addressed by the SHA-256 of their input files, so the
+same reference is only indexed once no matter where it lives or how many
+benchmark processes ask for it.
+"""
+
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Root of all caches; override with BRIGX_CACHE_DIR
+DEFAULT_CACHE_DIR = Path(os.environ.get('BRIGX_CACHE_DIR', Path.home() / '.cache' / 'brigx'))
+
+# Help for the --cache-dir option of the CLIs that use these caches
+CACHE_DIR_HELP = 'Directory for cached BLAST databases and hits (default: $BRIGX_CACHE_DIR or ~/.cache/brigx)'
+
+# Size limit for the BLAST database cache before LRU eviction kicks in
+DEFAULT_BLAST_DB_CACHE_BYTES = 2 * 1024**3
+
+# Spill files: magic, format version, JSON header length, runtime and record
+# count, then the JSON header (the records' dtype), padded to 8 bytes, then
+# the raw records
+SPILL_MAGIC = b'BRIGHITS'
+SPILL_VERSION = 1
+_SPILL_PREFIX = struct.Struct('<8sIIdQ')
+
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str, compute: Callable[[], str] = None) -> str:
+    """Return the SHA-256 of a file's contents, memoized on (path, size, mtime).
+
+    If the hash is not memoized yet and compute is given, it is called
+    instead of reading the file and must return the hash, so a caller that
+    reads the whole file anyway can hash it in the same pass.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        if compute is not None:
+            _hash_memo[memo_key] = compute()
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+@contextmanager
+def locked(lock_path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on lock_path for the duration of the block.
+
+    Lock files may be unlinked by their holder (see BlastDbCache.evict), so
+    a lock taken on a file that is no longer at lock_path is dropped and
+    taken again on the new one.
+    """
+    while True:
+        lock_file = open(lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            current = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            break
+        lock_file.close()
+    with lock_file:
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """Return the first line of a tool's version banner, or 'unknown'."""
+    flag = '-version' if tool.startswith(('blast', 'makeblastdb')) else '--version'
+    try:
+        result = subprocess.run([tool, flag], capture_output=True, text=True)
+    except OSError:
+        return 'unknown'
+    output = (result.stdout or result.stderr).strip()
+    return output.splitlines()[0] if output else 'unknown'
+
+
+def command_key(cmd: List[str], inputs: Dict[str, Path], ignore_options: Iterable[str] = (),
+                format: int = 0) -> str:
+    """Key identifying the output of an aligner command.
+
+    The key covers the tool, its version and the full argument list.
+    inputs maps argument strings (file or database paths) to the file whose
+    contents they stand for; they are replaced by content hashes, so moving
+    or renaming a genome does not change the key. Options in
+    ignore_options are dropped along with their value, for settings such
+    as thread counts that do not change the output.
+    """
+    ignore_options = set(ignore_options)
+    args = []
+    skip = False
+    for arg in cmd[1:]:
+        if skip:
+            skip = False
+        elif arg in ignore_options:
+            skip = True
+        elif arg in inputs:
+            args.append(file_sha256(inputs[arg]))
+        else:
+            args.append(arg)
+    payload = json.dumps({'format': format, 'tool': cmd[0],
+                          'version': tool_version(cmd[0]), 'args': args})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+class BlastDbCache:
+    """Content-addressed cache of makeblastdb output with LRU eviction.
+
+    Each reference gets a directory named after the hash of its contents.
+    Databases are built in a private temporary directory and published with
+    an atomic rename, while a per-entry lock stops two processes building
+    the same database at once. Entries are touched on every use and the
+    least recently used ones are evicted once the cache exceeds max_bytes.
+
+    Every entry returned by get stays pinned, with a shared lock on its
+    .pin file, until it is released (see release and close).
+    Eviction skips pinned entries, whether this cache or another process
+    pinned them, so a database is never removed while blastn may still
+    read it. Evicted entries take their .lock and .pin files with them.
+    """
+
+    def __init__(self, cache_dir: Path = None, max_bytes: int = DEFAULT_BLAST_DB_CACHE_BYTES):
+        self.root = Path(cache_dir or DEFAULT_CACHE_DIR) / 'blast_db'
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Open .pin files holding a shared lock, and how many gets have not
+        # been released yet, by entry key
+        self._pins: Dict[str, IO] = {}
+        self._pin_counts: Dict[str, int] = {}
+
+    def get(self, reference_file: str) -> Path:
+        """Return the database path for reference_file, building it on a miss.
+
+        The entry stays pinned until the path is passed to release.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        key = file_sha256(reference_file)
+        entry = self.root / key
+
+        with locked(self.root / f'{key}.lock'):
+            self._pin(key)
+            if entry.is_dir():
+                self.hits += 1
+            else:
+                self.misses += 1
+                print(f"  Creating BLAST database...")
+                build_dir = Path(tempfile.mkdtemp(dir=self.root, prefix='.tmp-'))
+                os.chmod(build_dir, 0o755)
+                try:
+                    subprocess.run([
+                        'makeblastdb',
+                        '-in', str(reference_file),
+                        '-dbtype', 'nucl',
+                        '-out', str(build_dir / 'db')
+                    ], check=True, capture_output=True)
+                    os.rename(build_dir, entry)
+                except BaseException:
+                    shutil.rmtree(build_dir, ignore_errors=True)
+                    raise
+            os.utime(entry)
+
+        self.evict()
+        return entry / 'db'
+
+    def _pin(self, key: str):
+        """Take a shared lock on an entry's .pin file (call with the entry lock held)."""
+        if key not in self._pins:
+            pin_file = open(self.root / f'{key}.pin', 'a')
+            fcntl.flock(pin_file, fcntl.LOCK_SH)
+            self._pins[key] = pin_file
+        self._pin_counts[key] = self._pin_counts.get(key, 0) + 1
+
+    def release(self, db_path: Path):
+        """Release a database path returned by get.
+
+        Once every get of its entry has been released, the entry is unpinned
+        and the cache is evicted down to max_bytes.
+        """
+        key = Path(db_path).parent.name
+        if key not in self._pins:
+            return
+        self._pin_counts[key] -= 1
+        if self._pin_counts[key] == 0:
+            del self._pin_counts[key]
+            self._pins.pop(key).close()
+            self.evict()
+
+    def close(self):
+        """Unpin every entry this cache still has pinned."""
+        for pin_file in self._pins.values():
+            pin_file.close()
+        self._pins.clear()
+        self._pin_counts.clear()
+
+    def evict(self):
+        """Remove least recently used unpinned entries until the cache fits in max_bytes."""
+        if not self.root.is_dir():
+            return
+        with locked(self.root / '.evict.lock'):
+            entries = [p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.')]
+            entries.sort(key=lambda p: p.stat().st_mtime)
+            total = sum(_dir_size(p) for p in entries)
+
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                size = _dir_size(entry)
+                lock_path, pin_path = self.root / f'{entry.name}.lock', self.root / f'{entry.name}.pin'
+                with locked(lock_path), open(pin_path, 'a') as pin_file:
+                    try:
+                        fcntl.flock(pin_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # In use here or by another process
+                    shutil.rmtree(entry, ignore_errors=True)
+                    # Pins are only taken under the entry lock, so no one can be waiting on this one;
+                    # processes waiting on the lock file notice it is gone and lock a new one
+                    pin_path.unlink()
+                    lock_path.unlink()
+                total -= size
+
+
+class SpillWriter:
+    """Writes a structured array to a binary spill file chunk by chunk.
+
+    Chunks go straight to disk as they are appended, so a long hit table
+    never has to be held in memory to be cached. The file is written under
+    a temporary name and only appears at its final path on commit.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix='.tmp-', suffix='.hits')
+        self.file = os.fdopen(fd, 'wb')
+        self.dtype = None
+        self.header_length = 0
+        self.count = 0
+
+    def append(self, records: np.ndarray):
+        """Write records (all appended arrays must share a dtype)."""
+        if self.dtype is None:
+            self.dtype = records.dtype
+            header = json.dumps({'descr': np.lib.format.dtype_to_descr(records.dtype)}).encode()
+            header += b' ' * (-(_SPILL_PREFIX.size + len(header)) % 8)
+            self.header_length = len(header)
+            self.file.write(_SPILL_PREFIX.pack(SPILL_MAGIC, SPILL_VERSION, self.header_length, 0.0, 0))
+            self.file.write(header)
+        elif records.dtype != self.dtype:
+            raise ValueError(f"Spill records are {self.dtype}, not {records.dtype}")
+        self.file.write(np.ascontiguousarray(records).tobytes())
+        self.count += len(records)
+
+    def commit(self, runtime: float, dtype: np.dtype) -> np.ndarray:
+        """Finish the file, move it into place and return its records memory-mapped.
+
+        dtype is used for the header if nothing was appended.
+        """
+        if self.dtype is None:
+            self.append(np.empty(0, dtype=dtype))
+        self.file.seek(0)
+        self.file.write(_SPILL_PREFIX.pack(SPILL_MAGIC, SPILL_VERSION, self.header_length, runtime, self.count))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        return read_spill(self.path)[0]
+
+    def discard(self):
+        """Abandon the file."""
+        self.file.close()
+        os.unlink(self.tmp_path)
+
+
+def write_spill(path: Path, records: np.ndarray, runtime: float):
+    """Atomically write records and the runtime that produced them as a spill file."""
+    writer = SpillWriter(path)
+    try:
+        writer.append(records)
+        writer.commit(runtime, records.dtype)
+    except BaseException:
+        writer.discard()
+        raise
+
+
+def read_spill(path: Path) -> Tuple[np.ndarray, float]:
+    """Return (records, runtime) from a spill file; records are memory-mapped, not read."""
+    with open(path, 'rb') as f:
+        magic, version, header_length, runtime, count = _SPILL_PREFIX.unpack(f.read(_SPILL_PREFIX.size))
+        if magic != SPILL_MAGIC or version != SPILL_VERSION:
+            raise ValueError(f"{path} is not a version {SPILL_VERSION} spill file")
+        header = json.loads(f.read(header_length))
+    dtype = np.dtype(np.lib.format.descr_to_dtype(header['descr']))
+    if count == 0:
+        return np.empty(0, dtype=dtype), runtime
+    records = np.memmap(path, dtype=dtype, mode='r', offset=_SPILL_PREFIX.size + header_length, shape=(count,))
+    return records, runtime
+
+
+class HitCache:
+    """On-disk cache of parsed hit tables, stored as compressed .npz files.
+
+    The key covers the tool, its version and the full argument list, with
+    input file paths replaced by their content hashes so that moving or
+    renaming a genome does not invalidate its results. A parameter sweep
+    therefore only runs BLAST once: its command never changes, so every
+    later run loads its hits.
+
+    With spill=True new entries are written as uncompressed spill files
+    instead (see SpillWriter): larger on disk, but written while the
+    aligner runs and memory-mapped rather than decompressed on load.
+    Entries in either format are found by load.
+    """
+
+    # Bump whenever the layout of stored hit tables changes
+    FORMAT = 4
+
+    def __init__(self, cache_dir: Path = None, spill: bool = False):
+        self.root = Path(cache_dir or DEFAULT_CACHE_DIR) / 'hits'
+        self.spill = spill
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, cmd: List[str], inputs: Dict[str, Path],
+            ignore_options: Iterable[str] = ()) -> str:
+        """Build a cache key for cmd (see command_key)."""
+        return command_key(cmd, inputs, ignore_options, self.FORMAT)
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, float]]:
+        """Return (hits, runtime) stored under key, or None on a miss."""
+        spill_path = self.root / f'{key}.hits'
+        path = self.root / f'{key}.npz'
+        if spill_path.exists():
+            hits, runtime = read_spill(spill_path)
+        elif path.exists():
+            with np.load(path) as data:
+                hits, runtime = data['hits'], float(data['runtime'])
+        else:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return hits, runtime
+
+    def spill_writer(self, key: str) -> SpillWriter:
+        """Writer for hits under key, to append to while the aligner runs (spill mode)."""
+        return SpillWriter(self.root / f'{key}.hits')
+
+    def store(self, key: str, hits: np.ndarray, runtime: float):
+        """Atomically write a hit table and the runtime that produced it."""
+        if self.spill:
+            write_spill(self.root / f'{key}.hits', hits, runtime)
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, hits=hits, runtime=runtime)
+            os.replace(tmp_path, self.root / f'{key}.npz')
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class SketchCache:
+    """On-disk cache of genome k-mer sketches, one .npy file per genome and settings.
+
+    Entries are keyed by the genome's content hash and a settings string
+    (such as the k-mer size), so a sketch is computed once per file no
+    matter how many pairs it takes part in.
+    """
+
+    def __init__(self, cache_dir: Path = None):
+        self.root = Path(cache_dir or DEFAULT_CACHE_DIR) / 'sketches'
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, settings: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Return the sketch of path for settings, calling compute() on a miss."""
+        entry = self.root / f'{file_sha256(path)}-{settings}.npy'
+        if entry.exists():
+            self.hits += 1
+            return np.load(entry)
+
+        self.misses += 1
+        sketch = compute()
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, sketch)
+            os.replace(tmp_path, entry)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return sketch
+
+
+class ResultManifest:
+    """Record of completed all-vs-all jobs and pair metrics, for incremental reruns.
+
+    manifest.json maps each job's key (command_key of the aligner command
+    it runs, so it covers the reference and query hashes, the tool, its
+    version and the parameters) to a description of the job and its
+    runtime; the job's per-base result is stored next to it as <key>.npz.
+    Pair metrics are stored in the manifest too, under a key combining the
+    keys of the jobs they were computed from. A rerun only has to run the
+    jobs and compute the metrics that are missing, so adding a genome to N
+    others costs N pairs of alignments.
+    """
+
+    # Bump whenever the layout of stored results or metrics changes
+    FORMAT = 3
+
+    def __init__(self, cache_dir: Path = None):
+        self.root = Path(cache_dir or DEFAULT_CACHE_DIR) / 'results'
+        self.path = self.root / 'manifest.json'
+        self.jobs, self.metrics = self._read()
+        self.reused = 0
+        self.computed = 0
+        self.metrics_reused = 0
+
+    def _read(self) -> Tuple[Dict[str, Dict], Dict[str, Dict[str, float]]]:
+        """Jobs and metrics recorded on disk (none if the manifest is missing or outdated)."""
+        if not self.path.exists():
+            return {}, {}
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get('format') != self.FORMAT:
+            return {}, {}
+        return data['jobs'], data['metrics']
+
+    def job_key(self, cmd: List[str], inputs: Dict[str, Path], ignore_options: Iterable[str] = ()) -> str:
+        """Key of the job running cmd (see command_key)."""
+        return command_key(cmd, inputs, ignore_options, self.FORMAT)
+
+    def metrics_key(self, *job_keys: str, **settings) -> str:
+        """Key of the metrics computed from the results of job_keys with settings."""
+        payload = json.dumps({'format': self.FORMAT, 'jobs': job_keys, 'settings': settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def load_job(self, key: str) -> Optional[Tuple[Dict[str, np.ndarray], float]]:
+        """Return (arrays, runtime) stored for a job, or None if it has not been run."""
+        path = self.root / f'{key}.npz'
+        if key not in self.jobs or not path.exists():
+            return None
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        self.reused += 1
+        return arrays, self.jobs[key]['runtime']
+
+    def store_job(self, key: str, description: Dict, runtime: float, arrays: Dict[str, np.ndarray]):
+        """Atomically write a job's result arrays and record it with its runtime."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, self.root / f'{key}.npz')
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.jobs[key] = {**description, 'runtime': runtime}
+        self.computed += 1
+
+    def load_metrics(self, key: str) -> Optional[Dict[str, float]]:
+        """Return the metrics stored under key, or None."""
+        metrics = self.metrics.get(key)
+        if metrics is not None:
+            self.metrics_reused += 1
+        return metrics
+
+    def store_metrics(self, key: str, metrics: Dict[str, float]):
+        """Record metrics under key (lists and dicts, such as histograms, as they are)."""
+        self.metrics[key] = {name: value if isinstance(value, (list, dict)) else float(value)
+                             for name, value in metrics.items()}
+
+    def save(self):
+        """Write the manifest, merged with entries other runs have saved since it was read."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with locked(self.root / 'manifest.lock'):
+            jobs, metrics = self._read()
+            self.jobs = {**jobs, **self.jobs}
+            self.metrics = {**metrics, **self.metrics}
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix='.json')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({'format': self.FORMAT, 'jobs': self.jobs, 'metrics': self.metrics}, f, indent=1)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Asyncio runner for the all-vs-all benchmark, with timeouts and early cancellation.
+
+Aligner output is read through the event loop and parsed chunk by chunk
+in threads as it arrives, so a single event loop drives up to
+--concurrency BLAST and LASTZ processes at once. Every job has a wall-time
+limit; a job that exceeds it is killed and its pair counted as timed out.
+
+Jobs are queued pair by pair, and each pair's comparison is printed as soon
+as its BLAST and LASTZ runs are in, with a running summary of its parameter
+set. A parameter set must reach a mean bases_same_identity of --target
+over all pairs, counting pairs that do not complete as 0%. Once it cannot,
+even if every remaining pair matched BLAST perfectly, its remaining LASTZ
+jobs are cancelled, along with any BLAST jobs no parameter set still needs.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from alignment_cache import CACHE_DIR_HELP, BlastDbCache, HitCache
+from benchmark_alignment import (BLAST_COLUMNS, CHUNK_SIZE, HIT_DTYPE, PARAM_SETS,
+                                 SIMILARITY_TARGET, AlignmentBenchmark, CompactIdentity, _parse_hit_lines,
+                                 print_comparison, print_summary)
+from profiling import RSS_UNIT_BYTES
+
+# Wall-time limit of a single aligner job, in seconds
+DEFAULT_TIMEOUT = 600.0
+
+
+async def _stream_hits_async(benchmark: AlignmentBenchmark, cmd: List[str], usecols: Tuple[int, ...],
+                             delimiter: str, keep: List[np.ndarray], format: str = 'tabular'):
+    """Run an aligner, appending chunks of hits to keep as its output arrives.
+
+    Chunks are parsed in a thread so the event loop keeps serving the
+    other jobs. As in AlignmentBenchmark._stream_hits, the process is
+    reaped with os.wait4 (in a thread) and its resource usage appended to
+    benchmark.child_usage. The process is killed if the coroutine is
+    cancelled (on a timeout, for instance). Raises
+    subprocess.CalledProcessError if the aligner exits with a non-zero
+    status.
+    """
+    start, wall_start = time.time(), time.perf_counter()
+    # Not asyncio's subprocess: its child watcher would reap the aligner without its resource usage
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    transports = []
+    stderr = None
+    try:
+        stdout = await _pipe_reader(process.stdout, transports)
+        # Drain stderr alongside stdout so a chatty aligner cannot block on it
+        stderr = asyncio.ensure_future((await _pipe_reader(process.stderr, transports)).read())
+        partial = b''
+        while True:
+            block = await stdout.read(CHUNK_SIZE)
+            if not block:
+                break
+            block = partial + block
+            cut = block.rfind(b'\n') + 1
+            partial = block[cut:]
+            if cut:
+                await asyncio.to_thread(_parse_block, benchmark, block[:cut], usecols, delimiter, keep, format)
+        if partial:
+            await asyncio.to_thread(_parse_block, benchmark, partial, usecols, delimiter, keep, format)
+        _, status, usage = await asyncio.to_thread(os.wait4, process.pid, 0)
+        process.returncode = returncode = os.waitstatus_to_exitcode(status)
+        benchmark.child_usage.append(usage)
+        stderr_text = await stderr
+    finally:
+        if stderr is not None:
+            stderr.cancel()
+        for transport in transports:
+            transport.close()
+        # Pipes not yet handed to a transport (closing twice is harmless)
+        process.stdout.close()
+        process.stderr.close()
+        if process.poll() is None:
+            process.kill()
+            await asyncio.to_thread(process.wait)
+    benchmark.profiler.record('aligner', start, time.perf_counter() - wall_start, usage.ru_utime + usage.ru_stime,
+                              benchmark._input_bytes(cmd), usage.ru_maxrss * RSS_UNIT_BYTES,
+                              tid=process.pid, tool=cmd[0])
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr_text.decode(errors='replace'))
+
+
+async def _pipe_reader(pipe, transports: List[asyncio.BaseTransport]) -> asyncio.StreamReader:
+    """Wrap a subprocess pipe in a StreamReader on the running loop.
+
+    The pipe's transport is appended to transports; closing it closes the pipe.
+    """
+    reader = asyncio.StreamReader()
+    transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    transports.append(transport)
+    return reader
+
+
+def _parse_block(benchmark: AlignmentBenchmark, block: bytes, usecols: Tuple[int, ...], delimiter: str,
+                 keep: List[np.ndarray], format: str = 'tabular'):
+    """Parse whole lines of aligner output into hits and append them to keep."""
+    with benchmark.profiler.span('parse', len(block)):
+        hits = _parse_hit_lines(block.decode().splitlines(keepends=True), usecols, delimiter,
+                                benchmark.reference, None, format)
+    if hits is not None:
+        keep.append(hits)
+
+
+async def _run_cached_async(benchmark: AlignmentBenchmark, cmd: List[str], inputs: Dict[str, Path],
+                            usecols: Tuple[int, ...], delimiter: str = None, timeout: float = None,
+                            ignore_options: Tuple[str, ...] = (),
+                            format: str = 'tabular') -> Tuple[np.ndarray, float]:
+    """Async counterpart of AlignmentBenchmark._run_cached.
+
+    Cached hits are reused; otherwise cmd is run with a limit of timeout
+    seconds (asyncio.TimeoutError when it is exceeded) and its hits are
+    cached. Accumulation runs in a thread so the event loop keeps serving
+    the other jobs. Returns (identity_vector, runtime).
+    """
+    hit_cache = benchmark.hit_cache
+    key = None
+    if hit_cache is not None:
+        key = hit_cache.key(cmd, inputs, ignore_options)
+        cached = hit_cache.load(key)
+        if cached is not None:
+            hits, runtime = cached
+            identity_vector, _ = await asyncio.to_thread(benchmark._accumulate, [hits])
+            return identity_vector, runtime
+
+    keep = []
+    start_time = time.time()
+    await asyncio.wait_for(_stream_hits_async(benchmark, cmd, usecols, delimiter, keep, format), timeout)
+    runtime = time.time() - start_time
+    hits = np.concatenate(keep) if keep else np.empty(0, dtype=HIT_DTYPE)
+    if key is not None:
+        hit_cache.store(key, hits, runtime)
+    identity_vector, _ = await asyncio.to_thread(benchmark._accumulate, [hits])
+    return identity_vector, runtime
+
+
+async def run_blast_async(benchmark: AlignmentBenchmark, threads: int = 4, db_path: Path = None,
+                          timeout: float = None) -> Tuple[np.ndarray, float]:
+    """Async run_blast: the same command, hit cache and database handling, with a wall-time limit."""
+    if db_path is None:
+        db_path = await asyncio.to_thread(benchmark.make_blast_db)
+        try:
+            return await run_blast_async(benchmark, threads, db_path, timeout)
+        finally:
+            benchmark.db_cache.release(db_path)
+    cmd = benchmark.blast_command(db_path, threads)
+    inputs = {str(db_path): benchmark.reference_file, str(benchmark.query_file): benchmark.query_file}
+    return await _run_cached_async(benchmark, cmd, inputs, BLAST_COLUMNS, '\t', timeout,
+                                   ignore_options=('-num_threads',))
+
+
+async def run_lastz_async(benchmark: AlignmentBenchmark, params: Dict[str, str] = None,
+                          timeout: float = None) -> Tuple[np.ndarray, float]:
+    """Async run_lastz (whole reference only): the same command and hit cache, with a wall-time limit."""
+    cmd = benchmark.lastz_command(params)
+    inputs = {cmd[1]: benchmark.reference_file, cmd[2]: benchmark.query_file}
+    return await _run_cached_async(benchmark, cmd, inputs, benchmark.lastz_columns, timeout=timeout,
+                                   format=benchmark.lastz_hit_format)
+
+
+def best_achievable(scores: List[float], n_pairs: int) -> float:
+    """Highest mean bases_same_identity still possible with scores known and the other pairs at 100%."""
+    return (sum(scores) + 100.0 * (n_pairs - len(scores))) / n_pairs
+
+
+async def run_all_vs_all_async(genomes: List[Path], param_sets: Dict[str, Dict[str, str]],
+                               concurrency: int = None, cores: int = None,
+                               timeout: float = DEFAULT_TIMEOUT, target: float = SIMILARITY_TARGET,
+                               db_cache: BlastDbCache = None,
+                               hit_cache: HitCache = None) -> Dict[str, List[Dict]]:
+    """Run every (parameter set x pair x tool) job on one event loop.
+
+    Returns results in the shape of run_all_vs_all, plus a 'status' per
+    result: 'ok', 'timeout', 'failed' (the aligner exited with an error,
+    or the job raised any other exception) or 'cancelled' (its parameter
+    set could no longer reach target).
+    """
+    cores = cores or os.cpu_count() or 1
+    if concurrency and concurrency > cores:
+        print(f"Warning: concurrency {concurrency} requested but the core budget is {cores}; "
+              f"running at most {cores} jobs at once")
+    concurrency = max(1, min(concurrency or cores, cores))
+    blast_threads = max(1, cores // concurrency)
+    pairs = [(ref, query) for i, ref in enumerate(genomes) for query in genomes[i+1:]]
+
+    # Queued pair by pair, so complete comparisons (and cancellations) come early
+    jobs = []
+    for ref, query in pairs:
+        jobs.append(('blast', None, ref, query))
+        jobs += [('lastz', name, ref, query) for name in param_sets]
+    print(f"Running {len(jobs)} jobs, {concurrency} at a time "
+          f"({blast_threads} BLAST thread(s) per job, {timeout:.0f}s limit each)\n")
+
+    db_cache = db_cache or BlastDbCache()
+    db_paths = {}
+    for ref, query in pairs:
+        if ref not in db_paths:
+            db_paths[ref] = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache).make_blast_db()
+    print(f"BLAST database cache: {db_cache.hits} hit(s), {db_cache.misses} built\n")
+    # Each database is released once the last BLAST job that reads it is done
+    blast_jobs_left = {ref: sum(1 for pair_ref, _ in pairs if pair_ref == ref) for ref in db_paths}
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_job(tool, param_name, ref, query):
+        async with semaphore:
+            benchmark = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache, hit_cache=hit_cache)
+            print(f"Started {tool}{f' [{param_name}]' if param_name else ''}: {query.name} vs {ref.name}")
+            if tool == 'blast':
+                return await run_blast_async(benchmark, blast_threads, db_paths[ref], timeout)
+            return await run_lastz_async(benchmark, param_sets[param_name], timeout)
+
+    tasks = {asyncio.ensure_future(run_job(*job)): job for job in jobs}
+    outputs = {}    # job -> (CompactIdentity, runtime), or the status of a job that did not finish
+    results = {name: {} for name in param_sets}
+    scores = {name: [] for name in param_sets}
+    cancelled_sets = set()
+
+    def cancel_set(name):
+        cancelled_sets.add(name)
+        for task, (tool, param_name, ref, query) in tasks.items():
+            if param_name == name and not task.done():
+                task.cancel()
+        # BLAST jobs only the cancelled parameter sets were waiting for
+        for task, (tool, param_name, ref, query) in tasks.items():
+            if tool == 'blast' and not task.done() and all(
+                    name in cancelled_sets or (ref, query) in results[name] for name in param_sets):
+                task.cancel()
+
+    async def finish_pair(name, ref, query):
+        blast, lastz = outputs.get(('blast', None, ref, query)), outputs.get(('lastz', name, ref, query))
+        if blast is None or lastz is None or (ref, query) in results[name]:
+            return
+        result = {'reference': ref.name, 'query': query.name, 'status': 'ok'}
+        if isinstance(blast, str) or isinstance(lastz, str):
+            result['status'] = blast if isinstance(blast, str) else lastz
+            scores[name].append(0.0)
+            print(f"\n[{name}] {query.name} vs {ref.name}: {result['status']}")
+        else:
+            (blast_vector, blast_time), (lastz_vector, lastz_time) = blast, lastz
+            benchmark = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache, hit_cache=hit_cache)
+            metrics = await asyncio.to_thread(benchmark.compare_vectors, blast_vector, lastz_vector)
+            print(f"\n{'='*60}")
+            print(f"Benchmarking [{name}]: {ref.name} vs {query.name}")
+            print(f"Reference length: {benchmark.reference_length:,} bp")
+            benchmark.print_results(blast_time, lastz_time, metrics)
+            result.update({'blast_time': blast_time, 'lastz_time': lastz_time,
+                           'speedup': blast_time / lastz_time, 'metrics': metrics,
+                           'blast_vector': blast_vector, 'lastz_vector': lastz_vector})
+            scores[name].append(metrics['bases_same_identity'])
+        results[name][(ref, query)] = result
+
+        best = best_achievable(scores[name], len(pairs))
+        print(f"[{name}] {len(scores[name])}/{len(pairs)} pair(s) done: mean same identity so far "
+              f"{np.mean(scores[name]):.2f}%, best achievable {best:.2f}%")
+        if best < target and name not in cancelled_sets and len(scores[name]) < len(pairs):
+            print(f"[{name}] Cannot reach {target:.1f}% any more; cancelling its remaining jobs")
+            cancel_set(name)
+
+    start_time = time.time()
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                job = tool, param_name, ref, query = tasks[task]
+                if tool == 'blast':
+                    blast_jobs_left[ref] -= 1
+                    if blast_jobs_left[ref] == 0:
+                        db_cache.release(db_paths[ref])
+                if task.cancelled():
+                    outputs[job] = 'cancelled'
+                    continue
+                try:
+                    # Kept compact, as run_all_vs_all does, so memory does not grow with every pair
+                    identity_vector, runtime = task.result()
+                    outputs[job] = CompactIdentity.from_vector(identity_vector), runtime
+                except asyncio.TimeoutError:
+                    print(f"  {tool}{f' [{param_name}]' if param_name else ''} {query.name} vs {ref.name}: "
+                          f"timed out after {timeout:.0f}s")
+                    outputs[job] = 'timeout'
+                except subprocess.CalledProcessError as e:
+                    print(f"  {tool}{f' [{param_name}]' if param_name else ''} {query.name} vs {ref.name}: "
+                          f"exited with code {e.returncode}")
+                    outputs[job] = 'failed'
+                except Exception as e:
+                    # Anything else (unparsable output, a missing tool...) fails only this job
+                    print(f"  {tool}{f' [{param_name}]' if param_name else ''} {query.name} vs {ref.name}: "
+                          f"failed: {e!r}")
+                    outputs[job] = 'failed'
+                for name in (param_sets if tool == 'blast' else [param_name]):
+                    if name not in cancelled_sets:
+                        await finish_pair(name, ref, query)
+    finally:
+        for ref, db_path in db_paths.items():
+            if blast_jobs_left[ref]:
+                db_cache.release(db_path)
+    print(f"\nAll jobs finished in {time.time() - start_time:.2f}s wall time")
+
+    # Pairs of cancelled parameter sets that never got a result
+    all_results = {}
+    for name in param_sets:
+        all_results[name] = [results[name].get((ref, query), {'reference': ref.name, 'query': query.name,
+                                                               'status': 'cancelled'})
+                             for ref, query in pairs]
+    return all_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Maximum aligner processes at once (default: number of cores)')
+    parser.add_argument('--cores', type=int, default=None,
+                        help='Total core budget shared by jobs and BLAST threads (default: all)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'Wall-time limit per aligner job in seconds (default: {DEFAULT_TIMEOUT:.0f})')
+    parser.add_argument('--target', type=float, default=SIMILARITY_TARGET,
+                        help=f'Mean bases_same_identity (%%) a parameter set must reach (default: {SIMILARITY_TARGET:.0f})')
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    parser.add_argument('--spill-hits', action='store_true',
+                        help='Cache hits as uncompressed spill files written while the aligner runs')
+    parser.add_argument('--no-hit-cache', action='store_true',
+                        help='Always re-run the aligners instead of reusing cached hits')
+    args = parser.parse_args()
+
+    genomes = sorted(Path('examples').glob('E_coli_*.fna'))
+    print(f"Found {len(genomes)} E. coli genomes:")
+    for genome in genomes:
+        print(f"  - {genome.name}")
+
+    hit_cache = None if args.no_hit_cache else HitCache(args.cache_dir, spill=args.spill_hits)
+    db_cache = BlastDbCache(args.cache_dir)
+    try:
+        all_results = asyncio.run(run_all_vs_all_async(
+            genomes, PARAM_SETS, concurrency=args.concurrency, cores=args.cores, timeout=args.timeout,
+            target=args.target, db_cache=db_cache, hit_cache=hit_cache))
+    finally:
+        db_cache.close()
+
+    for param_name, results in all_results.items():
+        print_summary(param_name, results, args.target)
+
+    print(f"\n{'#'*60}")
+    print("# FINAL COMPARISON")
+    print(f"{'#'*60}\n")
+    print_comparison(all_results)
+    if hit_cache is not None:
+        print(f"\nAlignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Micro-benchmark per-hit slice adds vs prefix-sum identity accumulation."""
+
+import argparse
+import io
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+from benchmark_alignment import (AlignmentBenchmark, IdentityAccumulator,
+                                 read_hit_chunks, BLAST_COLUMNS, BLASTN_COLUMNS)
+
+
+def load_hits(benchmark: AlignmentBenchmark, hits_file: str, fmt: str) -> np.ndarray:
+    """Load hits from a saved output file, or run BLAST once to produce them."""
+    if hits_file:
+        text = Path(hits_file).read_text()
+    else:
+        print(f"Running BLAST once: {benchmark.query_file.name} vs {benchmark.reference_file.name}")
+        with benchmark.blast_db() as db_path:
+            result = subprocess.run(benchmark.blast_command(db_path), check=True,
+                                    capture_output=True, text=True)
+        text = result.stdout
+        fmt = 'blast'
+    
+    if fmt == 'blast':
+        chunks = read_hit_chunks(io.StringIO(text), BLAST_COLUMNS, delimiter='\t',
+                                 reference=benchmark.reference)
+    else:
+        chunks = read_hit_chunks(io.StringIO(text), BLASTN_COLUMNS, reference=benchmark.reference)
+    return np.concatenate(list(chunks))
+
+
+def time_mode(benchmark: AlignmentBenchmark, hits: np.ndarray, mode: str, repeats: int):
+    """Accumulate all hits in the given mode; return best-of-N time and vectors."""
+    starts, ends = benchmark.reference.hit_ranges(hits)
+    length = benchmark.reference_length
+    
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        accumulator = IdentityAccumulator(length, mode)
+        accumulator.add(starts, ends, hits['pident'])
+        identity_vector, hit_count = accumulator.finish()
+        times.append(time.perf_counter() - start_time)
+    return min(times), identity_vector, hit_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    parser.add_argument('--query', default='examples/E_coli_K12MG1655.fna')
+    parser.add_argument('--hits', help='Saved aligner output to reuse instead of running BLAST')
+    parser.add_argument('--format', choices=['blast', 'blastn'], default='blast',
+                        help='Format of --hits: BLAST -outfmt 6 or LASTZ --format=BLASTN')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    benchmark = AlignmentBenchmark(args.reference, args.query)
+    hits = load_hits(benchmark, args.hits, args.format)
+    length = benchmark.reference_length
+    
+    aligned_bases = int(np.sum(np.abs(hits['send'] - hits['sstart']) + 1))
+    print(f"\nReference length: {length:,} bp")
+    print(f"Hits: {len(hits):,} ({aligned_bases:,} aligned bases, "
+          f"{aligned_bases / length:.1f}x reference length)\n")
+    
+    slice_time, slice_identity, slice_count = time_mode(benchmark, hits, 'slice', args.repeats)
+    prefix_time, prefix_identity, prefix_count = time_mode(benchmark, hits, 'prefix', args.repeats)
+    
+    print(f"{'Mode':<10} | {'Best time':>10}")
+    print("-"*25)
+    print(f"{'slice':<10} | {slice_time*1000:>8.1f}ms")
+    print(f"{'prefix':<10} | {prefix_time*1000:>8.1f}ms")
+    print(f"\nSpeedup: {slice_time / prefix_time:.1f}x")
+    
+    print(f"\nHit counts identical: {np.array_equal(slice_count, prefix_count)}")
+    print(f"Coverage identical:   {np.array_equal(slice_identity > 0, prefix_identity > 0)}")
+    print(f"Max identity difference: {np.max(np.abs(slice_identity - prefix_identity)):.2e}% "
+          f"(float32 rounding of the per-hit sums)")
+
+
+if __name__ == '__main__':
+    main()
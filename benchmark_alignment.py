@@ -4,96 +4,996 @@ Benchmark LASTZ vs BLAST alignment quality and runtime.
 Compares per-base identity across the reference genome.
 """
 
+import argparse
+import hashlib
+import io
+import mmap
+import math
+import multiprocessing
+import os
 import subprocess
+import tempfile
 import time
 import re
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, TextIO, Tuple, Union
 import numpy as np
 
+from alignment_cache import CACHE_DIR_HELP, BlastDbCache, HitCache, ResultManifest, file_sha256, tool_version
+from genome_sketch import DEFAULT_K, GenomePrefilter, canonical_kmers, encode_2bit
+from profiling import RSS_UNIT_BYTES, StageProfiler, profiled
+
+# Columns the benchmark needs from each hit, in the order they are loaded.
+# contig is the hit's reference sequence as an index into ReferenceIndex;
+# query is its query sequence, indexed the same way in batch runs (else 0).
+# qstart and qend are the query range as the tool reports it; strand is 1
+# if the query aligns to the reference's forward strand and -1 if to its
+# reverse complement.
+HIT_DTYPE = np.dtype([
+    ('contig', np.int32),
+    ('query', np.int32),
+    ('sstart', np.int64),
+    ('send', np.int64),
+    ('pident', np.float64),
+    ('length', np.int64),
+    ('qstart', np.int64),
+    ('qend', np.int64),
+    ('strand', np.int8),
+])
+_VALUE_DTYPE = np.dtype([(name, HIT_DTYPE[name]) for name in HIT_DTYPE.names[2:-1]])
+
+# Positions of (sseqid, sstart, send, pident, length, qstart, qend) in each tool's tabular output
+BLAST_COLUMNS = (1, 6, 7, 2, 3, 4, 5)   # -outfmt '6 qseqid sseqid pident length qstart qend sstart send ...'
+BLASTN_COLUMNS = (1, 8, 9, 2, 3, 6, 7)  # LASTZ --format=BLASTN: query subject %id alnlen mismatches gaps qstart qend sstart send ...
+
+# Position of the query sequence name, which both formats put first
+QUERY_COLUMN = 0
+
+# LASTZ --format=general fields: only the target name and range, the query
+# name, strand and forward-strand range, and the percent identity (printed
+# with a trailing '%')
+LASTZ_GENERAL_FIELDS = ('name1', 'start1', 'end1', 'name2', 'strand2', 'start2+', 'end2+', 'id%')
+LASTZ_GENERAL_FORMAT = 'general:' + ','.join(LASTZ_GENERAL_FIELDS)
+
+# Formats read_hit_chunks parses: 'tabular' picks columns by usecols
+# (BLAST -outfmt 6, LASTZ --format=BLASTN), 'general' is LASTZ general
+# output with LASTZ_GENERAL_FIELDS (see load_general_hits)
+HIT_FORMATS = ('tabular', 'general')
+
+# Output formats run_lastz can request. 'blastn' (the default) is what the
+# app's alignment worker parses. 'general' is opt-in: less text to write and
+# parse, but id% has only 0.1% resolution and length is the target span
+# rather than the alignment length, so metrics can differ slightly
+LASTZ_FORMATS = ('blastn', 'general')
+
+# LASTZ_GENERAL_FIELDS as load_general_hits converts them, in one np.loadtxt pass
+_GENERAL_DTYPE = np.dtype([
+    ('name1', object),
+    ('start1', np.int64),
+    ('end1', np.int64),
+    ('name2', object),
+    ('strand2', 'U1'),
+    ('start2', np.int64),
+    ('end2', np.int64),
+    ('pident', np.float64),
+])
+
+# Bytes of output read and converted per chunk (about 600 hits); small
+# enough that accumulation keeps pace with a running aligner, and no
+# slower to parse than larger chunks
+CHUNK_SIZE = 1 << 16
+
+# Seconds between progress lines while an aligner is still producing hits
+PROGRESS_INTERVAL = 10.0
+
+# Reference bases each chunked-LASTZ window extends past its core on either
+# side; hits shorter than this are never truncated by a window edge
+DEFAULT_WINDOW_OVERLAP = 10000
+
+# Mean bases_same_identity (%) a parameter set must reach to match BLAST
+SIMILARITY_TARGET = 95.0
+
+# LASTZ parameter sets compared against BLAST by the all-vs-all benchmarks
+PARAM_SETS = {
+    'default': {},  # No special parameters - use LASTZ defaults
+    'current': {
+        'ambiguous': 'iupac',
+        'noentropy': True,
+        'notransition': True,
+        'seed': 'match14',
+        'step': '10',
+        'maxwordcount': '90%',
+        'masking': '10',
+        'hspthresh': 'top50%'
+    }
+}
+
+# Help for the repeatable --lastz-param option of the CLIs that run LASTZ
+# (see parse_lastz_params)
+LASTZ_PARAM_HELP = 'LASTZ option, repeatable (e.g. --lastz-param seed=match14 --lastz-param gapped)'
+
+# Name under which run_all_vs_all files LASTZ jobs for pairs the prefilter
+# routes to its cheap parameters
+CHEAP_PARAM_SET = '(cheap)'
+
+# Identity (%) of one CompactIdentity code step; 100% is code 50000
+IDENTITY_STEP = 0.002
+
+# Window sizes (bp) at which compare_vectors reports windowed agreement
+DEFAULT_WINDOW_SIZES = (100, 1000, 10000)
+
+# Reference bases compare_blocks decodes and compares at a time; a multiple
+# of every window size, so no window straddles two blocks
+COMPARE_BLOCK_SIZE = 1_000_000
+
+# Window size (bp) and number of the disagreement hot spots compare_blocks reports
+HOTSPOT_WINDOW = 10000
+N_HOTSPOTS = 10
+
+# compare_blocks' identity histograms have one bin per percent, [i, i + 1),
+# with 100% in the last bin
+N_IDENTITY_BINS = 100
+
+# Preview mode: number and size (bp) of the reference regions it aligns,
+# and the GC-content quantile strata they are drawn from (each split again
+# into repetitive and unique regions)
+PREVIEW_REGIONS = 24
+PREVIEW_REGION_SIZE = 10000
+PREVIEW_GC_STRATA = 3
+
+# A region is repetitive when at least this fraction of its k-mers also
+# occur elsewhere in the reference
+REPETITIVE_FRACTION = 0.05
+
+# Normal quantile of the preview's error bars (95% intervals)
+PREVIEW_Z = 1.96
+
+# Metrics the preview extrapolates, as (numerator, denominator, scale) of
+# the per-region totals it sums
+PREVIEW_METRICS = {
+    'blast_coverage': ('blast', 'length', 100),
+    'lastz_coverage': ('lastz', 'length', 100),
+    'overlap_coverage': ('both', 'length', 100),
+    'bases_same_identity': ('same', 'both', 100),
+    'mean_abs_diff': ('abs_diff', 'both', 1),
+}
+
+# Per-region statistics used to stratify the reference for preview mode
+REGION_STATS_DTYPE = np.dtype([
+    ('start', np.int64),
+    ('end', np.int64),
+    ('gc', np.float64),
+    ('repeat', np.float64),
+    ('stratum', np.int32),
+])
+
+# Per-window statistics, mirroring WindowData in lib/types.ts
+WINDOW_DTYPE = np.dtype([
+    ('start', np.int64),
+    ('end', np.int64),
+    ('avgIdentity', np.float32),
+    ('coverage', np.float32),
+    ('hitCount', np.int32),
+    ('maxIdentity', np.float32),
+])
+
+# ReferenceIndex objects by file content hash
+_reference_memo: Dict[str, 'ReferenceIndex'] = {}
+
+# Bytes of a FASTA file ReferenceIndex hashes and counts at a time
+FASTA_SCAN_BLOCK = 1 << 20
+
+# Class of every byte value in FASTA sequence lines: 0 whitespace or control
+# character (not a base), 1 G/C, 2 A/T/U, 3 N, 4 any other (ambiguous) base
+_BASE_CLASSES = np.full(256, 4, dtype=np.uint8)
+_BASE_CLASSES[:ord(' ') + 1] = 0
+for _bases, _base_class in (('GCgc', 1), ('ATUatu', 2), ('Nn', 3)):
+    _BASE_CLASSES[list(_bases.encode())] = _base_class
+
+# Subject IDs BLAST reports for databases built without -parse_seqids
+_BLAST_ORDINAL_ID = re.compile(r'^(?:gnl\|)?BL_ORD_ID\|(\d+)$')
+
+
+class ReferenceIndex:
+    """Contig layout and base composition of a reference FASTA.
+    
+    Contigs are laid end to end in file order; offsets[i] is the global
+    0-based position of the first base of contig i. gc_counts, n_counts and
+    ambiguous_counts (IUPAC codes other than N) are per contig.
+    """
+    
+    def __init__(self, names: List[str], lengths: List[int], gc_counts: List[int] = None,
+                 n_counts: List[int] = None, ambiguous_counts: List[int] = None):
+        self.names = np.array(names, dtype=str)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths)[:-1])).astype(np.int64)
+        self.total_length = int(self.lengths.sum())
+        zeros = [0] * len(names)
+        self.gc_counts = np.array(zeros if gc_counts is None else gc_counts, dtype=np.int64)
+        self.n_counts = np.array(zeros if n_counts is None else n_counts, dtype=np.int64)
+        self.ambiguous_counts = np.array(zeros if ambiguous_counts is None else ambiguous_counts,
+                                         dtype=np.int64)
+        self._name_order = np.argsort(self.names, kind='stable')
+        self._sorted_names = self.names[self._name_order]
+    
+    @classmethod
+    def from_fasta(cls, fasta_file: str) -> 'ReferenceIndex':
+        """Index a FASTA file, memoized on the hash of its contents.
+        
+        If the file has not been hashed yet, it is hashed in the same pass
+        as it is indexed.
+        """
+        scanned = []
+        
+        def scan() -> str:
+            digest = hashlib.sha256()
+            scanned.append(cls._scan_fasta(fasta_file, digest))
+            return digest.hexdigest()
+        
+        key = file_sha256(fasta_file, scan)
+        if key not in _reference_memo:
+            _reference_memo[key] = scanned[0] if scanned else cls._scan_fasta(fasta_file)
+        return _reference_memo[key]
+    
+    @classmethod
+    def _scan_fasta(cls, fasta_file: str, digest=None) -> 'ReferenceIndex':
+        """Build the index in one pass over a memory-mapped FASTA file, feeding digest if given."""
+        with open(fasta_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls([], [])
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return cls._index_buffer(buffer, digest)
+    
+    @classmethod
+    def _index_buffer(cls, buffer: Union[bytes, mmap.mmap], digest=None) -> 'ReferenceIndex':
+        """Index FASTA content held in a bytes-like buffer, feeding digest if given.
+        
+        The buffer is read once, FASTA_SCAN_BLOCK bytes at a time: each
+        block is hashed, searched for headers, and the byte values of its
+        sequence lines are counted per contig. Only the 256 counts of each
+        contig are classified, through _BASE_CLASSES, so no temporary
+        grows with the file.
+        """
+        def next_header(position: int) -> int:
+            """Position of the first header starting after a newline at or after position."""
+            newline = buffer.find(b'\n>', position)
+            return newline + 1 if newline >= 0 else len(buffer)
+        
+        # Sequence before the first header is kept as an unnamed contig if it holds any bases
+        names = ['']
+        counts = [np.zeros(256, dtype=np.int64)]
+        # Start of the current run of sequence bytes (past the end of a header still being skipped)
+        sequence_start = 0
+        # '>' only starts a header at the beginning of a line
+        header = 0 if buffer[:1] == b'>' else next_header(0)
+        for block_start in range(0, len(buffer), FASTA_SCAN_BLOCK):
+            block_end = min(block_start + FASTA_SCAN_BLOCK, len(buffer))
+            with memoryview(buffer)[block_start:block_end] as view:
+                if digest is not None:
+                    digest.update(view)
+                block = np.frombuffer(view, dtype=np.uint8).copy()
+            while header < block_end:
+                if sequence_start < header:
+                    counts[-1] += np.bincount(block[max(sequence_start, block_start) - block_start:
+                                                    header - block_start], minlength=256)
+                header_end = buffer.find(b'\n', header)
+                header_end = header_end if header_end >= 0 else len(buffer)
+                fields = bytes(buffer[header + 1:header_end]).split(maxsplit=1)
+                names.append(fields[0].decode(errors='replace') if fields else '')
+                counts.append(np.zeros(256, dtype=np.int64))
+                sequence_start = header_end + 1
+                header = next_header(header_end)
+            if sequence_start < block_end:
+                counts[-1] += np.bincount(block[max(sequence_start, block_start) - block_start:],
+                                          minlength=256)
+        
+        # Byte value counts to class counts, one column per class
+        counts = np.array(counts) @ np.eye(5, dtype=np.int64)[_BASE_CLASSES]
+        gc_counts, at_counts, n_counts, ambiguous_counts = counts[:, 1:].T
+        lengths = counts[:, 1:].sum(axis=1)
+        if lengths[0] == 0:
+            names = names[1:]
+            lengths, gc_counts, n_counts, ambiguous_counts = (
+                lengths[1:], gc_counts[1:], n_counts[1:], ambiguous_counts[1:])
+        return cls(names, lengths, gc_counts, n_counts, ambiguous_counts)
+    
+    @property
+    def gc_content(self) -> float:
+        """GC fraction of unambiguous (ACGT) bases across all contigs."""
+        acgt = int(self.lengths.sum() - self.n_counts.sum() - self.ambiguous_counts.sum())
+        return int(self.gc_counts.sum()) / acgt if acgt else 0.0
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def contig_ids(self, seqids: np.ndarray) -> np.ndarray:
+        """Map subject sequence IDs to contig indices with a vectorized lookup."""
+        seqids = np.asarray(seqids, dtype=str)
+        if len(self) == 0 or len(seqids) == 0:
+            return np.zeros(len(seqids), dtype=np.int32)
+        
+        pos = np.minimum(np.searchsorted(self._sorted_names, seqids), len(self) - 1)
+        ids = self._name_order[pos].astype(np.int32)
+        missing = self._sorted_names[pos] != seqids
+        
+        for seqid in np.unique(seqids[missing]):
+            match = _BLAST_ORDINAL_ID.match(seqid)
+            if match is None or int(match.group(1)) >= len(self):
+                raise ValueError(f"Hit on sequence {str(seqid)!r}, which is not in the reference")
+            ids[seqids == seqid] = int(match.group(1))
+        return ids
+    
+    def hit_ranges(self, hits: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return 0-based, half-open global [starts, ends) for HIT_DTYPE hits."""
+        offsets = self.offsets[hits['contig']] if len(self) else 0
+        # Handle reverse strand
+        starts = offsets + np.minimum(hits['sstart'], hits['send']) - 1  # Convert to 0-based
+        ends = offsets + np.maximum(hits['sstart'], hits['send'])
+        return starts, ends
+
+
+def read_hit_chunks(stream: TextIO, usecols: Tuple[int, ...], delimiter: str = None,
+                    chunk_size: int = CHUNK_SIZE, reference: ReferenceIndex = None,
+                    queries: ReferenceIndex = None, profiler: StageProfiler = None,
+                    format: str = 'tabular') -> Iterator[np.ndarray]:
+    """Read hit output in chunks and yield HIT_DTYPE arrays.
+    
+    format is one of HIT_FORMATS; usecols and delimiter only apply to
+    'tabular' output.
+    
+    Only about chunk_size bytes of text are held at once; each chunk is
+    converted column-wise by np.loadtxt instead of line by line. Subject
+    IDs are resolved against reference, or all assigned to contig 0 if no
+    reference is given; query IDs likewise against queries. If profiler is
+    given, converting each chunk is recorded as a 'parse' span (waiting for
+    the text is not).
+    """
+    while True:
+        lines = stream.readlines(chunk_size)
+        if not lines:
+            break
+        with profiler.span('parse', sum(map(len, lines))) if profiler is not None else nullcontext():
+            hits = _parse_hit_lines(lines, usecols, delimiter, reference, queries, format)
+        if hits is not None:
+            yield hits
+
+
+def _parse_hit_lines(lines: List[str], usecols: Tuple[int, ...], delimiter: str,
+                     reference: ReferenceIndex, queries: ReferenceIndex,
+                     format: str = 'tabular') -> np.ndarray:
+    """Convert one chunk of read_hit_chunks' lines to hits (None if it has none)."""
+    if format not in HIT_FORMATS:
+        raise ValueError(f"Unknown hit format: {format} (expected one of {HIT_FORMATS})")
+    lines = [line for line in lines if line.strip() and not line.startswith('#')]
+    if not lines:
+        return None
+    if format == 'general':
+        return load_general_hits(''.join(lines), reference, queries)
+    
+    values = np.loadtxt(lines, usecols=usecols[1:], delimiter=delimiter,
+                        dtype=_VALUE_DTYPE, comments=None, ndmin=1)
+    hits = np.empty(len(values), dtype=HIT_DTYPE)
+    for name in _VALUE_DTYPE.names:
+        hits[name] = values[name]
+    # BLAST reverses the subject range on the minus strand, LASTZ the query range
+    hits['strand'] = np.where((values['qstart'] > values['qend']) != (values['sstart'] > values['send']), -1, 1)
+    if reference is None:
+        hits['contig'] = 0
+    else:
+        seqids = np.loadtxt(lines, usecols=usecols[0], delimiter=delimiter,
+                            dtype=str, comments=None, ndmin=1)
+        hits['contig'] = reference.contig_ids(seqids)
+    if queries is None:
+        hits['query'] = 0
+    else:
+        seqids = np.loadtxt(lines, usecols=QUERY_COLUMN, delimiter=delimiter,
+                            dtype=str, comments=None, ndmin=1)
+        hits['query'] = queries.contig_ids(seqids)
+    return hits
+
+
+def load_general_hits(text: str, reference: ReferenceIndex = None,
+                      queries: ReferenceIndex = None) -> np.ndarray:
+    """Load LASTZ general output (LASTZ_GENERAL_FIELDS, tab-separated) as HIT_DTYPE hits.
+    
+    All columns, names included, are converted in a single np.loadtxt pass
+    into a structured array once the '%' signs are stripped. start1 and
+    end1 are 1-based and inclusive on the target's forward strand, like
+    BLAST's sstart and send; length is the target span (end1 - start1 + 1),
+    not the alignment length BLASTN output reports, and id% is rounded to
+    0.1%. start2+ and end2+ are the query range on its forward strand
+    whichever strand2 is. Names are resolved as in read_hit_chunks.
+    """
+    values = np.loadtxt(io.StringIO(text.replace('%', '')), delimiter='\t',
+                        dtype=_GENERAL_DTYPE, comments='#', ndmin=1)
+    hits = np.empty(len(values), dtype=HIT_DTYPE)
+    hits['sstart'] = values['start1']
+    hits['send'] = values['end1']
+    hits['pident'] = values['pident']
+    hits['length'] = values['end1'] - values['start1'] + 1
+    hits['qstart'] = values['start2']
+    hits['qend'] = values['end2']
+    hits['strand'] = np.where(values['strand2'] == '-', -1, 1)
+    hits['contig'] = 0 if reference is None else reference.contig_ids(values['name1'])
+    hits['query'] = 0 if queries is None else queries.contig_ids(values['name2'])
+    return hits
+
+
+def _kept(hit_chunks: Iterable[np.ndarray], keep: List[np.ndarray]) -> Iterator[np.ndarray]:
+    """Pass chunks through unchanged, appending each one to keep."""
+    for hits in hit_chunks:
+        keep.append(hits)
+        yield hits
+
+
+def _reported(hit_chunks: Iterable[np.ndarray], interval: float = PROGRESS_INTERVAL) -> Iterator[np.ndarray]:
+    """Pass chunks through unchanged, printing the running hit count every interval seconds."""
+    start_time = last_report = time.time()
+    n_hits = 0
+    for hits in hit_chunks:
+        n_hits += len(hits)
+        now = time.time()
+        if now - last_report >= interval:
+            print(f"  ... {n_hits:,} hits parsed after {now - start_time:.0f}s")
+            last_report = now
+        yield hits
+
+
+def read_reference_bases(fasta_file: str) -> bytes:
+    """All sequences of a FASTA file joined end to end, in ReferenceIndex's global coordinates."""
+    with open(fasta_file, 'rb') as f:
+        return b''.join(b''.join(line.split()) for line in f if not line.startswith(b'>'))
+
+
+def stratify_reference(sequence: bytes, reference: ReferenceIndex, region_size: int = PREVIEW_REGION_SIZE,
+                       gc_strata: int = PREVIEW_GC_STRATA, k: int = DEFAULT_K) -> np.ndarray:
+    """Tile each contig into region_size regions and assign each region a stratum.
+    
+    Returns REGION_STATS_DTYPE regions (0-based, half-open global
+    positions). Only whole regions are kept, so contigs shorter than
+    region_size are left out. gc is the region's GC fraction of ACGT bases
+    and repeat the fraction of its canonical k-mers found more than once
+    in the reference. The stratum combines the GC quantile (of gc_strata)
+    with whether the region is repetitive (see REPETITIVE_FRACTION).
+    """
+    starts = np.concatenate([np.arange(offset, offset + length - region_size + 1, region_size)
+                             for offset, length in zip(reference.offsets, reference.lengths)] or [[]])
+    regions = np.zeros(len(starts), dtype=REGION_STATS_DTYPE)
+    regions['start'] = starts
+    regions['end'] = starts + region_size
+    if len(regions) == 0:
+        return regions
+    
+    codes = encode_2bit(sequence)
+    tiled = codes[(starts[:, None] + np.arange(region_size)).ravel()].reshape(len(starts), region_size)
+    acgt = np.maximum((tiled < 4).sum(axis=1), 1)
+    regions['gc'] = ((tiled == 1) | (tiled == 2)).sum(axis=1) / acgt
+    
+    # k-mers within each region, counted across the whole reference
+    kmers = [canonical_kmers(region, k) for region in tiled]
+    n_kmers = np.array([len(region_kmers) for region_kmers in kmers])
+    _, inverse, counts = np.unique(np.concatenate(kmers), return_inverse=True, return_counts=True)
+    repeated = np.concatenate([[0], np.cumsum(counts[inverse] > 1)])
+    ends = np.cumsum(n_kmers)
+    np.divide(repeated[ends] - repeated[ends - n_kmers], n_kmers, out=regions['repeat'], where=n_kmers > 0)
+    
+    edges = np.quantile(regions['gc'], np.linspace(0, 1, gc_strata + 1)[1:-1])
+    regions['stratum'] = (np.searchsorted(edges, regions['gc'], side='right') * 2
+                          + (regions['repeat'] >= REPETITIVE_FRACTION))
+    return regions
+
+
+def sample_strata(strata: np.ndarray, n_samples: int, seed: int = 0) -> np.ndarray:
+    """Pick n_samples indexes into strata, stratified and without replacement.
+    
+    Samples are allocated in proportion to stratum size, with at least two
+    per stratum (where it has two) so every stratum's variance can be
+    estimated. Returns the picked indexes in position order.
+    """
+    rng = np.random.default_rng(seed)
+    labels, sizes = np.unique(strata, return_counts=True)
+    allocation = np.minimum(sizes, np.maximum(2, np.round(n_samples * sizes / sizes.sum()).astype(np.int64)))
+    picked = [rng.choice(np.flatnonzero(strata == label), size=n, replace=False)
+              for label, n in zip(labels, allocation)]
+    return np.sort(np.concatenate(picked))
+
+
+def stratified_ratio(numerator: np.ndarray, denominator: np.ndarray, strata: np.ndarray,
+                     stratum_sizes: Dict[int, int]) -> Tuple[float, float]:
+    """Estimate a ratio of population totals from a stratified sample, with its standard error.
+    
+    Each stratum's total is its sample mean times its size (stratum_sizes,
+    in units); the standard error linearizes the ratio and includes the
+    finite population correction. Strata sampled once contribute no
+    variance.
+    """
+    total_numerator = total_denominator = 0.0
+    for label, size in stratum_sizes.items():
+        in_stratum = strata == label
+        total_numerator += size * numerator[in_stratum].mean()
+        total_denominator += size * denominator[in_stratum].mean()
+    if total_denominator == 0:
+        return 0.0, 0.0
+    ratio = total_numerator / total_denominator
+    
+    variance = 0.0
+    residuals = numerator - ratio * denominator
+    for label, size in stratum_sizes.items():
+        sampled = residuals[strata == label]
+        if len(sampled) > 1:
+            variance += size ** 2 * (1 - len(sampled) / size) * sampled.var(ddof=1) / len(sampled)
+    return ratio, np.sqrt(variance) / total_denominator
+
+
+def write_batch_query(query_files: List[Path], batch_file: Path) -> List[int]:
+    """Concatenate query FASTA files into batch_file for a single batch alignment.
+    
+    Sequence j of query i is renamed q<i>_<j>, so names cannot clash
+    between genomes and every hit can be traced back to its query file.
+    Returns the number of sequences taken from each query.
+    """
+    counts = []
+    with open(batch_file, 'w') as out:
+        for i, query_file in enumerate(query_files):
+            count = 0
+            with open(query_file) as f:
+                for line in f:
+                    if line.startswith('>'):
+                        out.write(f'>q{i}_{count}\n')
+                        count += 1
+                    elif line.strip():
+                        out.write(line if line.endswith('\n') else line + '\n')
+            counts.append(count)
+    return counts
+
+
+class IdentityAccumulator:
+    """Accumulate hits into per-base identity and hit count vectors.
+    
+    'slice' mode adds each hit to every base it covers, which costs
+    O(sum of alignment lengths); it is the default, and matches the
+    original per-hit parsers bit for bit. 'prefix' mode records each hit
+    as +/- events at its start and end and rebuilds both vectors with one
+    cumsum, which costs O(hits + reference length). Its identity events
+    are kept in integer thousandths of a percent, so its sums are exact
+    where slice mode rounds to float32 after every add: hit counts and
+    coverage are identical, but identities differ by up to about 1e-5%,
+    which can move a base across compare_vectors' 1% threshold.
+    """
+    
+    MODES = ('slice', 'prefix')
+    
+    def __init__(self, length: int, mode: str = 'slice'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown accumulation mode: {mode} (expected one of {self.MODES})")
+        self.length = length
+        self.mode = mode
+        if mode == 'prefix':
+            self.identity_events = np.zeros(length + 1, dtype=np.int64)
+            self.count_events = np.zeros(length + 1, dtype=np.int64)
+        else:
+            self.identity_vector = np.zeros(length, dtype=np.float32)
+            self.hit_count = np.zeros(length, dtype=np.int32)
+    
+    def add(self, starts: np.ndarray, ends: np.ndarray, pident: np.ndarray):
+        """Add hits covering the 0-based, half-open ranges [starts, ends)."""
+        if self.mode == 'prefix':
+            starts = np.clip(starts, 0, self.length)
+            ends = np.clip(ends, starts, self.length)
+            milli = np.rint(pident * 1000).astype(np.int64)
+            np.add.at(self.identity_events, starts, milli)
+            np.subtract.at(self.identity_events, ends, milli)
+            np.add.at(self.count_events, starts, 1)
+            np.subtract.at(self.count_events, ends, 1)
+        else:
+            for start, end, value in zip(starts, ends, pident.astype(np.float32)):
+                self.identity_vector[start:end] += value
+                self.hit_count[start:end] += 1
+    
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (identity_vector, hit_count), averaging identity where hits overlap."""
+        if self.mode == 'prefix':
+            hit_count = np.cumsum(self.count_events[:-1]).astype(np.int32)
+            identity_sum = np.cumsum(self.identity_events[:-1])
+            identity_vector = np.zeros(self.length, dtype=np.float32)
+            mask = hit_count > 0
+            identity_vector[mask] = identity_sum[mask] / (hit_count[mask] * 1000.0)
+            return identity_vector, hit_count
+        
+        # Average identity for bases covered by multiple hits
+        mask = self.hit_count > 0
+        self.identity_vector[mask] /= self.hit_count[mask]
+        return self.identity_vector, self.hit_count
+
+
+def aggregate_windows(identity_vector: np.ndarray, window_sizes: Iterable[int] = DEFAULT_WINDOW_SIZES,
+                      hit_count: np.ndarray = None,
+                      hit_ranges: Tuple[np.ndarray, np.ndarray] = None) -> Dict[int, np.ndarray]:
+    """Aggregate a per-base identity vector into WINDOW_DTYPE windows of each size.
+    
+    Follows aggregateToWindows in workers/processing.worker.ts: windows
+    tile [0, length) with a short last window. Given the 0-based,
+    half-open hit_ranges, coverage is computed as the worker does, from
+    the bases of each hit inside the window summed over hits and capped at
+    1, so overlapping hits count their shared bases once each; hitCount is
+    the number of hits overlapping the window. Without hit_ranges,
+    coverage is distinct covered bases over the window size and hitCount
+    is 0.
+    
+    avgIdentity is weighted by aligned length: by hit length when
+    hit_count (per-base depth) is given, otherwise each covered base
+    counts once. The worker's running average stops adding weight once a
+    window's coverage reaches 1, so its avgIdentity can differ where hits
+    pile up. maxIdentity is the highest per-base identity in the window,
+    so where hits overlap it is their mean rather than the single best hit.
+    
+    The per-base data is scanned once, at the smallest window size, with
+    np.add.reduceat; each larger size that is a multiple of the previous
+    one is reduced from the windows below it instead of from the bases.
+    """
+    length = len(identity_vector)
+    covered = identity_vector > 0
+    weight = hit_count.astype(np.float64) if hit_count is not None else covered.astype(np.float64)
+    
+    if hit_ranges is not None:
+        sorted_starts = np.sort(hit_ranges[0])
+        sorted_ends = np.sort(hit_ranges[1])
+        start_sums = np.concatenate(([0], np.cumsum(sorted_starts)))
+        end_sums = np.concatenate(([0], np.cumsum(sorted_ends)))
+        
+        def aligned_before(positions):
+            # Bases of all hits before each position: a hit [s, e) adds
+            # x - s once it starts before x, less x - e once it has ended
+            started = np.searchsorted(sorted_starts, positions, side='left')
+            ended = np.searchsorted(sorted_ends, positions, side='left')
+            return positions * (started - ended) - start_sums[started] + end_sums[ended]
+    
+    results = {}
+    level = None  # (size, covered, weight, weighted identity, max identity) of the previous size
+    for size in sorted(set(window_sizes)):
+        if level is not None and size % level[0] == 0:
+            prev_size, *prev_sums = level
+            groups = np.arange(0, len(prev_sums[0]), size // prev_size)
+            covered_sum, weight_sum, identity_sum = (np.add.reduceat(x, groups) for x in prev_sums[:3])
+            max_identity = np.maximum.reduceat(prev_sums[3], groups)
+        elif length > 0:
+            bounds = np.arange(0, length, size)
+            covered_sum = np.add.reduceat(covered, bounds, dtype=np.int64)
+            weight_sum = np.add.reduceat(weight, bounds)
+            identity_sum = np.add.reduceat(identity_vector * weight, bounds)
+            max_identity = np.maximum.reduceat(identity_vector, bounds)
+        else:
+            covered_sum = weight_sum = identity_sum = max_identity = np.zeros(0)
+        level = (size, covered_sum, weight_sum, identity_sum, max_identity)
+        
+        windows = np.zeros(len(covered_sum), dtype=WINDOW_DTYPE)
+        windows['start'] = np.arange(len(windows), dtype=np.int64) * size
+        windows['end'] = np.minimum(windows['start'] + size, length)
+        avg_identity = np.zeros(len(windows))
+        np.divide(identity_sum, weight_sum, out=avg_identity, where=weight_sum > 0)
+        windows['avgIdentity'] = avg_identity
+        windows['maxIdentity'] = max_identity
+        if hit_ranges is not None:
+            aligned = aligned_before(windows['end']) - aligned_before(windows['start'])
+            windows['coverage'] = np.minimum(1, aligned / size)
+            # Hits [s, e) overlap [start, end) when s < end and e > start
+            windows['hitCount'] = (np.searchsorted(sorted_starts, windows['end'], side='left')
+                                   - np.searchsorted(sorted_ends, windows['start'], side='right'))
+        else:
+            windows['coverage'] = np.minimum(1, covered_sum / size)
+        results[size] = windows
+    return results
+
+
+class CompactIdentity:
+    """Per-base identity stored as a coverage bitmap plus fixed-point identities of covered bases.
+    
+    Coverage is packed eight bases to a byte; the identity of each covered
+    base is a uint16 count of IDENTITY_STEP (0.002%) steps, so decoding is
+    within 0.001% of the accumulated value, finer than the three decimals
+    BLAST and LASTZ report. That is 1/8 + 2 x coverage bytes per base, at
+    most 2.125 (1.925 at 90% coverage) against 4 for a float32 identity vector.
+    """
+    
+    def __init__(self, covered_bits: np.ndarray, codes: np.ndarray, length: int):
+        self.covered_bits = covered_bits
+        self.codes = codes
+        self.length = length
+    
+    @classmethod
+    def from_vector(cls, identity_vector: np.ndarray) -> 'CompactIdentity':
+        """Compact a per-base identity vector; bases with identity > 0 are covered."""
+        covered = identity_vector > 0
+        # At least one step, so a covered base never decodes as uncovered
+        codes = np.maximum(np.rint(identity_vector[covered] / IDENTITY_STEP), 1).astype(np.uint16)
+        return cls(np.packbits(covered), codes, len(identity_vector))
+    
+    def __len__(self) -> int:
+        return self.length
+    
+    @property
+    def nbytes(self) -> int:
+        return self.covered_bits.nbytes + self.codes.nbytes
+    
+    def covered(self) -> np.ndarray:
+        """Return the per-base coverage mask."""
+        return np.unpackbits(self.covered_bits, count=self.length).view(bool)
+    
+    def identity(self) -> np.ndarray:
+        """Decode to a float32 per-base identity vector (0 where uncovered)."""
+        identity_vector = np.zeros(self.length, dtype=np.float32)
+        identity_vector[self.covered()] = self.codes * np.float32(IDENTITY_STEP)
+        return identity_vector
+    
+    def identity_blocks(self, start: int, end: int, block_size: int) -> Iterator[np.ndarray]:
+        """Decode positions [start, end) as float32 identity blocks of block_size bases.
+        
+        Only one block is unpacked at a time; blocks may start anywhere in a byte.
+        """
+        # Codes of the bases covered before start, counted a block of bytes at a time
+        code_offset = 0
+        for byte in range(0, start // 8, block_size):
+            code_offset += int(np.unpackbits(self.covered_bits[byte:min(byte + block_size, start // 8)]).sum())
+        if start % 8:
+            code_offset += int(np.unpackbits(self.covered_bits[start // 8:start // 8 + 1], count=start % 8).sum())
+        for block_start in range(start, end, block_size):
+            block_end = min(block_start + block_size, end)
+            # Unpack from the byte holding block_start, then drop the bits before it
+            skip = block_start % 8
+            covered = np.unpackbits(self.covered_bits[block_start // 8:(block_end + 7) // 8],
+                                    count=skip + block_end - block_start)[skip:].view(bool)
+            n_covered = int(covered.sum())
+            block = np.zeros(block_end - block_start, dtype=np.float32)
+            block[covered] = self.codes[code_offset:code_offset + n_covered] * np.float32(IDENTITY_STEP)
+            code_offset += n_covered
+            yield block
+
+
+def identity_blocks(vector: Union[np.ndarray, CompactIdentity], start: int, end: int,
+                    block_size: int) -> Iterator[np.ndarray]:
+    """Yield positions [start, end) of either representation in blocks of block_size bases.
+    
+    Blocks of an array are views; a CompactIdentity is decoded a block at a time.
+    """
+    if isinstance(vector, CompactIdentity):
+        yield from vector.identity_blocks(start, end, block_size)
+    else:
+        for block_start in range(start, end, block_size):
+            yield vector[block_start:min(block_start + block_size, end)]
+
+
+def _merge_comoments(a: Tuple[float, ...], b: Tuple[float, ...]) -> Tuple[float, ...]:
+    """Combine (n, mean_x, mean_y, m2_x, m2_y, c_xy) moments of two samples (Chan et al.)."""
+    n_a, mean_xa, mean_ya, m2_xa, m2_ya, c_a = a
+    n_b, mean_xb, mean_yb, m2_xb, m2_yb, c_b = b
+    n = n_a + n_b
+    if n_a == 0 or n_b == 0:
+        return a if n_b == 0 else b
+    dx, dy = mean_xb - mean_xa, mean_yb - mean_ya
+    weight = n_a * n_b / n
+    return (n, mean_xa + dx * n_b / n, mean_ya + dy * n_b / n,
+            m2_xa + m2_xb + dx * dx * weight, m2_ya + m2_yb + dy * dy * weight,
+            c_a + c_b + dx * dy * weight)
+
+
 class AlignmentBenchmark:
-    def __init__(self, reference_file: str, query_file: str):
+    def __init__(self, reference_file: str, query_file: str, accumulation: str = 'slice',
+                 db_cache: BlastDbCache = None, hit_cache: HitCache = None,
+                 profiler: StageProfiler = None, lastz_format: str = 'blastn'):
+        if lastz_format not in LASTZ_FORMATS:
+            raise ValueError(f"Unknown LASTZ format: {lastz_format} (expected one of {LASTZ_FORMATS})")
         self.reference_file = Path(reference_file)
         self.query_file = Path(query_file)
-        self.reference_length = self._get_fasta_length(reference_file)
-        
-    def _get_fasta_length(self, fasta_file: str) -> int:
-        """Get total sequence length from FASTA file."""
-        total_length = 0
-        with open(fasta_file) as f:
-            for line in f:
-                if not line.startswith('>'):
-                    total_length += len(line.strip())
-        return total_length
-    
-    def run_blast(self) -> Tuple[np.ndarray, float]:
-        """Run BLAST and return per-base identity vector and runtime."""
-        print(f"Running BLAST: {self.query_file.name} vs {self.reference_file.name}")
+        self.accumulation = accumulation
+        self.lastz_format = lastz_format
+        # How to parse the LASTZ output requested by lastz_command
+        self.lastz_hit_format = 'general' if lastz_format == 'general' else 'tabular'
+        self.lastz_columns = BLASTN_COLUMNS
+        self.db_cache = db_cache or BlastDbCache()
+        self.hit_cache = hit_cache
+        # Spans of every stage run by this benchmark (see profiling.py)
+        self.profiler = profiler or StageProfiler()
+        with self.profiler.span('scan_fasta', os.path.getsize(reference_file), file=self.reference_file.name):
+            self.reference = ReferenceIndex.from_fasta(reference_file)
+        self.reference_length = self.reference.total_length
+        # os.wait4 resource usage of every aligner process run so far
+        self.child_usage = []
+        # HIT_DTYPE hits behind the most recent run, for exporting
+        self.last_hits = None
+    
+    @profiled('make_blast_db', lambda self: os.path.getsize(self.reference_file))
+    def make_blast_db(self) -> Path:
+        """Return a BLAST database for the reference, reusing a cached one if possible.
         
-        # Create BLAST database
-        db_path = self.reference_file.with_suffix('.blast_db')
-        print(f"  Creating BLAST database...")
-        subprocess.run([
-            'makeblastdb',
-            '-in', str(self.reference_file),
-            '-dbtype', 'nucl',
-            '-out', str(db_path)
-        ], check=True, capture_output=True)
+        The database stays pinned in db_cache until it is released there.
+        """
+        return self.db_cache.get(self.reference_file)
+    
+    @contextmanager
+    def blast_db(self) -> Iterator[Path]:
+        """make_blast_db for the duration of a block, releasing the database afterwards."""
+        db_path = self.make_blast_db()
+        try:
+            yield db_path
+        finally:
+            self.db_cache.release(db_path)
+    
+    def blast_command(self, db_path: Path, threads: int = 4, query_file: Path = None,
+                      dbsize: int = None) -> List[str]:
+        """Build the blastn command line used by run_blast (for query_file, if given).
         
-        # Run BLAST
-        print(f"  Running BLAST alignment (this may take a while)...")
-        start_time = time.time()
-        result = subprocess.run([
+        dbsize, if given, is the database length BLAST computes E-values for.
+        """
+        cmd = [
             'blastn',
-            '-query', str(self.query_file),
+            '-query', str(query_file or self.query_file),
             '-db', str(db_path),
             '-outfmt', '6 qseqid sseqid pident length qstart qend sstart send evalue bitscore',
             '-task', 'blastn',
             '-evalue', '1e-10',  # Filter out random hits
-            '-num_threads', '4'  # Use multiple threads
-        ], check=True, capture_output=True, text=True)
-        runtime = time.time() - start_time
+            '-num_threads', str(threads)  # Use multiple threads
+        ]
+        if dbsize is not None:
+            cmd += ['-dbsize', str(dbsize)]
+        return cmd
+    
+    def run_blast(self, threads: int = 4, db_path: Path = None, dbsize: int = None) -> Tuple[np.ndarray, float]:
+        """Run BLAST and return per-base identity vector and runtime.
         
-        # Parse BLAST output
-        identity_vector = self._parse_blast_output(result.stdout)
+        If db_path is given the existing database is used as-is, otherwise
+        one is taken from the database cache (built from the reference if
+        need be) and released once BLAST is done. dbsize is passed to
+        blast_command.
+        """
+        # Create BLAST database
+        if db_path is None:
+            with self.blast_db() as db_path:
+                return self.run_blast(threads, db_path, dbsize)
+        
+        print(f"Running BLAST: {self.query_file.name} vs {self.reference_file.name}")
+        
+        # Run BLAST
+        print(f"  Running BLAST alignment (this may take a while)...")
+        inputs = {str(db_path): self.reference_file, str(self.query_file): self.query_file}
+        cmd = self.blast_command(db_path, threads, dbsize=dbsize)
+        identity_vector, n_hits, runtime = self._run_cached(
+            cmd, inputs, lambda keep: self._run_aligner(cmd, BLAST_COLUMNS, '\t', keep),
+            ignore_options=('-num_threads',))
         
         print(f"  Runtime: {runtime:.2f}s")
-        print(f"  Hits: {len(result.stdout.strip().split(chr(10)))} alignments")
+        print(f"  Hits: {n_hits} alignments")
         
         return identity_vector, runtime
     
-    def _parse_blast_output(self, blast_output: str) -> np.ndarray:
-        """Parse BLAST tabular output to per-base identity vector."""
-        identity_vector = np.zeros(self.reference_length, dtype=np.float32)
-        hit_count = np.zeros(self.reference_length, dtype=np.int32)
+    def _run_cached(self, cmd: List[str], inputs: Dict[str, Path],
+                    run: Callable[[List[np.ndarray]], Tuple[np.ndarray, int]],
+                    ignore_options: Tuple[str, ...] = (),
+                    accumulate: Callable[[Iterable[np.ndarray]], Tuple] = None) -> Tuple[np.ndarray, int, float]:
+        """Run an aligner through the hit cache, if one is configured.
         
-        for line in blast_output.strip().split('\n'):
-            if not line:
-                continue
-            fields = line.split('\t')
-            pident = float(fields[2])
-            sstart = int(fields[6])
-            send = int(fields[7])
-            
-            # Handle reverse strand
-            start = min(sstart, send) - 1  # Convert to 0-based
-            end = max(sstart, send)
-            
-            # Add identity to each base in the alignment
-            identity_vector[start:end] += pident
-            hit_count[start:end] += 1
+        cmd and inputs identify the run for the cache key; run(keep) does
+        the work, appending parsed hit chunks to keep (a list, or the
+        cache's SpillWriter in spill mode) and returning
+        (identity_vector, n_hits). Returns (identity_vector, n_hits,
+        runtime); on a cache hit the runtime is the one recorded when the
+        hits were first computed, and the cached hits are turned into the
+        result by accumulate (_accumulate by default). Either way the hits
+        are left in last_hits.
+        """
+        key = None
+        if self.hit_cache is not None:
+            key = self.hit_cache.key(cmd, inputs, ignore_options)
+            with self.profiler.span('hit_cache_load') as span_args:
+                cached = self.hit_cache.load(key)
+                span_args['bytes'] = cached[0].nbytes if cached is not None else 0
+            if cached is not None:
+                hits, runtime = cached
+                print(f"  Using cached hits ({key[:12]})")
+                self.last_hits = hits
+                identity_vector, n_hits = (accumulate or self._accumulate)([hits])
+                return identity_vector, n_hits, runtime
         
-        # Average identity for bases covered by multiple hits
-        mask = hit_count > 0
-        identity_vector[mask] /= hit_count[mask]
+        if key is not None and self.hit_cache.spill:
+            # Chunks go to the spill file as they are parsed, not into memory
+            writer = self.hit_cache.spill_writer(key)
+            start_time = time.time()
+            try:
+                identity_vector, n_hits = run(writer)
+            except BaseException:
+                writer.discard()
+                raise
+            runtime = time.time() - start_time
+            with self.profiler.span('hit_cache_store', writer.count * HIT_DTYPE.itemsize):
+                self.last_hits = writer.commit(runtime, HIT_DTYPE)
+            return identity_vector, n_hits, runtime
         
-        return identity_vector
+        hit_chunks = []
+        start_time = time.time()
+        identity_vector, n_hits = run(hit_chunks)
+        runtime = time.time() - start_time
+        hits = np.concatenate(hit_chunks) if hit_chunks else np.empty(0, dtype=HIT_DTYPE)
+        self.last_hits = hits
+        if key is not None:
+            with self.profiler.span('hit_cache_store', hits.nbytes):
+                self.hit_cache.store(key, hits, runtime)
+        return identity_vector, n_hits, runtime
     
-    def run_lastz(self, params: Dict[str, str] = None) -> Tuple[np.ndarray, float]:
-        """Run LASTZ and return per-base identity vector and runtime."""
-        print(f"Running LASTZ: {self.query_file.name} vs {self.reference_file.name}")
+    def _stream_hits(self, cmd: List[str], usecols: Tuple[int, ...], delimiter: str = None,
+                     queries: ReferenceIndex = None, format: str = 'tabular') -> Iterator[np.ndarray]:
+        """Run an aligner and yield chunks of hits from its stdout pipe as they are produced.
+        
+        The process is reaped with os.wait4 and its resource usage appended
+        to child_usage. Raises subprocess.CalledProcessError (with stderr
+        attached) if the aligner exits with a non-zero status.
+        """
+        with tempfile.TemporaryFile(mode='w+') as stderr:
+            start, wall_start = time.time(), time.perf_counter()
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            try:
+                with process.stdout:
+                    yield from read_hit_chunks(process.stdout, usecols, delimiter, reference=self.reference,
+                                               queries=queries, profiler=self.profiler, format=format)
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = returncode = os.waitstatus_to_exitcode(status)
+                self.child_usage.append(usage)
+                # The aligner gets a track of its own, next to the parsing it feeds
+                self.profiler.record('aligner', start, time.perf_counter() - wall_start,
+                                     usage.ru_utime + usage.ru_stime, self._input_bytes(cmd),
+                                     usage.ru_maxrss * RSS_UNIT_BYTES, tid=process.pid, tool=cmd[0])
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            if returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr.read())
+    
+    def _input_bytes(self, cmd: List[str]) -> int:
+        """Size of the reference and query files an aligner command reads."""
+        query = cmd[cmd.index('-query') + 1] if '-query' in cmd else cmd[2]
+        return os.path.getsize(self.reference_file) + os.path.getsize(query)
+    
+    def _run_aligner(self, cmd: List[str], usecols: Tuple[int, ...], delimiter: str = None,
+                     keep: List[np.ndarray] = None, format: str = 'tabular') -> Tuple[np.ndarray, int]:
+        """Run an aligner and accumulate its hits into a per-base identity vector.
+        
+        Hits are accumulated chunk by chunk while the aligner is still
+        running, with progress printed every PROGRESS_INTERVAL seconds. If
+        keep is given, each parsed chunk of hits is also appended to it.
+        """
+        hit_chunks = _reported(self._stream_hits(cmd, usecols, delimiter, format=format))
+        if keep is not None:
+            hit_chunks = _kept(hit_chunks, keep)
+        return self._accumulate(hit_chunks)
+    
+    def _accumulate(self, hit_chunks: Iterable[np.ndarray]) -> Tuple[np.ndarray, int]:
+        """Accumulate chunks of hits into a per-base identity vector."""
+        accumulator = IdentityAccumulator(self.reference_length, self.accumulation)
+        n_hits = 0
+        
+        for hits in hit_chunks:
+            with self.profiler.span('accumulate', hits.nbytes):
+                starts, ends = self.reference.hit_ranges(hits)
+                
+                # Add identity to each base in the alignment
+                accumulator.add(starts, ends, hits['pident'])
+            n_hits += len(hits)
         
+        with self.profiler.span('accumulate', step='finish') as span_args:
+            identity_vector, _ = accumulator.finish()
+            span_args['bytes'] = identity_vector.nbytes
+        return identity_vector, n_hits
+    
+    def lastz_command(self, params: Dict[str, str] = None, subrange: Tuple[int, int] = None,
+                      query_file: Path = None) -> List[str]:
+        """Build the lastz command line used by run_lastz (for query_file, if given).
+        
+        subrange restricts the target to 1-based, inclusive reference
+        positions (start, end) using LASTZ's [subrange] action.
+        """
         # Minimal required LASTZ parameters (ambiguous=iupac is needed for IUPAC codes in sequences)
         if params is None:
             params = {'ambiguous': 'iupac'}
@@ -101,8 +1001,13 @@ class AlignmentBenchmark:
             # Always add ambiguous=iupac if not specified
             params = {**params, 'ambiguous': 'iupac'}
         
-        # Build LASTZ command
-        cmd = ['lastz', str(self.reference_file), str(self.query_file)]
+        # Build LASTZ command; a multi-contig reference must be read as [multiple]
+        target = str(self.reference_file)
+        if subrange is not None:
+            target += f'[subrange={subrange[0]}..{subrange[1]}]'
+        elif len(self.reference) > 1:
+            target += '[multiple]'
+        cmd = ['lastz', target, str(query_file or self.query_file)]
         
         for key, value in params.items():
             if value is True:
@@ -110,115 +1015,362 @@ class AlignmentBenchmark:
             else:
                 cmd.append(f'--{key}={value}')
         
-        cmd.append('--format=BLASTN')
+        cmd.append(f'--format={LASTZ_GENERAL_FORMAT}' if self.lastz_format == 'general' else '--format=BLASTN')
+        return cmd
+    
+    def run_lastz(self, params: Dict[str, str] = None, windows: int = None,
+                  overlap: int = DEFAULT_WINDOW_OVERLAP,
+                  region: Tuple[int, int] = None) -> Tuple[np.ndarray, float]:
+        """Run LASTZ and return per-base identity vector and runtime.
         
+        With windows > 1 the reference is split into that many overlapping
+        windows which are aligned concurrently (see _run_lastz_windows).
+        region restricts the alignment to 0-based, half-open reference
+        positions (start, end); bases outside it are left uncovered.
+        """
+        if windows and windows > 1 and region is not None:
+            raise ValueError("run_lastz takes either windows or region, not both")
+        
+        print(f"Running LASTZ: {self.query_file.name} vs {self.reference_file.name}")
+        
+        if region is not None and len(self.reference) > 1:
+            print(f"  Reference has {len(self.reference)} contigs; [subrange] needs a "
+                  f"single sequence, so aligning the whole reference")
+            region = None
+        subrange = (region[0] + 1, region[1]) if region is not None else None
+        
+        cmd = self.lastz_command(params, subrange=subrange)
         print(f"  Command: {' '.join(cmd)}")
         
-        # Run LASTZ
-        start_time = time.time()
+        if windows and windows > 1 and len(self.reference) > 1:
+            print(f"  Reference has {len(self.reference)} contigs; [subrange] windows need a "
+                  f"single sequence, so running one LASTZ process")
+            windows = None
+        
+        # Run LASTZ, parsing its output as it streams in
+        inputs = {cmd[1]: self.reference_file, cmd[2]: self.query_file}
         try:
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            if windows and windows > 1:
+                print(f"  Splitting reference into {windows} windows ({overlap:,} bp overlap)")
+                # Not LASTZ options; they only make chunked runs cache separately
+                key_cmd = cmd + [f'windows={windows}', f'overlap={overlap}']
+                identity_vector, n_hits, runtime = self._run_cached(
+                    key_cmd, inputs, lambda keep: self._run_lastz_windows(params, windows, overlap, keep))
+            else:
+                # The target argument is replaced by the reference's hash, so keep its subrange
+                key_cmd = cmd + [f'subrange={subrange[0]}..{subrange[1]}'] if subrange else cmd
+                identity_vector, n_hits, runtime = self._run_cached(
+                    key_cmd, inputs, lambda keep: self._run_aligner(cmd, self.lastz_columns, keep=keep,
+                                                                    format=self.lastz_hit_format))
         except subprocess.CalledProcessError as e:
             print(f"  ERROR: LASTZ failed with exit code {e.returncode}")
             print(f"  STDERR: {e.stderr}")
             raise
-        runtime = time.time() - start_time
-        
-        # Parse LASTZ output (BLASTN format)
-        identity_vector = self._parse_blastn_output(result.stdout)
         
         print(f"  Runtime: {runtime:.2f}s")
-        print(f"  Hits: {len([l for l in result.stdout.strip().split(chr(10)) if l and not l.startswith('#')])} alignments")
+        print(f"  Hits: {n_hits} alignments")
         
         return identity_vector, runtime
     
-    def _parse_blastn_output(self, blastn_output: str) -> np.ndarray:
-        """Parse BLASTN format output to per-base identity vector."""
-        identity_vector = np.zeros(self.reference_length, dtype=np.float32)
-        hit_count = np.zeros(self.reference_length, dtype=np.int32)
+    def lastz_windows(self, windows: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+        """Split the reference into overlapping windows.
         
-        for line in blastn_output.strip().split('\n'):
-            if not line or line.startswith('#'):
-                continue
-            
-            fields = line.split()
-            if len(fields) < 12:
-                continue
-            
-            # BLASTN format: query, subject, %id, alnlen, mismatches, gaps, qstart, qend, sstart, send, e-value, bitscore
-            pident = float(fields[2])
-            sstart = int(fields[8])
-            send = int(fields[9])
-            
-            # Handle reverse strand
-            start = min(sstart, send) - 1  # Convert to 0-based
-            end = max(sstart, send)
-            
-            # Add identity to each base in the alignment
-            identity_vector[start:end] += pident
-            hit_count[start:end] += 1
+        Returns 0-based, half-open (window_start, core_start, core_end,
+        window_end) tuples. Cores tile the reference without gaps; each
+        window extends its core by overlap bases on both sides.
+        """
+        bounds = np.linspace(0, self.reference_length, windows + 1).astype(np.int64)
+        return [(max(0, int(start) - overlap), int(start), int(end),
+                 min(self.reference_length, int(end) + overlap))
+                for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    
+    def _run_lastz_windows(self, params: Dict[str, str], windows: int, overlap: int,
+                           keep: List[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        """Align reference windows concurrently, then merge their hits.
         
-        # Average identity for bases covered by multiple hits
-        mask = hit_count > 0
-        identity_vector[mask] /= hit_count[mask]
+        Each window runs as its own LASTZ process (threads only drive the
+        pipes). A window keeps just the hits that start in its core, so hits
+        seen twice in an overlap, or cut short by a window's left edge, are
+        dropped in favour of the copy from the window that owns them.
+        """
+        jobs = self.lastz_windows(windows, overlap)
+        with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+            futures = [executor.submit(self._window_hits, params, *job) for job in jobs]
+            # An empty reference has no windows, and so no hits
+            hits = np.concatenate([future.result() for future in futures] or [np.empty(0, dtype=HIT_DTYPE)])
         
-        return identity_vector
+        if keep is not None:
+            keep.append(hits)
+        return self._accumulate([hits])
     
-    def compare_vectors(self, blast_vector: np.ndarray, lastz_vector: np.ndarray) -> Dict[str, float]:
-        """Compare BLAST and LASTZ identity vectors."""
-        # Only compare bases that have alignments in at least one method
-        covered_blast = blast_vector > 0
-        covered_lastz = lastz_vector > 0
-        covered_either = covered_blast | covered_lastz
-        covered_both = covered_blast & covered_lastz
+    def _window_hits(self, params: Dict[str, str], window_start: int, core_start: int,
+                     core_end: int, window_end: int) -> np.ndarray:
+        """Run LASTZ on one window and return the hits that start in its core."""
+        cmd = self.lastz_command(params, subrange=(window_start + 1, window_end))
+        hit_chunks = list(self._stream_hits(cmd, self.lastz_columns, format=self.lastz_hit_format))
+        hits = np.concatenate(hit_chunks) if hit_chunks else np.empty(0, dtype=HIT_DTYPE)
+        starts, _ = self.reference.hit_ranges(hits)
+        return hits[(starts >= core_start) & (starts < core_end)]
+    
+    def run_blast_batch(self, query_files: List[Path], threads: int = 4,
+                        db_path: Path = None) -> Tuple[List[np.ndarray], float]:
+        """Run BLAST once for several queries and return one identity vector per query.
         
-        # Calculate metrics
-        metrics = {
-            'blast_coverage': np.sum(covered_blast) / self.reference_length * 100,
-            'lastz_coverage': np.sum(covered_lastz) / self.reference_length * 100,
-            'overlap_coverage': np.sum(covered_both) / self.reference_length * 100,
-            'bases_same_identity': 0,
-            'mean_abs_diff': 0,
-            'correlation': 0
-        }
+        The queries are concatenated into a single query file (see
+        write_batch_query) so the database is searched in one pass, and the
+        hits are split back out by query sequence. The runtime is that of
+        the whole batch. Without db_path, the database is fetched and
+        released as in run_blast.
+        """
+        if db_path is None:
+            with self.blast_db() as db_path:
+                return self.run_blast_batch(query_files, threads, db_path)
         
-        if np.sum(covered_either) > 0:
-            # Compare identity values for bases covered by both
-            if np.sum(covered_both) > 0:
-                blast_vals = blast_vector[covered_both]
-                lastz_vals = lastz_vector[covered_both]
-                
-                # Bases with same identity (within 1%)
-                same_identity = np.abs(blast_vals - lastz_vals) < 1.0
-                metrics['bases_same_identity'] = np.sum(same_identity) / len(same_identity) * 100
-                
-                # Mean absolute difference
-                metrics['mean_abs_diff'] = np.mean(np.abs(blast_vals - lastz_vals))
-                
-                # Correlation
-                if np.std(blast_vals) > 0 and np.std(lastz_vals) > 0:
-                    metrics['correlation'] = np.corrcoef(blast_vals, lastz_vals)[0, 1]
+        print(f"Running BLAST batch: {len(query_files)} queries vs {self.reference_file.name}")
         
-        return metrics
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            batch_file = Path(tmp_dir) / 'batch_query.fna'
+            cmd = self.blast_command(db_path, threads, query_file=batch_file)
+            inputs = {str(db_path): self.reference_file, str(batch_file): batch_file}
+            return self._run_batch(query_files, batch_file, cmd, inputs, BLAST_COLUMNS, '\t',
+                                   ignore_options=('-num_threads',))
     
-    def run_benchmark(self, lastz_params: Dict[str, str] = None) -> Dict:
-        """Run full benchmark comparing BLAST and LASTZ."""
-        print(f"\n{'='*60}")
-        print(f"Benchmarking: {self.reference_file.name} vs {self.query_file.name}")
-        print(f"Reference length: {self.reference_length:,} bp")
-        print(f"{'='*60}\n")
+    def run_lastz_batch(self, query_files: List[Path],
+                        params: Dict[str, str] = None) -> Tuple[List[np.ndarray], float]:
+        """Run LASTZ once for several queries and return one identity vector per query.
         
-        # Run BLAST
-        blast_vector, blast_time = self.run_blast()
+        The reference is the target and the concatenated queries (see
+        write_batch_query) a multi-sequence query, so the reference is
+        indexed once for the whole batch. The runtime is that of the whole
+        batch.
+        """
+        print(f"Running LASTZ batch: {len(query_files)} queries vs {self.reference_file.name}")
         
-        # Run LASTZ
-        lastz_vector, lastz_time = self.run_lastz(lastz_params)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            batch_file = Path(tmp_dir) / 'batch_query.fna'
+            cmd = self.lastz_command(params, query_file=batch_file)
+            print(f"  Command: {' '.join(cmd)}")
+            inputs = {cmd[1]: self.reference_file, cmd[2]: batch_file}
+            try:
+                return self._run_batch(query_files, batch_file, cmd, inputs, self.lastz_columns,
+                                       format=self.lastz_hit_format)
+            except subprocess.CalledProcessError as e:
+                print(f"  ERROR: LASTZ failed with exit code {e.returncode}")
+                print(f"  STDERR: {e.stderr}")
+                raise
+    
+    def _run_batch(self, query_files: List[Path], batch_file: Path, cmd: List[str],
+                   inputs: Dict[str, Path], usecols: Tuple[int, ...], delimiter: str = None,
+                   ignore_options: Tuple[str, ...] = (), format: str = 'tabular') -> Tuple[List[np.ndarray], float]:
+        """Write the batch query file, run cmd on it and split the hits per query file."""
+        with self.profiler.span('write_batch_query', sum(os.path.getsize(q) for q in query_files)):
+            counts = write_batch_query(query_files, batch_file)
+        queries = ReferenceIndex.from_fasta(batch_file)
+        query_of_sequence = np.repeat(np.arange(len(query_files)), counts)
         
-        # Compare results
-        print(f"\nComparing results...")
-        metrics = self.compare_vectors(blast_vector, lastz_vector)
+        def split(hit_chunks):
+            return self._split_batch(hit_chunks, query_of_sequence, len(query_files))
+        
+        def run(keep):
+            hit_chunks = _reported(self._stream_hits(cmd, usecols, delimiter, queries, format))
+            if keep is not None:
+                hit_chunks = _kept(hit_chunks, keep)
+            return split(hit_chunks)
+        
+        identity_vectors, n_hits, runtime = self._run_cached(cmd, inputs, run, ignore_options,
+                                                             accumulate=split)
+        
+        print(f"  Runtime: {runtime:.2f}s")
+        for query_file, count in zip(query_files, n_hits):
+            print(f"  Hits: {count} alignments ({Path(query_file).name})")
+        
+        return identity_vectors, runtime
+    
+    def _split_batch(self, hit_chunks: Iterable[np.ndarray], query_of_sequence: np.ndarray,
+                     n_queries: int) -> Tuple[List[np.ndarray], List[int]]:
+        """Accumulate batch hits into one identity vector per query file.
+        
+        query_of_sequence maps each batch query sequence to its file. Hits
+        are grouped by file and accumulated one file at a time, so only one
+        accumulator is alive at once.
+        """
+        hit_chunks = list(hit_chunks)
+        hits = np.concatenate(hit_chunks) if hit_chunks else np.empty(0, dtype=HIT_DTYPE)
+        owner = query_of_sequence[hits['query']]
+        order = np.argsort(owner, kind='stable')
+        bounds = np.searchsorted(owner[order], np.arange(n_queries + 1))
+        results = [self._accumulate([hits[order[start:end]]]) for start, end in zip(bounds[:-1], bounds[1:])]
+        return [identity_vector for identity_vector, _ in results], [n_hits for _, n_hits in results]
+    
+    @profiled('compare_vectors', lambda self, blast_vector, lastz_vector, *args, **kwargs:
+              blast_vector.nbytes + lastz_vector.nbytes)
+    def compare_vectors(self, blast_vector: Union[np.ndarray, CompactIdentity],
+                        lastz_vector: Union[np.ndarray, CompactIdentity],
+                        window_sizes: Iterable[int] = DEFAULT_WINDOW_SIZES,
+                        region: Tuple[int, int] = None) -> Dict[str, float]:
+        """Compare BLAST and LASTZ identity vectors, per base and per window.
+        
+        Either vector may be a CompactIdentity. Both are compared a block at
+        a time, as in compare_blocks, so neither is decoded whole. If region
+        is given, only 0-based, half-open reference positions (start, end)
+        are compared and coverage is relative to it.
+        
+        For each window size, windows_<size>_same_identity is the percentage
+        of windows covered by both tools whose avgIdentity agrees within 1%,
+        and windows_<size>_coverage_diff is the mean absolute difference in
+        window coverage, in percentage points.
+        """
+        window_sizes = sorted(set(window_sizes))
+        # The smallest multiple of every window size at least COMPARE_BLOCK_SIZE
+        step = math.lcm(*window_sizes) if window_sizes else 1
+        block_size = -(-COMPARE_BLOCK_SIZE // step) * step
+        return self._compare_blocks(blast_vector, lastz_vector, window_sizes, region, block_size)
+    
+    @profiled('compare_blocks', lambda self, blast_vector, lastz_vector, *args, **kwargs:
+              blast_vector.nbytes + lastz_vector.nbytes)
+    def compare_blocks(self, blast_vector: Union[np.ndarray, CompactIdentity],
+                       lastz_vector: Union[np.ndarray, CompactIdentity],
+                       window_sizes: Iterable[int] = DEFAULT_WINDOW_SIZES,
+                       region: Tuple[int, int] = None, block_size: int = COMPARE_BLOCK_SIZE,
+                       hotspot_window: int = HOTSPOT_WINDOW, n_hotspots: int = N_HOTSPOTS) -> Dict:
+        """Extended compare_vectors, computed in one pass over blocks of block_size bases.
+        
+        Returns compare_vectors' metrics, from the same pass, plus:
+        
+        - blast_identity_histogram, lastz_identity_histogram: covered bases
+          per 1% identity bin (N_IDENTITY_BINS bins)
+        - hotspots: the n_hotspots windows of hotspot_window bases where the
+          tools disagree on most bases (covered by one tool only, or by both
+          with identities more than 1% apart), worst first, each a dict of
+          its 0-based global start and end, contig and 1-based contig
+          start, disagreement, BLAST-only and LASTZ-only coverage (% of the
+          window) and the mean absolute identity difference where both
+          cover it
+        
+        Only one block of each vector is decoded at a time, so memory use
+        does not grow with the genome. region and window_sizes are as for
+        compare_vectors, and block_size must be a multiple of hotspot_window
+        and every window size.
+        """
+        window_sizes = sorted(set(window_sizes))
+        if any(block_size % size for size in [*window_sizes, hotspot_window]):
+            raise ValueError(f"Block size {block_size} is not a multiple of every window size")
+        return self._compare_blocks(blast_vector, lastz_vector, window_sizes, region, block_size,
+                                    extended=True, hotspot_window=hotspot_window, n_hotspots=n_hotspots)
+    
+    def _compare_blocks(self, blast_vector: Union[np.ndarray, CompactIdentity],
+                        lastz_vector: Union[np.ndarray, CompactIdentity], window_sizes: List[int],
+                        region: Tuple[int, int], block_size: int, extended: bool = False,
+                        hotspot_window: int = HOTSPOT_WINDOW, n_hotspots: int = N_HOTSPOTS) -> Dict:
+        """Compare two vectors a block at a time; the shared pass of compare_vectors and compare_blocks.
+        
+        block_size must be a multiple of every window size (and of
+        hotspot_window if extended). Histograms and hot spots are only
+        computed if extended.
+        """
+        start, end = region if region is not None else (0, self.reference_length)
+        compared_length = end - start
+        
+        n_blast = n_lastz = n_both = 0
+        same_total = abs_diff_total = 0.0
+        moments = (0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        histograms = {tool: np.zeros(N_IDENTITY_BINS, dtype=np.int64) for tool in ('blast', 'lastz')}
+        window_totals = {size: np.zeros(3) for size in window_sizes}  # windows both cover, same, coverage diff
+        window_counts = dict.fromkeys(window_sizes, 0)
+        hotspots = np.zeros(0, dtype=[('start', np.int64), ('end', np.int64), ('disagreement', np.float64),
+                                      ('blast_only', np.float64), ('lastz_only', np.float64),
+                                      ('mean_abs_diff', np.float64)])
         
-        # Print results
+        blocks = zip(identity_blocks(blast_vector, start, end, block_size),
+                     identity_blocks(lastz_vector, start, end, block_size))
+        for block_start, (blast_block, lastz_block) in zip(range(start, end, block_size), blocks):
+            covered_blast = blast_block > 0
+            covered_lastz = lastz_block > 0
+            covered_both = covered_blast & covered_lastz
+            n_blast += int(covered_blast.sum())
+            n_lastz += int(covered_lastz.sum())
+            if extended:
+                for tool, block, covered in (('blast', blast_block, covered_blast),
+                                             ('lastz', lastz_block, covered_lastz)):
+                    bins = np.minimum(block[covered].astype(np.int64), N_IDENTITY_BINS - 1)
+                    histograms[tool] += np.bincount(bins, minlength=N_IDENTITY_BINS)
+            
+            # Per-base agreement; diff and same are 0 wherever either tool is uncovered
+            diff = np.abs(blast_block - lastz_block, dtype=np.float64)
+            diff *= covered_both
+            same = (diff < 1.0) & covered_both
+            block_both = int(covered_both.sum())
+            n_both += block_both
+            same_total += float(np.sum(same))
+            abs_diff_total += float(diff.sum())
+            if block_both:
+                x = blast_block[covered_both].astype(np.float64)
+                y = lastz_block[covered_both].astype(np.float64)
+                mean_x, mean_y = x.mean(), y.mean()
+                moments = _merge_comoments(moments, (block_both, mean_x, mean_y, np.sum((x - mean_x) ** 2),
+                                                     np.sum((y - mean_y) ** 2), np.sum((x - mean_x) * (y - mean_y))))
+            
+            # Windowed agreement, exactly as aggregate_windows would tile the whole vector
+            blast_windows = aggregate_windows(blast_block, window_sizes)
+            lastz_windows = aggregate_windows(lastz_block, window_sizes)
+            for size in window_sizes:
+                blast_w, lastz_w = blast_windows[size], lastz_windows[size]
+                both = (blast_w['coverage'] > 0) & (lastz_w['coverage'] > 0)
+                window_totals[size] += (both.sum(),
+                                        np.sum(np.abs(blast_w['avgIdentity'][both] - lastz_w['avgIdentity'][both]) < 1.0),
+                                        np.sum(np.abs(blast_w['coverage'] - lastz_w['coverage'])))
+                window_counts[size] += len(both)
+            if not extended:
+                continue
+            
+            # Disagreement per hot spot window, merged into the running worst n_hotspots
+            bounds = np.arange(0, len(blast_block), hotspot_window)
+            lengths = np.diff(np.append(bounds, len(blast_block)))
+            window_both = np.add.reduceat(covered_both, bounds, dtype=np.int64)
+            blast_only = np.add.reduceat(covered_blast & ~covered_lastz, bounds, dtype=np.int64)
+            lastz_only = np.add.reduceat(covered_lastz & ~covered_blast, bounds, dtype=np.int64)
+            window_same = np.add.reduceat(same, bounds, dtype=np.float64)
+            window_diff = np.add.reduceat(diff, bounds)
+            candidates = np.zeros(len(bounds), dtype=hotspots.dtype)
+            candidates['start'] = block_start + bounds
+            candidates['end'] = block_start + bounds + lengths
+            candidates['disagreement'] = (blast_only + lastz_only + window_both - window_same) / lengths * 100
+            candidates['blast_only'] = blast_only / lengths * 100
+            candidates['lastz_only'] = lastz_only / lengths * 100
+            candidates['mean_abs_diff'] = window_diff / np.maximum(window_both, 1)
+            hotspots = np.concatenate([hotspots, candidates[candidates['disagreement'] > 0]])
+            hotspots = hotspots[np.lexsort((hotspots['start'], -hotspots['disagreement']))][:n_hotspots]
+        
+        n, _, _, m2_x, m2_y, c_xy = moments
+        metrics = {
+            'blast_coverage': n_blast / compared_length * 100 if compared_length else 0,
+            'lastz_coverage': n_lastz / compared_length * 100 if compared_length else 0,
+            'overlap_coverage': n_both / compared_length * 100 if compared_length else 0,
+            'bases_same_identity': same_total / n_both * 100 if n_both else 0,
+            'mean_abs_diff': abs_diff_total / n_both if n_both else 0,
+            'correlation': c_xy / np.sqrt(m2_x * m2_y) if m2_x > 0 and m2_y > 0 else 0,
+        }
+        for size in window_sizes:
+            both, same, coverage_diff = window_totals[size]
+            metrics[f'windows_{size}_same_identity'] = same / both * 100 if both else 0
+            metrics[f'windows_{size}_coverage_diff'] = (
+                coverage_diff / window_counts[size] * 100 if window_counts[size] else 0)
+        if not extended:
+            return metrics
+        metrics['blast_identity_histogram'] = histograms['blast'].tolist()
+        metrics['lastz_identity_histogram'] = histograms['lastz'].tolist()
+        contigs = np.searchsorted(self.reference.offsets, hotspots['start'], side='right') - 1
+        metrics['hotspots'] = [
+            {'start': int(spot['start']), 'end': int(spot['end']),
+             'contig': str(self.reference.names[contig]),
+             'contig_start': int(spot['start'] - self.reference.offsets[contig]) + 1,
+             **{name: float(spot[name]) for name in ('disagreement', 'blast_only', 'lastz_only', 'mean_abs_diff')}}
+            for spot, contig in zip(hotspots, contigs)
+        ]
+        return metrics
+    
+    def print_results(self, blast_time: float, lastz_time: float, metrics: Dict[str, float]):
+        """Print runtime, coverage and identity comparison for one pair."""
         print(f"\n{'='*60}")
         print("RESULTS")
         print(f"{'='*60}")
@@ -234,8 +1386,57 @@ class AlignmentBenchmark:
         print(f"  Bases with same identity (±1%): {metrics['bases_same_identity']:.2f}%")
         print(f"  Mean absolute difference: {metrics['mean_abs_diff']:.2f}%")
         print(f"  Correlation: {metrics['correlation']:.4f}")
+        window_sizes = sorted(int(key.split('_')[1]) for key in metrics
+                              if key.startswith('windows_') and key.endswith('_same_identity'))
+        if window_sizes:
+            print(f"\nWindowed agreement (windows covered by both):")
+            for size in window_sizes:
+                print(f"  {size:>6,} bp: same identity (±1%) {metrics[f'windows_{size}_same_identity']:6.2f}% | "
+                      f"coverage diff {metrics[f'windows_{size}_coverage_diff']:5.2f} pts")
+        if 'blast_identity_histogram' in metrics:
+            print(f"\nIdentity distribution (% of each tool's covered bases):")
+            edges = (0, 80, 90, 95, 99)
+            labels = ('<80%', '80-90%', '90-95%', '95-99%', '>=99%')
+            for tool in ('blast', 'lastz'):
+                histogram = np.array(metrics[f'{tool}_identity_histogram'])
+                shares = np.add.reduceat(histogram, edges) / max(histogram.sum(), 1) * 100
+                print(f"  {tool.upper():5s} " + " | ".join(f"{label} {share:5.1f}" for label, share in zip(labels, shares)))
+        if metrics.get('hotspots'):
+            print(f"\nDisagreement hot spots (% of window):")
+            for spot in metrics['hotspots']:
+                print(f"  {spot['contig']}:{spot['contig_start']:,}-{spot['contig_start'] + spot['end'] - spot['start'] - 1:,} "
+                      f"| disagree {spot['disagreement']:5.1f} | BLAST only {spot['blast_only']:5.1f} | "
+                      f"LASTZ only {spot['lastz_only']:5.1f} | identity diff {spot['mean_abs_diff']:.2f}")
+        print(f"{'='*60}\n")
+    
+    def run_benchmark(self, lastz_params: Dict[str, str] = None, lastz_windows: int = None,
+                      compact: bool = True) -> Dict:
+        """Run full benchmark comparing BLAST and LASTZ.
+        
+        With compact=True the returned vectors are CompactIdentity objects
+        rather than float32 arrays.
+        """
+        print(f"\n{'='*60}")
+        print(f"Benchmarking: {self.reference_file.name} vs {self.query_file.name}")
+        print(f"Reference length: {self.reference_length:,} bp")
         print(f"{'='*60}\n")
         
+        # Run BLAST
+        blast_vector, blast_time = self.run_blast()
+        
+        # Run LASTZ
+        lastz_vector, lastz_time = self.run_lastz(lastz_params, windows=lastz_windows)
+        
+        # Compare results
+        print(f"\nComparing results...")
+        metrics = self.compare_vectors(blast_vector, lastz_vector)
+        
+        self.print_results(blast_time, lastz_time, metrics)
+        
+        if compact:
+            blast_vector = CompactIdentity.from_vector(blast_vector)
+            lastz_vector = CompactIdentity.from_vector(lastz_vector)
+        
         return {
             'blast_time': blast_time,
             'lastz_time': lastz_time,
@@ -244,10 +1445,492 @@ class AlignmentBenchmark:
             'blast_vector': blast_vector,
             'lastz_vector': lastz_vector
         }
+    
+    def run_preview(self, lastz_params: Dict[str, str] = None, n_regions: int = PREVIEW_REGIONS,
+                    region_size: int = PREVIEW_REGION_SIZE, seed: int = 0, threads: int = 4) -> Dict:
+        """Estimate run_benchmark's metrics by aligning a stratified sample of reference regions.
+        
+        The reference is tiled into region_size regions, stratified by GC
+        and repeat content (see stratify_reference) and about n_regions of
+        them are drawn (see sample_strata). The query is aligned by both
+        tools against just those regions, written out as a reference of
+        their own; BLAST is told the full reference length so that its
+        E-value cutoff is unchanged. The PREVIEW_METRICS are extrapolated
+        from the per-region totals (see stratified_ratio) and returned
+        under 'metrics', with the half-widths of their PREVIEW_Z intervals
+        under 'errors'. Hits crossing a region edge are cut at it, so
+        coverage near the edges may read a little low.
+        """
+        sequence = read_reference_bases(self.reference_file)
+        with self.profiler.span('stratify', self.reference_length):
+            regions = stratify_reference(sequence, self.reference, region_size)
+        if len(regions) == 0:
+            raise ValueError(f"{self.reference_file} has no contig of at least {region_size:,} bp to sample")
+        picked = regions[sample_strata(regions['stratum'], n_regions, seed)]
+        stratum_sizes = dict(zip(*np.unique(regions['stratum'], return_counts=True)))
+        
+        print(f"\n{'='*60}")
+        print(f"Preview: {self.reference_file.name} vs {self.query_file.name}")
+        print(f"{len(picked)} of {len(regions)} regions ({region_size:,} bp) from {len(stratum_sizes)} strata, "
+              f"{len(picked) * region_size / self.reference_length * 100:.1f}% of the reference")
+        print(f"{'='*60}\n")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            regions_file = Path(tmp_dir) / 'preview_regions.fna'
+            with open(regions_file, 'wb') as f:
+                for i, region in enumerate(picked):
+                    f.write(b'>region%d\n%s\n' % (i, sequence[region['start']:region['end']]))
+            preview = AlignmentBenchmark(str(regions_file), str(self.query_file), self.accumulation,
+                                         db_cache=self.db_cache, hit_cache=self.hit_cache,
+                                         profiler=self.profiler, lastz_format=self.lastz_format)
+            blast_vector, blast_time = preview.run_blast(threads, dbsize=self.reference_length)
+            lastz_vector, lastz_time = preview.run_lastz(lastz_params)
+        
+        # Per-region totals of the counts behind each metric
+        bounds = preview.reference.offsets
+        covered_blast = blast_vector > 0
+        covered_lastz = lastz_vector > 0
+        covered_both = covered_blast & covered_lastz
+        diff = np.abs(blast_vector - lastz_vector, dtype=np.float64) * covered_both
+        totals = {
+            'length': preview.reference.lengths.astype(np.float64),
+            'blast': np.add.reduceat(covered_blast, bounds, dtype=np.float64),
+            'lastz': np.add.reduceat(covered_lastz, bounds, dtype=np.float64),
+            'both': np.add.reduceat(covered_both, bounds, dtype=np.float64),
+            'same': np.add.reduceat((diff < 1.0) & covered_both, bounds, dtype=np.float64),
+            'abs_diff': np.add.reduceat(diff, bounds),
+        }
+        metrics, errors = {}, {}
+        for name, (numerator, denominator, scale) in PREVIEW_METRICS.items():
+            ratio, stderr = stratified_ratio(totals[numerator], totals[denominator], picked['stratum'],
+                                             stratum_sizes)
+            metrics[name], errors[name] = ratio * scale, PREVIEW_Z * stderr * scale
+        
+        return {
+            'blast_time': blast_time,
+            'lastz_time': lastz_time,
+            'speedup': blast_time / lastz_time,
+            'metrics': metrics,
+            'errors': errors,
+            'regions': picked,
+        }
+    
+    def print_preview(self, preview: Dict, full_metrics: Dict[str, float] = None):
+        """Print a preview's estimates with their error bars, against full-run metrics if given."""
+        print(f"\n{'='*72}")
+        print(f"PREVIEW ESTIMATES ({len(preview['regions'])} regions, ±{PREVIEW_Z:g} standard errors)")
+        print(f"{'='*72}")
+        print(f"Runtime: BLAST {preview['blast_time']:.2f}s | LASTZ {preview['lastz_time']:.2f}s | "
+              f"Speedup {preview['speedup']:.2f}x")
+        print(f"{'Metric':<22} | {'Estimate':>18}" + (f" | {'Full run':>9} | {'Error':>7} | In interval"
+                                                      if full_metrics else ""))
+        print("-"*72)
+        for name, estimate in preview['metrics'].items():
+            error = preview['errors'][name]
+            line = f"{name:<22} | {estimate:>9.2f} ± {error:<6.2f}"
+            if full_metrics:
+                miss = estimate - full_metrics[name]
+                line += f" | {full_metrics[name]:>9.2f} | {miss:>+7.2f} | {'yes' if abs(miss) <= error else 'no'}"
+            print(line)
+        print(f"{'='*72}\n")
+
+
+def _run_alignment_job(tool: str, ref_genome: str, query_genome: str, params: Dict[str, str],
+                       threads: int, db_path: Path, hit_cache: HitCache,
+                       profile: bool = False, cprofile: bool = False) -> Tuple[np.ndarray, float, bool, Dict]:
+    """Run a single BLAST or LASTZ job inside a worker process.
+    
+    Returns (identity, runtime, cached, spans), where identity is a
+    CompactIdentity (cheap to send back to the parent and to keep), cached
+    says whether the hits came from the hit cache and spans is the job's
+    StageProfiler export if profile is set (else None).
+    """
+    profiler = StageProfiler(cprofile)
+    with profiler.span('job', tool=tool, reference=Path(ref_genome).name, query=Path(query_genome).name):
+        benchmark = AlignmentBenchmark(ref_genome, query_genome, hit_cache=hit_cache, profiler=profiler)
+        hits_before = hit_cache.hits if hit_cache else 0
+        if tool == 'blast':
+            identity_vector, runtime = benchmark.run_blast(threads=threads, db_path=db_path)
+        else:
+            identity_vector, runtime = benchmark.run_lastz(params)
+        cached = bool(hit_cache and hit_cache.hits > hits_before)
+    return CompactIdentity.from_vector(identity_vector), runtime, cached, profiler.export() if profile else None
+
+
+def _run_batch_job(tool: str, ref_genome: str, query_genomes: List[str], params: Dict[str, str],
+                   threads: int, db_path: Path, hit_cache: HitCache,
+                   profile: bool = False, cprofile: bool = False) -> Tuple[List[CompactIdentity], float, bool, Dict]:
+    """Run one reference against several queries in a single batch inside a worker process.
+    
+    Returns (identities, runtime, cached, spans) like _run_alignment_job,
+    with one CompactIdentity per query and the runtime of the whole batch.
+    """
+    profiler = StageProfiler(cprofile)
+    with profiler.span('job', tool=tool, reference=Path(ref_genome).name, queries=len(query_genomes)):
+        benchmark = AlignmentBenchmark(ref_genome, query_genomes[0], hit_cache=hit_cache, profiler=profiler)
+        hits_before = hit_cache.hits if hit_cache else 0
+        if tool == 'blast':
+            identity_vectors, runtime = benchmark.run_blast_batch(query_genomes, threads=threads, db_path=db_path)
+        else:
+            identity_vectors, runtime = benchmark.run_lastz_batch(query_genomes, params)
+        cached = bool(hit_cache and hit_cache.hits > hits_before)
+    return ([CompactIdentity.from_vector(v) for v in identity_vectors], runtime, cached,
+            profiler.export() if profile else None)
+
+
+def _job_key(manifest: ResultManifest, tool: str, ref: Path, query: Path, params: Dict[str, str]) -> str:
+    """Manifest key of one pair's BLAST or LASTZ job, from the command it would run."""
+    benchmark = AlignmentBenchmark(str(ref), str(query))
+    if tool == 'blast':
+        # The database stands for the reference, so the reference path does as well
+        cmd = benchmark.blast_command(ref)
+        return manifest.job_key(cmd, {str(ref): ref, str(query): query}, ignore_options=('-num_threads',))
+    cmd = benchmark.lastz_command(params)
+    return manifest.job_key(cmd, {cmd[1]: ref, cmd[2]: query})
+
+
+def run_all_vs_all(genomes: List[Path], param_sets: Dict[str, Dict[str, str]],
+                   max_workers: int = None, cores: int = None,
+                   db_cache: BlastDbCache = None, hit_cache: HitCache = None,
+                   batch: bool = False, prefilter: GenomePrefilter = None,
+                   manifest: ResultManifest = None, profiler: StageProfiler = None,
+                   extended: bool = False) -> Dict[str, List[Dict]]:
+    """Run every (parameter set x pair x tool) job on a bounded process pool.
+    
+    The core budget is split between concurrent jobs and BLAST's -num_threads,
+    so that workers * blast_threads never exceeds the number of cores. BLAST
+    does not depend on the LASTZ parameters, so it runs once per pair and its
+    result is shared by every parameter set.
+    
+    With batch=True each reference is aligned against all of its queries in
+    one job (see run_blast_batch and run_lastz_batch), so it is indexed once
+    per tool rather than once per pair; each pair is then charged an equal
+    share of its batch's runtime.
+    
+    If hit_cache is given, jobs whose hits are already cached are not re-run
+    and the hit/miss counts are added to hit_cache's counters.
+    
+    If prefilter is given, pairs whose estimated ANI is below its threshold
+    are skipped, or aligned once with its cheap LASTZ parameters in place
+    of every parameter set, and the alignment time this saved (estimated
+    from the mean runtimes of the other pairs) is left in
+    prefilter.time_saved.
+    
+    If manifest is given, jobs and pair metrics it has recorded are loaded
+    instead of recomputed, and everything newly computed is recorded in it,
+    so a rerun after adding a genome only aligns the new pairs. Batches
+    then only cover the queries whose results are missing.
+    
+    If profiler is given, the stage spans of every job (recorded in the
+    workers) and of the comparisons are collected in it.
+    
+    With extended=True pairs are compared with compare_blocks, adding
+    identity histograms and disagreement hot spots to their metrics.
+    """
+    cores = cores or os.cpu_count() or 1
+    pairs = [(ref, query) for i, ref in enumerate(genomes) for query in genomes[i+1:]]
+    
+    skipped, routed = [], set()
+    if prefilter is not None:
+        print(f"Prefiltering {len(pairs)} pairs (minimum estimated ANI {prefilter.min_ani:.1f}%)")
+        _, low_pairs = prefilter.split_pairs(pairs)
+        if prefilter.action == 'skip':
+            skipped = low_pairs
+            pairs = [pair for pair in pairs if pair not in skipped]
+        else:
+            routed = set(low_pairs)
+        print(f"Sketching took {prefilter.sketch_time:.2f}s\n")
+    
+    def job_params(param_name):
+        if param_name == CHEAP_PARAM_SET:
+            return prefilter.cheap_params
+        return param_sets[param_name] if param_name else None
+    
+    # Every (tool, parameter set, reference, query) result the report needs
+    pair_jobs = [('blast', None, ref, query) for ref, query in pairs]
+    pair_jobs += [('lastz', name, ref, query) for name in param_sets
+                  for ref, query in pairs if (ref, query) not in routed]
+    pair_jobs += [('lastz', CHEAP_PARAM_SET, ref, query) for ref, query in pairs if (ref, query) in routed]
+    
+    # Results recorded in the manifest by earlier runs are loaded, not re-run
+    outputs = {}
+    job_keys = {}
+    pending = []
+    for job in pair_jobs:
+        tool, param_name, ref, query = job
+        if manifest is not None:
+            job_keys[job] = _job_key(manifest, tool, ref, query, job_params(param_name))
+            stored = manifest.load_job(job_keys[job])
+            if stored is not None:
+                arrays, runtime = stored
+                outputs[job] = CompactIdentity(arrays['covered_bits'], arrays['codes'], int(arrays['length'])), runtime
+                continue
+        pending.append(job)
+    if manifest is not None:
+        print(f"Result manifest: {len(outputs)} of {len(pair_jobs)} job result(s) already recorded\n")
+    
+    if batch:
+        # One job per reference, tool and parameter set, covering all of its pending queries
+        groups = {}
+        for tool, param_name, ref, query in pending:
+            groups.setdefault((tool, param_name, ref), []).append(query)
+        jobs = [(tool, param_name, ref, tuple(queries)) for (tool, param_name, ref), queries in groups.items()]
+    else:
+        jobs = pending
+    
+    if max_workers and max_workers > cores:
+        print(f"Warning: {max_workers} workers requested but the core budget is {cores}; "
+              f"running at most {cores} jobs at once")
+    workers = max(1, min(max_workers or cores, cores, len(jobs)))
+    blast_threads = max(1, cores // workers)
+    print(f"Scheduling {len(jobs)} jobs on {workers} workers "
+          f"({blast_threads} BLAST thread(s) per job, {cores} cores)\n")
+    
+    db_cache = db_cache or BlastDbCache()
+    db_paths = {}
+    # Each database is released once the last BLAST job that reads it is done
+    blast_jobs_left = defaultdict(int)
+    for tool, _, ref, _ in jobs:
+        if tool == 'blast':
+            blast_jobs_left[ref] += 1
+    
+    def finish(job, identity, runtime):
+        outputs[job] = identity, runtime
+        if manifest is not None:
+            tool, param_name, ref, query = job
+            description = {
+                'tool': tool,
+                'version': tool_version('blastn' if tool == 'blast' else 'lastz'),
+                'params': job_params(param_name) or {},
+                'reference': ref.name,
+                'reference_sha256': file_sha256(ref),
+                'query': query.name,
+                'query_sha256': file_sha256(query),
+            }
+            manifest.store_job(job_keys[job], description, runtime, {
+                'covered_bits': identity.covered_bits, 'codes': identity.codes, 'length': identity.length})
+    
+    profile = profiler is not None
+    cprofile = profile and profiler.profile is not None
+    try:
+        # Fetch each reference's BLAST database once, up front, so that
+        # concurrent BLAST jobs never race on makeblastdb for the same file.
+        for tool, _, ref, query in pending:
+            if tool == 'blast' and ref not in db_paths:
+                db_paths[ref] = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache,
+                                                   profiler=profiler).make_blast_db()
+        print(f"BLAST database cache: {db_cache.hits} hit(s), {db_cache.misses} built\n")
+        
+        start_time = time.time()
+        # Forked workers would inherit the database pins and hold them after they are
+        # released here, so workers are started from a clean fork server instead
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as executor:
+            futures = {}
+            for job in jobs:
+                tool, param_name, ref, query = job
+                params = job_params(param_name)
+                if batch:
+                    future = executor.submit(_run_batch_job, tool, str(ref), [str(q) for q in query],
+                                             params, blast_threads, db_paths.get(ref), hit_cache,
+                                             profile, cprofile)
+                else:
+                    future = executor.submit(_run_alignment_job, tool, str(ref), str(query),
+                                             params, blast_threads, db_paths.get(ref), hit_cache,
+                                             profile, cprofile)
+                futures[future] = job
+            
+            for future in as_completed(futures):
+                tool, param_name, ref, query = futures[future]
+                identity_vector, runtime, cached, spans = future.result()
+                if spans is not None:
+                    profiler.merge(spans)
+                if batch:
+                    for single_query, single_vector in zip(query, identity_vector):
+                        finish((tool, param_name, ref, single_query), single_vector, runtime / len(query))
+                else:
+                    finish(futures[future], identity_vector, runtime)
+                if tool == 'blast':
+                    blast_jobs_left[ref] -= 1
+                    if blast_jobs_left[ref] == 0:
+                        db_cache.release(db_paths[ref])
+                if hit_cache is not None:
+                    if cached:
+                        hit_cache.hits += 1
+                    else:
+                        hit_cache.misses += 1
+    finally:
+        for ref, db_path in db_paths.items():
+            if blast_jobs_left[ref]:
+                db_cache.release(db_path)
+        # Keep whatever finished, so an interrupted run resumes where it stopped
+        if manifest is not None:
+            manifest.save()
+    wall_time = time.time() - start_time
+    print(f"All jobs finished in {wall_time:.2f}s wall time\n")
+    
+    if prefilter is not None:
+        prefilter.time_saved = _prefilter_time_saved(outputs, pairs, param_sets, skipped, routed)
+    
+    # Report per pair, in the same order and format as run_benchmark
+    all_results = {}
+    for param_name in param_sets:
+        results = []
+        for ref, query in pairs:
+            lastz_name = CHEAP_PARAM_SET if (ref, query) in routed else param_name
+            blast_job, lastz_job = ('blast', None, ref, query), ('lastz', lastz_name, ref, query)
+            blast_vector, blast_time = outputs[blast_job]
+            lastz_vector, lastz_time = outputs[lastz_job]
+            
+            benchmark = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache, hit_cache=hit_cache,
+                                           profiler=profiler)
+            print(f"\n{'='*60}")
+            print(f"Benchmarking [{param_name}{' -> ' + lastz_name if lastz_name != param_name else ''}]: "
+                  f"{ref.name} vs {query.name}")
+            print(f"Reference length: {benchmark.reference_length:,} bp")
+            metrics = metrics_key = None
+            if manifest is not None:
+                settings = {'window_sizes': DEFAULT_WINDOW_SIZES}
+                if extended:
+                    settings.update(extended=True, hotspot_window=HOTSPOT_WINDOW, n_hotspots=N_HOTSPOTS)
+                metrics_key = manifest.metrics_key(job_keys[blast_job], job_keys[lastz_job], **settings)
+                metrics = manifest.load_metrics(metrics_key)
+            if metrics is None:
+                compare = benchmark.compare_blocks if extended else benchmark.compare_vectors
+                metrics = compare(blast_vector, lastz_vector)
+                if metrics_key is not None:
+                    manifest.store_metrics(metrics_key, metrics)
+            benchmark.print_results(blast_time, lastz_time, metrics)
+            
+            results.append({
+                'reference': ref.name,
+                'query': query.name,
+                'blast_time': blast_time,
+                'lastz_time': lastz_time,
+                'speedup': blast_time / lastz_time,
+                'metrics': metrics,
+                'blast_vector': blast_vector,
+                'lastz_vector': lastz_vector,
+                'routed': (ref, query) in routed
+            })
+        all_results[param_name] = results
+    
+    if manifest is not None:
+        manifest.save()
+    return all_results
+
+
+def _prefilter_time_saved(outputs: Dict[Tuple, Tuple], pairs: List[Tuple[Path, Path]],
+                          param_sets: Dict[str, Dict[str, str]], skipped: List[Tuple[Path, Path]],
+                          routed: set) -> float:
+    """Estimate the alignment time the prefilter saved, in seconds.
+    
+    A skipped pair is charged the mean BLAST and per-parameter-set LASTZ
+    runtimes of the pairs that were aligned normally; a routed pair saves
+    those LASTZ runtimes less its one cheap LASTZ run.
+    """
+    normal = [pair for pair in pairs if pair not in routed]
+    if not normal:
+        return 0.0
+    mean_blast = np.mean([outputs[('blast', None, ref, query)][1] for ref, query in normal])
+    mean_lastz = sum(np.mean([outputs[('lastz', name, ref, query)][1] for ref, query in normal])
+                     for name in param_sets)
+    
+    saved = len(skipped) * (mean_blast + mean_lastz)
+    for ref, query in routed:
+        saved += mean_lastz - outputs[('lastz', CHEAP_PARAM_SET, ref, query)][1]
+    return float(saved)
+
+
+def print_summary(param_name: str, results: List[Dict], target: float = SIMILARITY_TARGET):
+    """Print the summary table for one parameter set.
+    
+    Results with a status other than 'ok' (timed out, failed or cancelled
+    comparisons from async_runner.py) are left out of the averages but
+    count as 0% against the target.
+    """
+    print(f"\n{'='*60}")
+    print(f"SUMMARY - {param_name.upper()}")
+    print(f"{'='*60}")
+    print(f"Total comparisons: {len(results)}")
+    
+    completed = [r for r in results if r.get('status', 'ok') == 'ok']
+    incomplete = [r['status'] for r in results if r.get('status', 'ok') != 'ok']
+    avg_similarity = np.mean([r['metrics']['bases_same_identity'] for r in completed]) if completed else 0.0
+    avg_speedup = np.mean([r['speedup'] for r in completed]) if completed else 0.0
+    avg_correlation = np.mean([r['metrics']['correlation'] for r in completed]) if completed else 0.0
+    
+    print(f"Average bases with same identity: {avg_similarity:.2f}%")
+    print(f"Average correlation: {avg_correlation:.4f}")
+    print(f"Average speedup (BLAST/LASTZ): {avg_speedup:.2f}x")
+    if incomplete:
+        counts = ', '.join(f"{incomplete.count(status)} {status}" for status in dict.fromkeys(incomplete))
+        avg_similarity = avg_similarity * len(completed) / len(results)
+        print(f"Not completed: {counts}; counting them as 0%: {avg_similarity:.2f}% same identity")
+    print(f"\nTarget: ≥{target:.0f}% similarity between BLAST and LASTZ")
+    
+    if avg_similarity >= target:
+        print("✓ PASSED: LASTZ matches BLAST results")
+    else:
+        print("✗ FAILED: LASTZ does not match BLAST results closely enough")
+    
+    print(f"{'='*60}\n")
+
+
+def print_comparison(all_results: Dict[str, List[Dict]]):
+    """Print one line of averages per parameter set, over its completed comparisons."""
+    for param_name, results in all_results.items():
+        completed = [r for r in results if r.get('status', 'ok') == 'ok']
+        if not completed:
+            print(f"{param_name.upper():15s} | No completed comparisons")
+            continue
+        avg_similarity = np.mean([r['metrics']['bases_same_identity'] for r in completed])
+        avg_speedup = np.mean([r['speedup'] for r in completed])
+        avg_correlation = np.mean([r['metrics']['correlation'] for r in completed])
+        print(f"{param_name.upper():15s} | Similarity: {avg_similarity:5.2f}% | Correlation: {avg_correlation:.4f} | Speedup: {avg_speedup:.2f}x")
+
+
+def parse_lastz_params(values: Iterable[str]) -> Dict[str, str]:
+    """Turn --lastz-param KEY[=VALUE] arguments into run_lastz parameters (True for bare flags)."""
+    params = {}
+    for value in values:
+        key, _, setting = value.partition('=')
+        params[key] = setting or True
+    return params
 
 
 def main():
     """Run benchmarks on all E. coli genome pairs."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Maximum concurrent alignment jobs (default: number of cores)')
+    parser.add_argument('--cores', type=int, default=None,
+                        help='Total core budget shared by jobs and BLAST threads (default: all)')
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    parser.add_argument('--spill-hits', action='store_true',
+                        help='Cache hits as uncompressed spill files written while the aligner runs')
+    parser.add_argument('--no-hit-cache', action='store_true',
+                        help='Always re-run the aligners instead of reusing cached hits or recorded results')
+    parser.add_argument('--no-manifest', action='store_true',
+                        help='Recompute every pair from the hit cache instead of reusing recorded results')
+    parser.add_argument('--db-cache-mb', type=int, default=2048,
+                        help='Size limit of the BLAST database cache in MB (default: 2048)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Align each reference against all of its queries in one BLAST/LASTZ run')
+    parser.add_argument('--min-ani', type=float, default=None,
+                        help='Prefilter pairs whose k-mer estimated ANI (%%) is below this (default: off)')
+    parser.add_argument('--prefilter-action', choices=('skip', 'cheap'), default='skip',
+                        help='Skip prefiltered pairs, or align them once with cheap LASTZ settings (default: skip)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print wall time, CPU time, data and peak memory per pipeline stage')
+    parser.add_argument('--trace', type=Path, default=None,
+                        help='Write the stage spans of every job as a Chrome trace to this file (implies --profile)')
+    parser.add_argument('--cprofile', type=Path, default=None,
+                        help='Run the Python-side stages under cProfile and write the stats here (implies --profile)')
+    parser.add_argument('--extended-metrics', action='store_true',
+                        help='Also report identity histograms and disagreement hot spots, '
+                             'comparing in one pass over fixed-size blocks')
+    args = parser.parse_args()
+    
     examples_dir = Path('examples')
     
     # Get all E. coli genomes
@@ -258,72 +1941,54 @@ def main():
         print(f"  - {genome.name}")
     
     # Test different LASTZ parameter sets
-    param_sets = {
-        'default': {},  # No special parameters - use LASTZ defaults
-        'current': {
-            'ambiguous': 'iupac',
-            'noentropy': True,
-            'notransition': True,
-            'seed': 'match14',
-            'step': '10',
-            'maxwordcount': '90%',
-            'masking': '10',
-            'hspthresh': 'top50%'
-        }
-    }
+    param_sets = PARAM_SETS
     
     # Run pairwise comparisons with different parameter sets
-    all_results = {}
+    db_cache = BlastDbCache(args.cache_dir, max_bytes=args.db_cache_mb * 1024**2)
+    hit_cache = None if args.no_hit_cache else HitCache(args.cache_dir, spill=args.spill_hits)
+    manifest = None if args.no_hit_cache or args.no_manifest else ResultManifest(args.cache_dir)
+    prefilter = None
+    if args.min_ani is not None:
+        prefilter = GenomePrefilter(args.min_ani, args.prefilter_action, cache_dir=args.cache_dir)
+    profiler = None
+    if args.profile or args.trace or args.cprofile:
+        profiler = StageProfiler(cprofile=args.cprofile is not None)
+    try:
+        all_results = run_all_vs_all(genomes, param_sets, max_workers=args.workers, cores=args.cores,
+                                     db_cache=db_cache, hit_cache=hit_cache, batch=args.batch,
+                                     prefilter=prefilter, manifest=manifest, profiler=profiler,
+                                     extended=args.extended_metrics)
+    finally:
+        db_cache.close()
     
-    for param_name, params in param_sets.items():
-        print(f"\n{'#'*60}")
-        print(f"# Testing parameter set: {param_name.upper()}")
-        print(f"{'#'*60}\n")
-        
-        results = []
-        for i, ref_genome in enumerate(genomes):
-            for query_genome in genomes[i+1:]:
-                benchmark = AlignmentBenchmark(str(ref_genome), str(query_genome))
-                result = benchmark.run_benchmark(params)
-                results.append({
-                    'reference': ref_genome.name,
-                    'query': query_genome.name,
-                    **result
-                })
-        
-        all_results[param_name] = results
-        
-        # Summary for this parameter set
-        print(f"\n{'='*60}")
-        print(f"SUMMARY - {param_name.upper()}")
-        print(f"{'='*60}")
-        print(f"Total comparisons: {len(results)}")
-        
-        avg_similarity = np.mean([r['metrics']['bases_same_identity'] for r in results])
-        avg_speedup = np.mean([r['speedup'] for r in results])
-        avg_correlation = np.mean([r['metrics']['correlation'] for r in results])
-        
-        print(f"Average bases with same identity: {avg_similarity:.2f}%")
-        print(f"Average correlation: {avg_correlation:.4f}")
-        print(f"Average speedup (BLAST/LASTZ): {avg_speedup:.2f}x")
-        print(f"\nTarget: ≥95% similarity between BLAST and LASTZ")
-        
-        if avg_similarity >= 95:
-            print("✓ PASSED: LASTZ matches BLAST results")
-        else:
-            print("✗ FAILED: LASTZ does not match BLAST results closely enough")
-        
-        print(f"{'='*60}\n")
+    for param_name, results in all_results.items():
+        print_summary(param_name, results)
     
     # Final comparison
     print(f"\n{'#'*60}")
     print("# FINAL COMPARISON")
     print(f"{'#'*60}\n")
-    for param_name, results in all_results.items():
-        avg_similarity = np.mean([r['metrics']['bases_same_identity'] for r in results])
-        avg_speedup = np.mean([r['speedup'] for r in results])
-        avg_correlation = np.mean([r['metrics']['correlation'] for r in results])
-        print(f"{param_name.upper():15s} | Similarity: {avg_similarity:5.2f}% | Correlation: {avg_correlation:.4f} | Speedup: {avg_speedup:.2f}x")
+    print_comparison(all_results)
+    if hit_cache is not None:
+        print(f"\nAlignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+    if manifest is not None:
+        print(f"Result manifest: {manifest.reused} job(s) reused, {manifest.computed} run; "
+              f"{manifest.metrics_reused} pair metric set(s) reused")
+    if prefilter is not None:
+        action = 'skipped' if prefilter.action == 'skip' else 'aligned with cheap LASTZ settings'
+        print(f"\nPrefilter: {len(prefilter.low_pairs)} pair(s) below {prefilter.min_ani:.1f}% "
+              f"estimated ANI {action}")
+        print(f"  Sketching: {prefilter.sketch_time:.2f}s "
+              f"(sketch cache: {prefilter.cache.hits} hit(s), {prefilter.cache.misses} miss(es))")
+        print(f"  Estimated alignment time saved: {prefilter.time_saved:.2f}s")
+    if profiler is not None:
+        profiler.print_summary()
+        if args.trace:
+            profiler.write_trace(args.trace)
+            print(f"Wrote {len(profiler.spans):,} span(s) to {args.trace}")
+        if args.cprofile:
+            profiler.write_cprofile(args.cprofile)
+            print(f"Wrote cProfile stats to {args.cprofile}")
     print()
 
 
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Compare chunked (windowed, concurrent) LASTZ against a single LASTZ process."""
+
+import argparse
+import os
+
+from benchmark_alignment import AlignmentBenchmark, DEFAULT_WINDOW_OVERLAP
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    parser.add_argument('--query', default='examples/E_coli_K12MG1655.fna')
+    parser.add_argument('--windows', type=int, default=os.cpu_count() or 1,
+                        help='Number of reference windows (default: number of cores)')
+    parser.add_argument('--overlap', type=int, default=DEFAULT_WINDOW_OVERLAP,
+                        help=f'Bases each window extends past its core (default: {DEFAULT_WINDOW_OVERLAP})')
+    args = parser.parse_args()
+    
+    # Minimal parameters: the slowest single-process configuration
+    params = {'ambiguous': 'iupac'}
+    benchmark = AlignmentBenchmark(args.reference, args.query)
+    
+    print("="*60)
+    print("SINGLE PROCESS")
+    print("="*60)
+    single_vector, single_time = benchmark.run_lastz(params)
+    
+    print("\n" + "="*60)
+    print(f"CHUNKED ({args.windows} windows, {args.overlap:,} bp overlap)")
+    print("="*60)
+    chunked_vector, chunked_time = benchmark.run_lastz(params, windows=args.windows,
+                                                       overlap=args.overlap)
+    
+    metrics = benchmark.compare_vectors(single_vector, chunked_vector)
+    
+    print("\n" + "="*60)
+    print("CHUNKED vs SINGLE PROCESS")
+    print("="*60)
+    print(f"Wall time:")
+    print(f"  Single:  {single_time:.2f}s")
+    print(f"  Chunked: {chunked_time:.2f}s")
+    print(f"  Speedup: {single_time / chunked_time:.2f}x")
+    print(f"\nCoverage:")
+    print(f"  Single:  {metrics['blast_coverage']:.2f}%")
+    print(f"  Chunked: {metrics['lastz_coverage']:.2f}%")
+    print(f"  Overlap: {metrics['overlap_coverage']:.2f}%")
+    print(f"\nIdentity (bases covered by both):")
+    print(f"  Bases with same identity (±1%): {metrics['bases_same_identity']:.2f}%")
+    print(f"  Mean absolute difference: {metrics['mean_abs_diff']:.4f}%")
+    print(f"  Correlation: {metrics['correlation']:.4f}")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
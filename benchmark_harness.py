@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Repeatable BLAST/LASTZ timing harness with machine-readable results.
+
+`run` aligns one genome pair with each requested tool several times after
+warmup runs, recording the wall time, CPU time (user + system) and peak RSS
+of the aligner processes from os.wait4. Each tool gets one result row with
+the median and a bootstrap confidence interval for every measure, keyed by
+tool, tool version, parameters and genome pair. Rows are written as JSON or
+CSV, chosen by the output file's extension.
+
+`compare` matches the rows of two result files on tool, parameters and
+genome pair, and flags a regression when the new median is more than the
+threshold above the old one and the two confidence intervals do not
+overlap. It exits with status 1 if anything regressed.
+
+The hit cache is never used here: every repeat runs the aligner.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from alignment_cache import BlastDbCache, tool_version
+from benchmark_alignment import LASTZ_FORMATS, LASTZ_PARAM_HELP, AlignmentBenchmark, parse_lastz_params
+from profiling import RSS_UNIT_BYTES
+
+# Measures recorded for every repeat, with their units
+MEASURES = {'wall': 's', 'cpu': 's', 'peak_rss': 'MB'}
+
+# Row fields that identify a measurement; version is reported, not matched
+KEY_FIELDS = ('tool', 'params', 'reference', 'query')
+
+
+def median_ci(samples: List[float], confidence: float = 0.95, resamples: int = 2000,
+              seed: int = 0) -> Tuple[float, float]:
+    """Bootstrap confidence interval for the median of samples."""
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) < 2:
+        return float(samples[0]), float(samples[0])
+    rng = np.random.default_rng(seed)
+    medians = np.median(rng.choice(samples, (resamples, len(samples))), axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(medians, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def command_params(cmd: List[str], inputs: Tuple[str, ...], drop_options: Tuple[str, ...] = ()) -> str:
+    """Command-line options of cmd without the input paths and options in drop_options."""
+    params = []
+    skip = False
+    for arg in cmd[1:]:
+        if skip:
+            skip = False
+        elif arg in drop_options:
+            skip = True
+        elif arg.split('[')[0] not in inputs:
+            params.append(arg)
+    return ' '.join(params)
+
+
+def measure(benchmark: AlignmentBenchmark, tool: str, lastz_params: Dict[str, str],
+            threads: int, db_path: Path) -> Dict[str, float]:
+    """Run one alignment and return its wall time, CPU time and peak RSS."""
+    benchmark.child_usage.clear()
+    if tool == 'blast':
+        _, wall = benchmark.run_blast(threads=threads, db_path=db_path)
+    else:
+        _, wall = benchmark.run_lastz(lastz_params)
+    usage = benchmark.child_usage
+    return {
+        'wall': wall,
+        'cpu': sum(u.ru_utime + u.ru_stime for u in usage),
+        # Processes of a chunked run overlap, so this is the largest single process
+        'peak_rss': max((u.ru_maxrss for u in usage), default=0) * RSS_UNIT_BYTES / 1024**2,
+    }
+
+
+def run_tool(benchmark: AlignmentBenchmark, tool: str, lastz_params: Dict[str, str],
+             threads: int, repeats: int, warmup: int, confidence: float) -> Dict:
+    """Time one tool repeatedly and summarise the measurements as a result row."""
+    db_path = benchmark.make_blast_db() if tool == 'blast' else None
+    if tool == 'blast':
+        cmd = benchmark.blast_command(db_path, threads)
+        params = command_params(cmd, (str(db_path), str(benchmark.query_file)), ('-query', '-db'))
+    else:
+        cmd = benchmark.lastz_command(lastz_params)
+        params = command_params(cmd, (str(benchmark.reference_file), str(benchmark.query_file)))
+
+    for i in range(warmup):
+        print(f"\n[{tool}] Warmup {i + 1}/{warmup}")
+        measure(benchmark, tool, lastz_params, threads, db_path)
+
+    samples = {name: [] for name in MEASURES}
+    for i in range(repeats):
+        print(f"\n[{tool}] Repeat {i + 1}/{repeats}")
+        for name, value in measure(benchmark, tool, lastz_params, threads, db_path).items():
+            samples[name].append(value)
+    if db_path is not None:
+        benchmark.db_cache.release(db_path)
+
+    row = {
+        'tool': tool,
+        'version': tool_version(cmd[0]),
+        'params': params,
+        'reference': benchmark.reference_file.name,
+        'query': benchmark.query_file.name,
+        'repeats': repeats,
+        'warmup': warmup,
+        'confidence': confidence,
+    }
+    for name, values in samples.items():
+        row[f'{name}_median'] = float(np.median(values))
+        row[f'{name}_ci_low'], row[f'{name}_ci_high'] = median_ci(values, confidence)
+        row[f'{name}_samples'] = values
+    return row
+
+
+def write_results(rows: List[Dict], output: Path):
+    """Write result rows as JSON, or as CSV if output ends in .csv."""
+    if output.suffix == '.csv':
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: ';'.join(f'{v:.6g}' for v in value) if isinstance(value, list) else value
+                                 for key, value in row.items()})
+    else:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+def read_results(path: Path) -> List[Dict]:
+    """Read result rows written by write_results."""
+    if path.suffix == '.csv':
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            for name in MEASURES:
+                for stat in ('median', 'ci_low', 'ci_high'):
+                    row[f'{name}_{stat}'] = float(row[f'{name}_{stat}'])
+        return rows
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_row(row: Dict):
+    """Print one result row's medians and confidence intervals."""
+    print(f"{row['tool']} ({row['version']}) {row['params']}")
+    print(f"  {row['query']} vs {row['reference']}: {row['repeats']} repeat(s), {row['warmup']} warmup")
+    for name, unit in MEASURES.items():
+        print(f"  {name:<9} median {row[f'{name}_median']:9.2f}{unit} "
+              f"[{row[f'{name}_ci_low']:.2f}, {row[f'{name}_ci_high']:.2f}] ({row['confidence']:.0%} CI)")
+
+
+def compare_results(old_rows: List[Dict], new_rows: List[Dict], threshold: float) -> int:
+    """Print old vs new medians for matching rows and return the number of regressions."""
+    old_by_key = {tuple(row[field] for field in KEY_FIELDS): row for row in old_rows}
+    regressions = 0
+
+    print(f"{'='*60}")
+    print(f"COMPARISON (regression: > {threshold:.0%} slower and CIs do not overlap)")
+    print(f"{'='*60}")
+    for new in new_rows:
+        key = tuple(new[field] for field in KEY_FIELDS)
+        old = old_by_key.get(key)
+        if old is None:
+            print(f"\n{new['tool']} {new['params']}: no matching row in the old results")
+            continue
+
+        print(f"\n{new['tool']} {new['params']} ({new['query']} vs {new['reference']})")
+        if old['version'] != new['version']:
+            print(f"  Version: {old['version']} -> {new['version']}")
+        for name, unit in MEASURES.items():
+            old_median, new_median = old[f'{name}_median'], new[f'{name}_median']
+            change = (new_median - old_median) / old_median if old_median else 0.0
+            regressed = (change > threshold and new[f'{name}_ci_low'] > old[f'{name}_ci_high'])
+            regressions += regressed
+            flag = '  REGRESSION' if regressed else ''
+            print(f"  {name:<9} {old_median:9.2f}{unit} -> {new_median:9.2f}{unit} ({change:+.1%}){flag}")
+
+    print(f"\n{regressions} regression(s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Time the aligners and write a results file')
+    run_parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    run_parser.add_argument('--query', default='examples/E_coli_K12MG1655.fna')
+    run_parser.add_argument('--tools', nargs='+', choices=('blast', 'lastz'), default=['blast', 'lastz'])
+    run_parser.add_argument('--lastz-param', action='append', default=[], metavar='KEY[=VALUE]',
+                            help=LASTZ_PARAM_HELP)
+    run_parser.add_argument('--lastz-format', choices=LASTZ_FORMATS, default='blastn',
+                            help='LASTZ output format to time parsing of (default: blastn)')
+    run_parser.add_argument('--threads', type=int, default=4, help='BLAST threads (default: 4)')
+    run_parser.add_argument('--repeats', type=int, default=5, help='Timed runs per tool (default: 5)')
+    run_parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per tool first (default: 1)')
+    run_parser.add_argument('--confidence', type=float, default=0.95,
+                            help='Confidence level of the median intervals (default: 0.95)')
+    run_parser.add_argument('--cache-dir', type=Path, default=None,
+                            help='Directory for cached BLAST databases (default: $BRIGX_CACHE_DIR or ~/.cache/brigx)')
+    run_parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'),
+                            help='Results file, .json or .csv (default: benchmark_results.json)')
+
+    compare_parser = subparsers.add_parser('compare', help='Flag regressions between two results files')
+    compare_parser.add_argument('old', type=Path)
+    compare_parser.add_argument('new', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.05,
+                                help='Relative slowdown of the median that counts as a regression (default: 0.05)')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        regressions = compare_results(read_results(args.old), read_results(args.new), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    if args.repeats < 1:
+        # median_ci needs at least one timed run
+        run_parser.error(f"--repeats must be at least 1, not {args.repeats}")
+
+    lastz_params = parse_lastz_params(args.lastz_param)
+
+    db_cache = BlastDbCache(args.cache_dir)
+    benchmark = AlignmentBenchmark(args.reference, args.query, db_cache=db_cache, lastz_format=args.lastz_format)
+    try:
+        rows = [run_tool(benchmark, tool, lastz_params, args.threads, args.repeats, args.warmup, args.confidence)
+                for tool in args.tools]
+    finally:
+        db_cache.close()
+
+    print(f"\n{'='*60}")
+    print("RESULTS")
+    print(f"{'='*60}")
+    for row in rows:
+        print_row(row)
+    write_results(rows, args.output)
+    print(f"\nWrote {len(rows)} row(s) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
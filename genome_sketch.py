@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+k-mer sketches for estimating how similar two genomes are before aligning them.
+
+Each genome is reduced to a FracMinHash sketch: every canonical k-mer is
+hashed and only hashes below 2**64 / scaled are kept, about one k-mer in
+`scaled`. Because the same k-mers are kept from every genome, the shared
+fraction of two sketches estimates the shared fraction of k-mers, and from
+that the average nucleotide identity (ANI) of the aligned parts.
+
+Run as a script, prints the estimated ANI between every pair of genomes.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from alignment_cache import SketchCache
+
+DEFAULT_K = 21
+DEFAULT_SCALED = 1000
+
+# LASTZ settings for pairs routed away from the full parameter sets: a long
+# exact seed, sparse seeding and no gapped extension
+CHEAP_LASTZ_PARAMS = {'seed': 'match15', 'step': '20', 'nogapped': True}
+
+# 2-bit codes for A, C, G, T in either case; anything else is 4 (not a base)
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(b'ACGT'):
+    _BASE_CODES[_base] = _BASE_CODES[_base + 32] = _code
+
+
+def read_sequence(fasta_file: str) -> bytes:
+    """All sequences of a FASTA file, joined with an N between records."""
+    parts = []
+    with open(fasta_file, 'rb') as f:
+        for line in f:
+            parts.append(b'N' if line.startswith(b'>') else line.strip())
+    return b''.join(parts)
+
+
+def encode_2bit(sequence: bytes) -> np.ndarray:
+    """Map bases to 2-bit codes (uint8 0-3), with 4 for anything that is not A, C, G or T."""
+    return _BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+
+
+def canonical_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """Pack every valid k-mer of a 2-bit sequence into a uint64, strand-independently.
+
+    A k-mer and its reverse complement map to the same value (the smaller
+    of the two packings). k-mers containing a non-ACGT code are dropped.
+    """
+    if not 0 < k <= 32:
+        raise ValueError(f"k must be between 1 and 32, not {k}")
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    invalid = np.concatenate([[0], np.cumsum(codes == 4)])
+    valid = invalid[k:] - invalid[:n] == 0
+    bases = np.where(codes == 4, 0, codes).astype(np.uint64)
+
+    complement = np.uint64(3) - bases
+    forward = np.zeros(n, dtype=np.uint64)
+    reverse = np.zeros(n, dtype=np.uint64)
+    shifted = np.empty(n, dtype=np.uint64)
+    for j in range(k):
+        np.left_shift(forward, np.uint64(2), out=forward)
+        np.bitwise_or(forward, bases[j:j + n], out=forward)
+        np.left_shift(complement[j:j + n], np.uint64(2 * j), out=shifted)
+        np.bitwise_or(reverse, shifted, out=reverse)
+    return np.minimum(forward, reverse, out=forward)[valid]
+
+
+def hash64(values: np.ndarray) -> np.ndarray:
+    """Mix uint64 values into well-spread 64-bit hashes (the splitmix64 finalizer)."""
+    x = values.astype(np.uint64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xbf58476d1ce4e5b9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94d049bb133111eb)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def sketch_sequence(sequence: bytes, k: int = DEFAULT_K, scaled: int = DEFAULT_SCALED) -> np.ndarray:
+    """Sorted, unique hashes of the canonical k-mers that fall below 2**64 / scaled."""
+    hashes = hash64(canonical_kmers(encode_2bit(sequence), k))
+    max_hash = np.uint64((2**64 - 1) // scaled)
+    return np.unique(hashes[hashes <= max_hash])
+
+
+def containment(query_sketch: np.ndarray, reference_sketch: np.ndarray) -> float:
+    """Fraction of the smaller sketch's hashes found in the other one."""
+    smaller = min(len(query_sketch), len(reference_sketch))
+    if smaller == 0:
+        return 0.0
+    shared = len(np.intersect1d(query_sketch, reference_sketch, assume_unique=True))
+    return shared / smaller
+
+
+def ani_from_containment(fraction: float, k: int = DEFAULT_K) -> float:
+    """Estimated ANI (%) of genomes sharing fraction of their k-mers.
+
+    A k-mer survives only if all k of its bases are identical, so the
+    shared fraction is about ANI**k.
+    """
+    return fraction ** (1 / k) * 100 if fraction > 0 else 0.0
+
+
+class GenomePrefilter:
+    """Estimates ANI between genome pairs from cached sketches, to decide which to align.
+
+    Pairs whose estimated ANI is below min_ani are either skipped
+    (action='skip') or aligned with CHEAP_LASTZ_PARAMS (action='cheap').
+    Counters record what was decided, the time spent sketching and the
+    alignment time the caller estimates was saved.
+    """
+
+    def __init__(self, min_ani: float, action: str = 'skip', k: int = DEFAULT_K,
+                 scaled: int = DEFAULT_SCALED, cache_dir: Path = None):
+        if action not in ('skip', 'cheap'):
+            raise ValueError(f"Unknown prefilter action: {action}")
+        self.min_ani = min_ani
+        self.action = action
+        self.k = k
+        self.scaled = scaled
+        self.cache = SketchCache(cache_dir)
+        self.cheap_params = CHEAP_LASTZ_PARAMS
+        self.sketches: Dict[str, np.ndarray] = {}
+        self.ani: Dict[Tuple[str, str], float] = {}
+        self.low_pairs: List[Tuple[Path, Path]] = []
+        self.sketch_time = 0.0
+        self.time_saved = 0.0
+
+    def sketch(self, fasta_file: str) -> np.ndarray:
+        """Sketch of a genome, from memory, the sketch cache or computed afresh."""
+        fasta_file = str(fasta_file)
+        if fasta_file not in self.sketches:
+            start_time = time.time()
+            self.sketches[fasta_file] = self.cache.get(
+                fasta_file, f'k{self.k}-s{self.scaled}',
+                lambda: sketch_sequence(read_sequence(fasta_file), self.k, self.scaled))
+            self.sketch_time += time.time() - start_time
+        return self.sketches[fasta_file]
+
+    def estimate_ani(self, reference_file: str, query_file: str) -> float:
+        """Estimated ANI (%) between two genomes."""
+        fraction = containment(self.sketch(query_file), self.sketch(reference_file))
+        return ani_from_containment(fraction, self.k)
+
+    def split_pairs(self, pairs: List[Tuple[Path, Path]]) -> Tuple[List[Tuple[Path, Path]], List[Tuple[Path, Path]]]:
+        """Split (reference, query) pairs into those at or above min_ani and those below it."""
+        passing, low = [], []
+        for ref, query in pairs:
+            ani = self.ani[(str(ref), str(query))] = self.estimate_ani(ref, query)
+            (passing if ani >= self.min_ani else low).append((ref, query))
+            print(f"  {ref.name} vs {query.name}: estimated ANI {ani:.2f}%"
+                  f"{'' if ani >= self.min_ani else f' (below {self.min_ani:.1f}%, {self.action})'}")
+        self.low_pairs = low
+        return passing, low
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('genomes', nargs='*', type=Path,
+                        help='FASTA files (default: examples/E_coli_*.fna)')
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help=f'k-mer size (default: {DEFAULT_K})')
+    parser.add_argument('--scaled', type=int, default=DEFAULT_SCALED,
+                        help=f'Keep about one k-mer in this many (default: {DEFAULT_SCALED})')
+    parser.add_argument('--cache-dir', type=Path, default=None,
+                        help='Directory for cached sketches (default: $BRIGX_CACHE_DIR or ~/.cache/brigx)')
+    args = parser.parse_args()
+
+    genomes = args.genomes or sorted(Path('examples').glob('E_coli_*.fna'))
+    prefilter = GenomePrefilter(0, k=args.k, scaled=args.scaled, cache_dir=args.cache_dir)
+
+    for genome in genomes:
+        print(f"{genome.name}: {len(prefilter.sketch(genome)):,} hashes")
+    print(f"Sketching took {prefilter.sketch_time:.2f}s "
+          f"(sketch cache: {prefilter.cache.hits} hit(s), {prefilter.cache.misses} miss(es))\n")
+
+    prefilter.split_pairs([(ref, query) for i, ref in enumerate(genomes) for query in genomes[i+1:]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Interval index over alignment hits, and per-region statistics built on it.
+
+Run as a script, aligns the query against the reference with BLAST and
+LASTZ (through the hit cache), indexes both tools' hits and reports hit
+count, coverage and identity for every region in a BRIG sites file such as
+examples/SP-Sites.txt.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from alignment_cache import CACHE_DIR_HELP, HitCache
+from benchmark_alignment import LASTZ_PARAM_HELP, AlignmentBenchmark, ReferenceIndex, parse_lastz_params
+
+
+class HitIndex:
+    """Hits as sorted NumPy interval arrays, for vectorized overlap queries.
+
+    Intervals are 0-based, half-open [start, end) positions on the
+    concatenated reference. They are sorted by start and augmented with
+    max_end, the running maximum of end: every hit before the first
+    position where max_end exceeds a query's start ends at or before it,
+    so a query only scans hits between that position and the first hit
+    starting at or after its end. The running maximum also gives the union
+    of the hits (a new covered stretch begins wherever a start passes the
+    max_end before it), which answers coverage queries in O(log n).
+
+    Every query method takes arrays of query intervals and answers them
+    all at once.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, pident: np.ndarray):
+        self.order = np.argsort(starts, kind='stable')
+        self.starts = np.asarray(starts, dtype=np.int64)[self.order]
+        self.ends = np.asarray(ends, dtype=np.int64)[self.order]
+        self.pident = np.asarray(pident, dtype=np.float64)[self.order]
+        self.max_end = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self.sorted_ends = np.sort(self.ends)
+
+        # Union of all hits as disjoint [union_starts, union_ends), with the
+        # covered length before each stretch in union_before
+        new_stretch = np.ones(len(self.starts), dtype=bool)
+        new_stretch[1:] = self.starts[1:] > self.max_end[:-1]
+        first = np.flatnonzero(new_stretch)
+        self.union_starts = self.starts[first]
+        self.union_ends = self.max_end[np.append(first[1:] - 1, len(self.starts) - 1)] if len(first) else first
+        lengths = self.union_ends - self.union_starts
+        self.union_before = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(lengths) else lengths
+
+    @classmethod
+    def from_hits(cls, hits: np.ndarray, reference: ReferenceIndex) -> 'HitIndex':
+        """Index HIT_DTYPE hits, as parsed by the benchmark."""
+        starts, ends = reference.hit_ranges(hits)
+        return cls(starts, ends, hits['pident'])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def count_overlaps(self, query_starts: np.ndarray, query_ends: np.ndarray) -> np.ndarray:
+        """Number of hits overlapping each query interval."""
+        query_starts, query_ends = np.asarray(query_starts), np.asarray(query_ends)
+        # Hits starting before the end, less those that also end by the start
+        return (np.searchsorted(self.starts, query_ends, side='left')
+                - np.searchsorted(self.sorted_ends, query_starts, side='right'))
+
+    def depth(self, positions: np.ndarray) -> np.ndarray:
+        """Number of distinct hits covering each (0-based) position."""
+        return self.count_overlaps(positions, np.asarray(positions) + 1)
+
+    def overlaps(self, query_starts: np.ndarray, query_ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """All (query, hit) pairs that overlap.
+
+        Returns parallel arrays of query indexes and indexes into the
+        sorted hit arrays (self.order maps them back to input order),
+        grouped by query.
+        """
+        query_starts, query_ends = np.asarray(query_starts), np.asarray(query_ends)
+        first = np.searchsorted(self.max_end, query_starts, side='right')
+        last = np.searchsorted(self.starts, query_ends, side='left')
+        counts = np.maximum(last - first, 0)
+
+        # Expand each query's candidate slice [first, last) into flat arrays
+        query_ids = np.repeat(np.arange(len(query_starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        hit_ids = np.repeat(first, counts) + offsets
+
+        keep = self.ends[hit_ids] > query_starts[query_ids]
+        return query_ids[keep], hit_ids[keep]
+
+    def covered_bases(self, query_starts: np.ndarray, query_ends: np.ndarray) -> np.ndarray:
+        """Bases in each query interval covered by at least one hit."""
+        return self._covered_before(np.asarray(query_ends)) - self._covered_before(np.asarray(query_starts))
+
+    def _covered_before(self, positions: np.ndarray) -> np.ndarray:
+        """Covered bases in [0, position) for each position."""
+        if len(self.union_starts) == 0:
+            return np.zeros(len(positions), dtype=np.int64)
+        stretch = np.maximum(np.searchsorted(self.union_starts, positions, side='right') - 1, 0)
+        inside = np.clip(positions - self.union_starts[stretch], 0,
+                         self.union_ends[stretch] - self.union_starts[stretch])
+        return self.union_before[stretch] + inside
+
+    def region_stats(self, query_starts: np.ndarray, query_ends: np.ndarray) -> Dict[str, np.ndarray]:
+        """Hit count, coverage (%) and identity of the hits in each query interval.
+
+        identity is the mean percent identity of the overlapping hits,
+        weighted by how many bases of each fall inside the interval;
+        max_identity is that of the best overlapping hit. Both are 0 for
+        intervals without hits.
+        """
+        query_starts = np.asarray(query_starts, dtype=np.int64)
+        query_ends = np.asarray(query_ends, dtype=np.int64)
+        n = len(query_starts)
+
+        query_ids, hit_ids = self.overlaps(query_starts, query_ends)
+        overlap = (np.minimum(self.ends[hit_ids], query_ends[query_ids])
+                   - np.maximum(self.starts[hit_ids], query_starts[query_ids]))
+        weight = np.bincount(query_ids, weights=overlap, minlength=n)
+        weighted_identity = np.bincount(query_ids, weights=overlap * self.pident[hit_ids], minlength=n)
+        identity = np.zeros(n)
+        np.divide(weighted_identity, weight, out=identity, where=weight > 0)
+        max_identity = np.zeros(n)
+        np.maximum.at(max_identity, query_ids, self.pident[hit_ids])
+
+        lengths = np.maximum(query_ends - query_starts, 1)
+        return {
+            'hits': np.bincount(query_ids, minlength=n),
+            'coverage': self.covered_bases(query_starts, query_ends) / lengths * 100,
+            'identity': identity,
+            'max_identity': max_identity,
+        }
+
+
+def read_regions(path: Path) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Read a BRIG sites file (Start, Stop, Label; '#' comments).
+
+    Start and Stop are 1-based and inclusive; the returned starts and ends
+    are 0-based and half-open.
+    """
+    starts, ends, labels = [], [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            starts.append(int(fields[0]) - 1)
+            ends.append(int(fields[1]))
+            labels.append(fields[2] if len(fields) > 2 else '')
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    parser.add_argument('--query', default='examples/E_coli_K12MG1655.fna')
+    parser.add_argument('--regions', type=Path, default=Path('examples/SP-Sites.txt'))
+    parser.add_argument('--lastz-param', action='append', default=[], metavar='KEY[=VALUE]',
+                        help=LASTZ_PARAM_HELP)
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    args = parser.parse_args()
+
+    lastz_params = parse_lastz_params(args.lastz_param)
+
+    hit_cache = HitCache(args.cache_dir)
+    benchmark = AlignmentBenchmark(args.reference, args.query, hit_cache=hit_cache)
+    starts, ends, labels = read_regions(args.regions)
+
+    stats = {}
+    for tool in ('blast', 'lastz'):
+        if tool == 'blast':
+            benchmark.run_blast()
+        else:
+            benchmark.run_lastz(lastz_params)
+        start_time = time.perf_counter()
+        index = HitIndex.from_hits(benchmark.last_hits, benchmark.reference)
+        index_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        stats[tool] = index.region_stats(starts, ends)
+        query_time = time.perf_counter() - start_time
+        print(f"  Indexed {len(index):,} {tool.upper()} hits in {index_time * 1000:.2f}ms, "
+              f"{len(starts)} region queries in {query_time * 1000:.2f}ms")
+
+    print(f"\n{'='*96}")
+    print(f"REGIONS: {args.regions.name} ({benchmark.query_file.name} vs {benchmark.reference_file.name})")
+    print(f"{'='*96}")
+    print(f"{'Region':<10} {'Start':>10} {'Stop':>10} | {'BLAST hits':>10} {'cov':>7} {'id':>7} | "
+          f"{'LASTZ hits':>10} {'cov':>7} {'id':>7}")
+    print("-"*96)
+    for i, label in enumerate(labels):
+        blast, lastz = stats['blast'], stats['lastz']
+        print(f"{label:<10} {starts[i] + 1:>10,} {ends[i]:>10,} | "
+              f"{blast['hits'][i]:>10,} {blast['coverage'][i]:>6.1f}% {blast['identity'][i]:>6.2f}% | "
+              f"{lastz['hits'][i]:>10,} {lastz['coverage'][i]:>6.1f}% {lastz['identity'][i]:>6.2f}%")
+    print(f"{'='*96}")
+    print(f"Alignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Check how well preview mode's estimates match full BLAST vs LASTZ runs.
+
+For each genome pair, aligns a stratified sample of reference regions
+(AlignmentBenchmark.run_preview), then the whole reference, and reports
+each extrapolated metric against the full-run value: the error, and
+whether the full-run value fell inside the preview's error bars.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from alignment_cache import CACHE_DIR_HELP, BlastDbCache, HitCache
+from benchmark_alignment import (PARAM_SETS, PREVIEW_METRICS, PREVIEW_REGION_SIZE, PREVIEW_REGIONS,
+                                 AlignmentBenchmark)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('genomes', nargs='*', type=Path,
+                        help='FASTA files, compared pairwise (default: examples/E_coli_*.fna)')
+    parser.add_argument('--params', choices=sorted(PARAM_SETS), default='current',
+                        help='LASTZ parameter set (default: current)')
+    parser.add_argument('--regions', type=int, default=PREVIEW_REGIONS,
+                        help=f'Reference regions to align (default: {PREVIEW_REGIONS})')
+    parser.add_argument('--region-size', type=int, default=PREVIEW_REGION_SIZE,
+                        help=f'Region size in bp (default: {PREVIEW_REGION_SIZE})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for picking regions (default: 0)')
+    parser.add_argument('--no-full', action='store_true', help='Only run the previews')
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    args = parser.parse_args()
+
+    genomes = args.genomes or sorted(Path('examples').glob('E_coli_*.fna'))
+    pairs = [(ref, query) for i, ref in enumerate(genomes) for query in genomes[i+1:]]
+    db_cache = BlastDbCache(args.cache_dir)
+    hit_cache = HitCache(args.cache_dir)
+    params = PARAM_SETS[args.params]
+
+    rows = []
+    for ref, query in pairs:
+        benchmark = AlignmentBenchmark(str(ref), str(query), db_cache=db_cache, hit_cache=hit_cache)
+        start_time = time.time()
+        preview = benchmark.run_preview(params, n_regions=args.regions, region_size=args.region_size,
+                                        seed=args.seed)
+        preview_wall = time.time() - start_time
+        full_metrics = None
+        full_wall = None
+        if not args.no_full:
+            start_time = time.time()
+            full_metrics = benchmark.run_benchmark(params, compact=False)['metrics']
+            full_wall = time.time() - start_time
+        benchmark.print_preview(preview, full_metrics)
+        rows.append((ref, query, preview, preview_wall, full_metrics, full_wall))
+
+    print(f"\n{'='*80}")
+    print(f"PREVIEW vs FULL RUN ({args.params}, {args.regions} x {args.region_size:,} bp regions)")
+    print(f"{'='*80}")
+    for ref, query, preview, preview_wall, full_metrics, full_wall in rows:
+        timing = f"preview {preview_wall:.1f}s" + (f", full {full_wall:.1f}s" if full_wall is not None else "")
+        print(f"{ref.name} vs {query.name}: {timing}")
+    if not args.no_full and rows:
+        print(f"\n{'Metric':<22} | {'Mean |error|':>12} | {'Max |error|':>11} | {'Mean ±':>8} | In interval")
+        print("-"*80)
+        for name in PREVIEW_METRICS:
+            errors = np.array([abs(preview['metrics'][name] - full[name]) for _, _, preview, _, full, _ in rows])
+            bars = np.array([preview['errors'][name] for _, _, preview, _, _, _ in rows])
+            print(f"{name:<22} | {errors.mean():>12.3f} | {errors.max():>11.3f} | {bars.mean():>8.3f} | "
+                  f"{np.sum(errors <= bars)}/{len(rows)}")
+    print(f"{'='*80}")
+    print(f"Alignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+
+
+if __name__ == '__main__':
+    main()
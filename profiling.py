@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Stage-level profiling for the alignment benchmarks.
+
+A StageProfiler records spans: named stages of a run such as FASTA
+scanning, BLAST database creation, the aligner process, hit parsing,
+accumulation and vector comparison, each with its wall time, CPU time,
+bytes processed and memory high-water mark. Spans can be summarised per
+stage, or written as a Chrome trace (open it in chrome://tracing or
+https://ui.perfetto.dev) to see how the stages of every process overlap.
+With cprofile=True the Python-side stages also run under cProfile.
+
+Run as a script, summarises a trace written by benchmark_alignment.py
+--trace.
+"""
+
+import argparse
+import cProfile
+import functools
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+# ru_maxrss is in kilobytes on Linux but bytes on macOS
+RSS_UNIT_BYTES = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss() -> int:
+    """High-water mark of this process's resident set size, in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT_BYTES
+
+
+class StageProfiler:
+    """Records timed spans of benchmark stages.
+
+    Each span is a dict with the stage name, its start (seconds since the
+    epoch, so spans from different processes share one timeline), wall
+    and CPU time in seconds, bytes processed, the process's peak RSS at
+    the end of the span and how much the span raised it, the process and
+    thread it ran on, and any extra args.
+
+    CPU time is that of the thread the span ran on, except for spans added
+    with record, such as aligner processes, which bring their own.
+    Profilers in worker processes are sent back with export and combined
+    with merge.
+    """
+
+    def __init__(self, cprofile: bool = False):
+        self.spans: List[Dict] = []
+        self.profile = cProfile.Profile() if cprofile else None
+        # cProfile statistics merged in from other processes
+        self.merged_stats: List[Dict] = []
+        # cProfile only follows the thread that enables it
+        self._profile_thread = threading.get_ident()
+        self._depth = 0
+
+    @contextmanager
+    def span(self, name: str, nbytes: int = 0, **args) -> Iterator[Dict]:
+        """Record the enclosed block as a span of stage name.
+
+        Yields the span's args, so the block can add to them, or set
+        'bytes' once it knows how much it processed.
+        """
+        span_args = dict(args)
+        profiled = self.profile is not None and threading.get_ident() == self._profile_thread
+        peak_before = peak_rss()
+        start = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profiled:
+            if self._depth == 0:
+                self.profile.enable()
+            self._depth += 1
+        try:
+            yield span_args
+        finally:
+            if profiled:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.profile.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            peak = peak_rss()
+            self.record(name, start, wall, cpu, span_args.pop('bytes', nbytes), peak,
+                        peak - peak_before, **span_args)
+
+    def record(self, name: str, start: float, wall: float, cpu: float, nbytes: int = 0,
+               peak_rss: int = 0, peak_rss_growth: int = 0, pid: int = None, tid: int = None, **args):
+        """Add a span measured elsewhere (pid and tid default to the calling thread's)."""
+        self.spans.append({
+            'name': name,
+            'start': start,
+            'wall': wall,
+            'cpu': cpu,
+            'bytes': int(nbytes),
+            'peak_rss': int(peak_rss),
+            'peak_rss_growth': int(peak_rss_growth),
+            'pid': os.getpid() if pid is None else pid,
+            'tid': threading.get_native_id() if tid is None else tid,
+            'args': args,
+        })
+
+    def export(self) -> Dict:
+        """Spans and cProfile statistics in picklable form, for merge."""
+        stats = list(self.merged_stats)
+        if self.profile is not None:
+            self.profile.create_stats()
+            stats.append(self.profile.stats)
+        return {'spans': self.spans, 'stats': stats}
+
+    def merge(self, exported: Dict):
+        """Add the spans and cProfile statistics of another profiler's export."""
+        self.spans.extend(exported['spans'])
+        self.merged_stats.extend(exported['stats'])
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage call count and totals of wall time, CPU time and bytes, with the largest peak RSS."""
+        return summarise(self.spans)
+
+    def print_summary(self):
+        """Print the per-stage totals."""
+        print_summary(self.summary())
+
+    def chrome_trace(self) -> Dict:
+        """Spans as a Chrome trace: complete ('X') events in microseconds, with process and thread names."""
+        events = []
+        names = {}
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            args = {'cpu_s': round(span['cpu'], 6), 'bytes': span['bytes'],
+                    'peak_rss_mb': round(span['peak_rss'] / 1024**2, 1),
+                    'peak_rss_growth_mb': round(span['peak_rss_growth'] / 1024**2, 1), **span['args']}
+            events.append({'name': span['name'], 'cat': 'brigx', 'ph': 'X',
+                           'ts': span['start'] * 1e6, 'dur': span['wall'] * 1e6,
+                           'pid': span['pid'], 'tid': span['tid'], 'args': args})
+            if span['name'] == 'aligner':
+                names[(span['pid'], span['tid'])] = f"{span['args'].get('tool', 'aligner')} ({span['tid']})"
+        for pid in dict.fromkeys(span['pid'] for span in self.spans):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f'python ({pid})'}})
+        for (pid, tid), name in names.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'spans': len(self.spans)}}
+
+    def write_trace(self, path: Path):
+        """Write the Chrome trace to path."""
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def write_cprofile(self, path: Path):
+        """Write the combined cProfile statistics of every process to path (for pstats or snakeviz)."""
+        stats = pstats.Stats()
+        for raw in self.export()['stats']:
+            stats.add(types.SimpleNamespace(stats=raw, create_stats=lambda: None))
+        stats.dump_stats(path)
+
+
+def profiled(name: str, nbytes: Callable[..., int] = None):
+    """Method decorator recording each call as a span on self.profiler.
+
+    nbytes, if given, is called with the method's arguments (self
+    included) and returns the bytes the call processes.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.span(name, nbytes(self, *args, **kwargs) if nbytes else 0):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarise(spans: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Per-stage totals of spans, in order of first appearance."""
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(span['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'bytes': 0, 'peak_rss': 0})
+        stage['calls'] += 1
+        stage['wall'] += span['wall']
+        stage['cpu'] += span['cpu']
+        stage['bytes'] += span['bytes']
+        stage['peak_rss'] = max(stage['peak_rss'], span['peak_rss'])
+    return stages
+
+
+def print_summary(stages: Dict[str, Dict[str, float]]):
+    """Print per-stage totals as a table.
+
+    Spans of different processes and threads overlap, so wall times add
+    up to more than the run took.
+    """
+    print(f"\n{'='*84}")
+    print("STAGE PROFILE")
+    print(f"{'='*84}")
+    print(f"{'Stage':<20} {'Calls':>7} | {'Wall':>10} | {'CPU':>10} | {'Data':>12} | {'Peak RSS':>10}")
+    print("-"*84)
+    for name, stage in stages.items():
+        print(f"{name:<20} {stage['calls']:>7,} | {stage['wall']:>9.3f}s | {stage['cpu']:>9.3f}s | "
+              f"{stage['bytes'] / 1024**2:>9.1f} MB | {stage['peak_rss'] / 1024**2:>7.1f} MB")
+    print(f"{'='*84}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', type=Path, help='Chrome trace written by benchmark_alignment.py --trace')
+    args = parser.parse_args()
+
+    with open(args.trace) as f:
+        events = json.load(f)['traceEvents']
+    spans = [{'name': e['name'], 'wall': e['dur'] / 1e6, 'cpu': e['args']['cpu_s'], 'bytes': e['args']['bytes'],
+              'peak_rss': e['args']['peak_rss_mb'] * 1024**2} for e in events if e['ph'] == 'X']
+    print_summary(summarise(spans))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,14 @@
 """Quick benchmark of LASTZ vs BLAST on a single genome pair."""
 
 import sys
+from alignment_cache import HitCache
 from benchmark_alignment import AlignmentBenchmark
 
 def main():
     # Test on one pair: K12 vs CFT073
     ref = 'examples/E_coli_CFT073.fna'
     query = 'examples/E_coli_K12MG1655.fna'
+    hit_cache = HitCache()
     
     print("Testing LASTZ parameter configurations\n")
     
@@ -15,14 +17,14 @@ def main():
     print("="*60)
     print("TEST 1: MINIMAL LASTZ PARAMETERS (just --ambiguous=iupac)")
     print("="*60)
-    benchmark1 = AlignmentBenchmark(ref, query)
+    benchmark1 = AlignmentBenchmark(ref, query, hit_cache=hit_cache)
     result1 = benchmark1.run_benchmark(lastz_params={'ambiguous': 'iupac'})
     
     # Test 2: Current parameters
     print("\n" + "="*60)
     print("TEST 2: CURRENT PARAMETERS (optimized for speed)")
     print("="*60)
-    benchmark2 = AlignmentBenchmark(ref, query)
+    benchmark2 = AlignmentBenchmark(ref, query, hit_cache=hit_cache)
     result2 = benchmark2.run_benchmark(lastz_params={
         'ambiguous': 'iupac',
         'noentropy': True,
@@ -54,6 +56,8 @@ def main():
         print("✓ Current parameters PASS")
     else:
         print(f"✗ Current parameters FAIL ({result2['metrics']['bases_same_identity']:.2f}%)")
+    
+    print(f"\nAlignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Export precomputed rings for the BRIG app.
+
+Aligns each query against the reference (through the hit cache) and writes
+the windowed results in any of three formats:
+
+  graph   one BRIG .graph file per query: a '#start<TAB>end' line per
+          reference contig followed by 'start<TAB>end<TAB>avgIdentity'
+          lines for that contig's windows, as in examples/BRIGExample.graph
+  json    one file shaped like the app's CircularPlotData, with a RingData
+          entry (windows, hits and statistics) per query
+  binary  the same rings as little-endian typed arrays behind a short JSON
+          header, so the browser can map them straight onto Float32Array /
+          Uint32Array views instead of parsing text
+
+Windows and statistics follow aggregateToWindows and calculateStatistics in
+workers/processing.worker.ts; coverage and hit counts match the app's, while
+avgIdentity and maxIdentity can differ where hits overlap (see
+aggregate_windows). Hit coordinates are 0-based, half-open positions on
+the concatenated reference (refStart/refEnd) and on the query
+(queryStart/queryEnd), as the alignment worker produces.
+"""
+
+import argparse
+import json
+import struct
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from alignment_cache import CACHE_DIR_HELP, HitCache
+from benchmark_alignment import (HIT_DTYPE, LASTZ_PARAM_HELP, AlignmentBenchmark, ReferenceIndex, aggregate_windows,
+                                 parse_lastz_params)
+
+# Same palette as lib/controller.ts
+COLORS = [
+    '#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6',
+    '#1abc9c', '#e67e22', '#34495e', '#16a085', '#c0392b'
+]
+
+DEFAULT_WINDOW_SIZE = 1000
+
+# WindowData/AlignmentHit strand values, indexed by the stored strand code
+STRANDS = ('both', '+', '-')
+
+# Binary layout: MAGIC, uint32 version, uint32 header length, JSON header,
+# then the data section from the next ARRAY_ALIGNMENT boundary; the header
+# gives each array's offset into the data section
+MAGIC = b'BRIGRING'
+BINARY_VERSION = 1
+ARRAY_ALIGNMENT = 8
+
+WINDOW_ARRAYS = {
+    'avgIdentity': '<f4',
+    'coverage': '<f4',
+    'maxIdentity': '<f4',
+    'hitCount': '<u4',
+    'strand': 'u1',
+}
+HIT_ARRAYS = {
+    'refStart': '<u4',
+    'refEnd': '<u4',
+    'queryStart': '<u4',
+    'queryEnd': '<u4',
+    'percentIdentity': '<f4',
+    'alignmentLength': '<u4',
+    'strand': 'u1',
+}
+
+
+class Ring:
+    """One query's windowed identity and hits, ready to export.
+
+    windows is a WINDOW_DTYPE array on a grid of window_size over the
+    concatenated reference; strands and hits['strand'] hold indexes into
+    STRANDS.
+    """
+
+    def __init__(self, query_id: str, query_name: str, color: str, window_size: int,
+                 windows: np.ndarray, strands: np.ndarray, hits: Dict[str, np.ndarray]):
+        self.query_id = query_id
+        self.query_name = query_name
+        self.color = color
+        self.window_size = window_size
+        self.windows = windows
+        self.strands = strands
+        self.hits = hits
+
+    @classmethod
+    def from_identity(cls, query_id: str, query_name: str, color: str, identity_vector: np.ndarray,
+                      reference: ReferenceIndex, window_size: int, hits: np.ndarray = None) -> 'Ring':
+        """Window a per-base identity vector; hits (HIT_DTYPE) supply hit counts and strands."""
+        if hits is None:
+            hits = np.empty(0, dtype=HIT_DTYPE)
+        starts, ends = reference.hit_ranges(hits)
+        reverse = hits['strand'] < 0
+
+        windows = aggregate_windows(identity_vector, [window_size], hit_ranges=(starts, ends))[window_size]
+        plus = _overlap_counts(windows, starts[~reverse], ends[~reverse])
+        minus = _overlap_counts(windows, starts[reverse], ends[reverse])
+        # A window takes its hits' strand, or 'both' if they disagree (or there are none)
+        strands = np.zeros(len(windows), dtype=np.uint8)
+        strands[(plus > 0) & (minus == 0)] = 1
+        strands[(minus > 0) & (plus == 0)] = 2
+
+        hit_arrays = {
+            'refStart': starts,
+            'refEnd': ends,
+            'queryStart': np.minimum(hits['qstart'], hits['qend']) - 1,
+            'queryEnd': np.maximum(hits['qstart'], hits['qend']),
+            'percentIdentity': hits['pident'],
+            'alignmentLength': hits['length'],
+            'strand': np.where(reverse, 2, 1).astype(np.uint8),
+        }
+        return cls(query_id, query_name, color, window_size, windows, strands, hit_arrays)
+
+    def statistics(self, reference_length: int) -> Dict[str, float]:
+        """meanIdentity, genomeCoverage and totalAlignedBases, as calculateStatistics computes them."""
+        occupied = self.windows['hitCount'] > 0
+        windows = self.windows[occupied]
+        covered_bases = float(np.sum(windows['coverage'] * (windows['end'] - windows['start'])))
+        return {
+            'meanIdentity': float(np.mean(windows['avgIdentity'] * windows['coverage'])) if len(windows) else 0.0,
+            'genomeCoverage': covered_bases / reference_length * 100 if reference_length else 0.0,
+            'totalAlignedBases': covered_bases,
+        }
+
+    def to_json(self, reference_length: int) -> Dict:
+        """The ring as a RingData object."""
+        windows = [
+            {'start': int(w['start']), 'end': int(w['end']), 'avgIdentity': float(w['avgIdentity']),
+             'coverage': float(w['coverage']), 'hitCount': int(w['hitCount']),
+             'maxIdentity': float(w['maxIdentity']), 'strand': STRANDS[strand]}
+            for w, strand in zip(self.windows, self.strands)
+        ]
+        hits = [
+            {'queryName': self.query_name, 'refStart': int(start), 'refEnd': int(end),
+             'queryStart': int(query_start), 'queryEnd': int(query_end), 'percentIdentity': float(pident),
+             'alignmentLength': int(length), 'strand': STRANDS[strand]}
+            for start, end, query_start, query_end, pident, length, strand
+            in zip(*(self.hits[name] for name in HIT_ARRAYS))
+        ]
+        return {
+            'queryId': self.query_id,
+            'queryName': self.query_name,
+            'color': self.color,
+            'visible': True,
+            'hits': hits,
+            'windows': windows,
+            'statistics': self.statistics(reference_length),
+        }
+
+    def arrays(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """Window and hit columns in their binary dtypes."""
+        windows = {name: self.windows[name] for name in WINDOW_ARRAYS if name != 'strand'}
+        windows['strand'] = self.strands
+        return {
+            'windows': {name: np.asarray(windows[name]).astype(dtype) for name, dtype in WINDOW_ARRAYS.items()},
+            'hits': {name: np.asarray(self.hits[name]).astype(dtype) for name, dtype in HIT_ARRAYS.items()},
+        }
+
+
+def _overlap_counts(windows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Number of [start, end) ranges overlapping each window."""
+    return (np.searchsorted(np.sort(starts), windows['end'], side='left')
+            - np.searchsorted(np.sort(ends), windows['start'], side='right'))
+
+
+def plot_data(reference_name: str, reference: ReferenceIndex, window_size: int,
+              rings: List[Ring]) -> Dict:
+    """Rings wrapped in a CircularPlotData object, as the app's JSON export writes them."""
+    return {
+        'reference': {
+            'name': reference_name,
+            'length': reference.total_length,
+            'gcContent': [],
+            'gcSkew': [],
+            'features': [],
+        },
+        'rings': [ring.to_json(reference.total_length) for ring in rings],
+        'config': {
+            'windowSize': window_size,
+            'minIdentity': 0,
+            'minAlignmentLength': 0,
+        },
+    }
+
+
+def write_graph(path: Path, identity_vector: np.ndarray, reference: ReferenceIndex, window_size: int):
+    """Write avgIdentity per window in BRIG .graph format, one block per contig.
+
+    Windows restart at each contig's first base, so the last window of a
+    contig is usually short. Each contig's '#start<TAB>end' line gives its
+    0-based offset and end, except that the first starts at 1, as in
+    examples/BRIGExample.graph.
+    """
+    with open(path, 'w') as f:
+        for offset, length in zip(reference.offsets, reference.lengths):
+            offset, end = int(offset), int(offset + length)
+            windows = aggregate_windows(identity_vector[offset:end], [window_size])[window_size]
+            f.write(f"#{offset or 1}\t{end}\n")
+            for w in windows:
+                f.write(f"{offset + w['start']}\t{offset + w['end']}\t{round(float(w['avgIdentity']), 3)}\n")
+
+
+def write_binary(path: Path, reference_name: str, reference: ReferenceIndex, window_size: int,
+                 rings: List[Ring]):
+    """Write rings as typed arrays behind a JSON header (see MAGIC).
+
+    Every array starts on an ARRAY_ALIGNMENT boundary so that it can be
+    viewed in place; the header records each array's dtype, offset into
+    the data section and length. Window starts and ends are implied by
+    windowSize.
+    """
+    if reference.total_length > np.iinfo(np.uint32).max:
+        raise ValueError("Reference too long for 32-bit hit coordinates")
+
+    header = {
+        'reference': {'name': reference_name, 'length': reference.total_length},
+        'windowSize': window_size,
+        'rings': [],
+    }
+    chunks = []
+    offset = 0
+    for ring in rings:
+        layout = {}
+        for group, columns in ring.arrays().items():
+            layout[group] = {}
+            for name, array in columns.items():
+                layout[group][name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+                chunks.append(array.tobytes() + b'\0' * (_aligned(array.nbytes) - array.nbytes))
+                offset += _aligned(array.nbytes)
+        header['rings'].append({
+            'queryId': ring.query_id,
+            'queryName': ring.query_name,
+            'color': ring.color,
+            'statistics': ring.statistics(reference.total_length),
+            'arrays': layout,
+        })
+
+    header_bytes = json.dumps(header).encode()
+    prefix = MAGIC + struct.pack('<II', BINARY_VERSION, len(header_bytes)) + header_bytes
+    with open(path, 'wb') as f:
+        f.write(prefix + b'\0' * (_aligned(len(prefix)) - len(prefix)))
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def read_binary(path: Path) -> Tuple[Dict, List[Dict[str, Dict[str, np.ndarray]]]]:
+    """Read a file written by write_binary as (header, per-ring arrays)."""
+    data = Path(path).read_bytes()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a ring export")
+    version, header_length = struct.unpack_from('<II', data, len(MAGIC))
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported ring export version {version}")
+    header_start = len(MAGIC) + 8
+    header = json.loads(data[header_start:header_start + header_length])
+    data_start = _aligned(header_start + header_length)
+
+    rings = []
+    for ring in header['rings']:
+        rings.append({group: {name: np.frombuffer(data, dtype=spec['dtype'], count=spec['length'],
+                                                  offset=data_start + spec['offset'])
+                              for name, spec in columns.items()}
+                      for group, columns in ring['arrays'].items()})
+    return header, rings
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    parser.add_argument('--queries', nargs='+', default=['examples/E_coli_K12MG1655.fna'])
+    parser.add_argument('--tool', choices=('lastz', 'blast'), default='lastz')
+    parser.add_argument('--lastz-param', action='append', default=[], metavar='KEY[=VALUE]',
+                        help=LASTZ_PARAM_HELP)
+    parser.add_argument('--window-size', type=int, default=DEFAULT_WINDOW_SIZE,
+                        help=f'Window size in bp (default: {DEFAULT_WINDOW_SIZE})')
+    parser.add_argument('--formats', nargs='+', choices=('graph', 'json', 'binary'), default=['json'])
+    parser.add_argument('--output-dir', type=Path, default=Path('rings'))
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    args = parser.parse_args()
+
+    lastz_params = parse_lastz_params(args.lastz_param)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    hit_cache = HitCache(args.cache_dir)
+    reference_name = Path(args.reference).name
+
+    rings = []
+    for i, query in enumerate(args.queries):
+        benchmark = AlignmentBenchmark(args.reference, query, hit_cache=hit_cache)
+        if args.tool == 'blast':
+            identity_vector, _ = benchmark.run_blast()
+        else:
+            identity_vector, _ = benchmark.run_lastz(lastz_params)
+
+        query_name = Path(query).stem
+        rings.append(Ring.from_identity(f'ring_{i + 1}', query_name, COLORS[i % len(COLORS)], identity_vector,
+                                        benchmark.reference, args.window_size, benchmark.last_hits))
+        if 'graph' in args.formats:
+            graph_path = args.output_dir / f'{query_name}.graph'
+            write_graph(graph_path, identity_vector, benchmark.reference, args.window_size)
+            print(f"  Wrote {graph_path}")
+
+    reference = benchmark.reference
+    if 'json' in args.formats:
+        json_path = args.output_dir / 'rings.json'
+        with open(json_path, 'w') as f:
+            json.dump(plot_data(reference_name, reference, args.window_size, rings), f)
+        print(f"Wrote {len(rings)} ring(s) to {json_path} ({json_path.stat().st_size / 1024**2:.2f} MB)")
+    if 'binary' in args.formats:
+        binary_path = args.output_dir / 'rings.bin'
+        write_binary(binary_path, reference_name, reference, args.window_size, rings)
+        print(f"Wrote {len(rings)} ring(s) to {binary_path} ({binary_path.stat().st_size / 1024**2:.2f} MB)")
+    print(f"Alignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Check aggregate_windows against a brute-force port of the app's aggregateToWindows."""
+
+import numpy as np
+import pytest
+
+from benchmark_alignment import IdentityAccumulator, aggregate_windows
+
+
+def worker_windows(starts, ends, pident, length, window_size):
+    """Coverage and hitCount per window, hit by hit, as workers/processing.worker.ts computes them."""
+    n_windows = -(-length // window_size)
+    coverage = [0.0] * n_windows
+    hit_count = [0] * n_windows
+    for start, end, _ in zip(starts, ends, pident):
+        for w in range(start // window_size, min(end // window_size, n_windows - 1) + 1):
+            window_start, window_end = w * window_size, min((w + 1) * window_size, length)
+            overlap = min(window_end, end) - max(window_start, start)
+            if overlap > 0:
+                coverage[w] = min(1, coverage[w] + overlap / window_size)
+                hit_count[w] += 1
+    return np.array(coverage), np.array(hit_count)
+
+
+def random_hits(rng, length, n_hits):
+    starts = rng.integers(0, length - 1, n_hits)
+    ends = np.minimum(starts + rng.integers(1, 700, n_hits), length)
+    return starts, ends, np.round(rng.uniform(70, 100, n_hits), 3)
+
+
+@pytest.mark.parametrize('length, window_sizes', [
+    (10_000, (100, 1000)),
+    (9_871, (100, 333, 1000)),
+    (250, (1000,)),
+])
+def test_matches_worker(length, window_sizes):
+    rng = np.random.default_rng(1)
+    starts, ends, pident = random_hits(rng, length, 60)
+    accumulator = IdentityAccumulator(length)
+    accumulator.add(starts, ends, pident)
+    identity_vector, hit_count = accumulator.finish()
+
+    results = aggregate_windows(identity_vector, window_sizes, hit_ranges=(starts, ends))
+    for size in window_sizes:
+        windows = results[size]
+        coverage, counts = worker_windows(starts, ends, pident, length, size)
+        assert np.array_equal(windows['hitCount'], counts)
+        np.testing.assert_allclose(windows['coverage'], coverage, rtol=1e-6, atol=1e-6)
+        assert np.array_equal(windows['end'], np.minimum(windows['start'] + size, length))
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_identity_matches_per_base(weighted):
+    rng = np.random.default_rng(2)
+    length, size = 5_000, 100
+    starts, ends, pident = random_hits(rng, length, 40)
+    accumulator = IdentityAccumulator(length)
+    accumulator.add(starts, ends, pident)
+    identity_vector, hit_count = accumulator.finish()
+
+    windows = aggregate_windows(identity_vector, [size, 1000], hit_count=hit_count if weighted else None)[size]
+    weight = hit_count if weighted else (identity_vector > 0).astype(int)
+    for w, window_start in enumerate(range(0, length, size)):
+        values = identity_vector[window_start:window_start + size].astype(np.float64)
+        weights = weight[window_start:window_start + size]
+        expected = np.sum(values * weights) / np.sum(weights) if weights.sum() else 0
+        assert windows['avgIdentity'][w] == pytest.approx(expected, rel=1e-6)
+        assert windows['maxIdentity'][w] == pytest.approx(values.max())
+        assert windows['hitCount'][w] == 0
+        assert windows['coverage'][w] == pytest.approx(np.count_nonzero(values) / size)
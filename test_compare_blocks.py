@@ -0,0 +1,36 @@
+"""Check that compare_blocks gives the same metrics for compact and decoded identity vectors."""
+
+import numpy as np
+import pytest
+
+from benchmark_alignment import AlignmentBenchmark, CompactIdentity
+
+
+@pytest.fixture
+def benchmark(tmp_path):
+    reference = tmp_path / 'reference.fna'
+    reference.write_text('>contig1\n' + 'ACGT' * 5000 + '\n')
+    return AlignmentBenchmark(str(reference), str(reference))
+
+
+@pytest.mark.parametrize('block_size, window_sizes, region', [
+    (500, (100,), None),
+    (777, (), None),
+    (777, (), (13, 19_001)),
+])
+def test_compact_matches_float(benchmark, block_size, window_sizes, region):
+    rng = np.random.default_rng(0)
+    n = benchmark.reference_length
+    blast = np.where(rng.random(n) < 0.7, rng.uniform(80, 100, n), 0).astype(np.float32)
+    lastz = np.where(rng.random(n) < 0.7, blast + rng.normal(0, 1, n), 0).astype(np.float32)
+    lastz[lastz < 0] = 0
+
+    blast_compact, lastz_compact = CompactIdentity.from_vector(blast), CompactIdentity.from_vector(lastz)
+    assert np.abs(blast_compact.identity() - blast).max() <= 0.001 + 1e-4
+
+    kwargs = dict(window_sizes=window_sizes, region=region, block_size=block_size, hotspot_window=block_size)
+    float_metrics = benchmark.compare_blocks(blast_compact.identity(), lastz_compact.identity(), **kwargs)
+    compact_metrics = benchmark.compare_blocks(blast_compact, lastz_compact, **kwargs)
+    assert compact_metrics == float_metrics
+    vector_metrics = benchmark.compare_vectors(blast_compact, lastz_compact, window_sizes=window_sizes, region=region)
+    assert vector_metrics == pytest.approx({name: float_metrics[name] for name in vector_metrics})
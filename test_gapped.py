@@ -2,11 +2,13 @@
 """Compare BLAST vs LASTZ gapped alignment on per-base coverage."""
 
 import sys
+from alignment_cache import HitCache
 from benchmark_alignment import AlignmentBenchmark
 
 def main():
     ref = 'examples/E_coli_CFT073.fna'
     query = 'examples/E_coli_K12MG1655.fna'
+    hit_cache = HitCache()
     
     print("Per-Base Coverage Comparison: BLAST vs LASTZ\n")
     
@@ -14,7 +16,7 @@ def main():
     print("="*60)
     print("Testing: LASTZ with --gapped --chain")
     print("="*60)
-    benchmark = AlignmentBenchmark(ref, query)
+    benchmark = AlignmentBenchmark(ref, query, hit_cache=hit_cache)
     result = benchmark.run_benchmark(lastz_params={
         'ambiguous': 'iupac',
         'gapped': True,
@@ -36,6 +38,7 @@ def main():
     print(f"  BLAST: {result['blast_time']:.2f}s")
     print(f"  LASTZ: {result['lastz_time']:.2f}s")
     print(f"  Speedup: {result['speedup']:.2f}x")
+    print(f"\nAlignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
     
     print("\n" + "="*60)
     if metrics['bases_same_identity'] >= 95 and metrics['overlap_coverage'] >= 65:
@@ -0,0 +1,53 @@
+"""Check both IdentityAccumulator modes against a brute-force per-base average."""
+
+import numpy as np
+import pytest
+
+from benchmark_alignment import IdentityAccumulator
+
+
+def brute_force(starts, ends, pident, length):
+    """Mean identity and depth of every base, one hit and one base at a time."""
+    totals = [0.0] * length
+    depth = [0] * length
+    for start, end, value in zip(starts, ends, pident):
+        for base in range(max(start, 0), min(end, length)):
+            totals[base] += value
+            depth[base] += 1
+    identity = [total / count if count else 0.0 for total, count in zip(totals, depth)]
+    return np.array(identity), np.array(depth)
+
+
+@pytest.mark.parametrize('mode', IdentityAccumulator.MODES)
+def test_matches_brute_force(mode):
+    rng = np.random.default_rng(3)
+    length = 3_000
+    starts = rng.integers(0, length, 200)
+    ends = np.minimum(starts + rng.integers(1, 400, 200), length)
+    pident = np.round(rng.uniform(70, 100, 200), 3)
+
+    accumulator = IdentityAccumulator(length, mode)
+    # Added in two batches, as chunks of aligner output would be
+    accumulator.add(starts[:120], ends[:120], pident[:120])
+    accumulator.add(starts[120:], ends[120:], pident[120:])
+    identity_vector, hit_count = accumulator.finish()
+
+    expected_identity, expected_depth = brute_force(starts, ends, pident, length)
+    assert np.array_equal(hit_count, expected_depth)
+    np.testing.assert_allclose(identity_vector, expected_identity, atol=1e-4)
+
+
+def test_prefix_matches_slice():
+    rng = np.random.default_rng(4)
+    length = 20_000
+    starts = rng.integers(0, length, 1_000)
+    ends = np.minimum(starts + rng.integers(1, 2_000, 1_000), length)
+    pident = np.round(rng.uniform(70, 100, 1_000), 3)
+
+    results = {}
+    for mode in IdentityAccumulator.MODES:
+        accumulator = IdentityAccumulator(length, mode)
+        accumulator.add(starts, ends, pident)
+        results[mode] = accumulator.finish()
+    assert np.array_equal(results['slice'][1], results['prefix'][1])
+    np.testing.assert_allclose(results['slice'][0], results['prefix'][0], atol=1e-4)
@@ -0,0 +1,65 @@
+"""Check ReferenceIndex parsing and hashing against a line-by-line brute-force parse."""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+import benchmark_alignment
+from alignment_cache import file_sha256
+from benchmark_alignment import ReferenceIndex
+
+
+def brute_force(text):
+    """(name, length, GC, N, ambiguous) per contig, parsing one line at a time."""
+    contigs = [['', 0, 0, 0, 0]]
+    for line in text.split('\n'):
+        if line.startswith('>'):
+            fields = line[1:].split(maxsplit=1)
+            contigs.append([fields[0] if fields else '', 0, 0, 0, 0])
+            continue
+        for base in line:
+            if ord(base) <= ord(' '):
+                continue
+            contig = contigs[-1]
+            contig[1] += 1
+            if base in 'GCgc':
+                contig[2] += 1
+            elif base in 'Nn':
+                contig[3] += 1
+            elif base not in 'ATUatu':
+                contig[4] += 1
+    # Sequence before the first header is only a contig if it has bases
+    return contigs if contigs[0][1] else contigs[1:]
+
+
+def random_fasta(rng):
+    parts = []
+    if rng.random() < 0.3:
+        parts.append(''.join(rng.choice(list('ACGTN\n'), rng.integers(0, 30))))
+    for i in range(rng.integers(0, 6)):
+        if parts and not parts[-1].endswith('\n'):
+            parts.append('\n')
+        parts.append('>' + str(rng.choice(['', f'contig{i} description', ' spaced', 'a>b'])) + '\n')
+        parts.append(''.join(rng.choice(list('ACGTNacgtnuRY>\n \r\t'), rng.integers(0, 60))))
+    return ''.join(parts)
+
+
+@pytest.mark.parametrize('block', [1, 7, 1 << 20])
+def test_matches_brute_force(tmp_path, monkeypatch, block):
+    monkeypatch.setattr(benchmark_alignment, 'FASTA_SCAN_BLOCK', block)
+    # Scan every file, even if another block size has already indexed the same contents
+    monkeypatch.setattr(benchmark_alignment, '_reference_memo', {})
+    rng = np.random.default_rng(5)
+    for i in range(200):
+        text = random_fasta(rng)
+        path = tmp_path / f'reference{i}.fna'
+        path.write_text(text)
+        index = ReferenceIndex.from_fasta(str(path))
+        expected = brute_force(text)
+        assert list(index.names) == [contig[0] for contig in expected]
+        for field, column in (('lengths', 1), ('gc_counts', 2), ('n_counts', 3), ('ambiguous_counts', 4)):
+            assert list(getattr(index, field)) == [contig[column] for contig in expected], (text, field)
+        if expected:
+            assert list(index.offsets) == list(np.cumsum([0] + [contig[1] for contig in expected])[:-1])
+        assert file_sha256(str(path)) == hashlib.sha256(text.encode()).hexdigest()
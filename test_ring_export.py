@@ -0,0 +1,76 @@
+"""Check that ring exports read back as written."""
+
+import numpy as np
+import pytest
+
+from benchmark_alignment import HIT_DTYPE, IdentityAccumulator, ReferenceIndex
+from ring_export import HIT_ARRAYS, WINDOW_ARRAYS, Ring, read_binary, write_binary, write_graph
+
+
+@pytest.fixture
+def reference():
+    return ReferenceIndex(['contig1', 'contig2'], [7_000, 3_500])
+
+
+@pytest.fixture
+def rings(reference):
+    rng = np.random.default_rng(6)
+    rings = []
+    for i in range(2):
+        n_hits = 50
+        hits = np.zeros(n_hits, dtype=HIT_DTYPE)
+        hits['contig'] = rng.integers(0, 2, n_hits)
+        hits['sstart'] = rng.integers(1, 3_000, n_hits)
+        hits['send'] = hits['sstart'] + rng.integers(0, 500, n_hits)
+        hits['pident'] = np.round(rng.uniform(70, 100, n_hits), 3)
+        hits['length'] = hits['send'] - hits['sstart'] + 1
+        hits['qstart'] = rng.integers(1, 10_000, n_hits)
+        hits['qend'] = hits['qstart'] + hits['length'] - 1
+        hits['strand'] = rng.choice([-1, 1], n_hits)
+        reverse = hits['strand'] < 0
+        hits['qstart'][reverse], hits['qend'][reverse] = hits['qend'][reverse], hits['qstart'][reverse]
+
+        starts, ends = reference.hit_ranges(hits)
+        accumulator = IdentityAccumulator(reference.total_length)
+        accumulator.add(starts, ends, hits['pident'])
+        identity_vector, _ = accumulator.finish()
+        rings.append(Ring.from_identity(f'ring_{i + 1}', f'query{i + 1}', '#e74c3c', identity_vector,
+                                        reference, 1000, hits))
+    return rings
+
+
+def test_binary_round_trip(tmp_path, reference, rings):
+    path = tmp_path / 'rings.bin'
+    write_binary(path, 'reference.fna', reference, 1000, rings)
+    header, arrays = read_binary(path)
+
+    assert header['reference'] == {'name': 'reference.fna', 'length': reference.total_length}
+    assert header['windowSize'] == 1000
+    assert [ring['queryId'] for ring in header['rings']] == ['ring_1', 'ring_2']
+    for ring, ring_header, ring_arrays in zip(rings, header['rings'], arrays):
+        assert ring_header['statistics'] == ring.statistics(reference.total_length)
+        expected = ring.arrays()
+        for group, names in (('windows', WINDOW_ARRAYS), ('hits', HIT_ARRAYS)):
+            assert list(ring_arrays[group]) == list(names)
+            for name, dtype in names.items():
+                assert ring_arrays[group][name].dtype == np.dtype(dtype)
+                assert np.array_equal(ring_arrays[group][name], expected[group][name])
+
+
+def test_hits_match_json(reference, rings):
+    ring = rings[0]
+    hits = ring.to_json(reference.total_length)['hits']
+    assert len(hits) == 50
+    for hit in hits:
+        assert hit['refStart'] < hit['refEnd'] and hit['queryStart'] < hit['queryEnd']
+        assert hit['refEnd'] - hit['refStart'] == hit['queryEnd'] - hit['queryStart'] == hit['alignmentLength']
+        assert hit['strand'] in ('+', '-')
+
+
+def test_graph_headers(tmp_path, reference):
+    path = tmp_path / 'query.graph'
+    identity_vector = np.full(reference.total_length, 90, dtype=np.float32)
+    write_graph(path, identity_vector, reference, 1000)
+    headers = [line for line in path.read_text().splitlines() if line.startswith('#')]
+    # As in examples/BRIGExample.graph, the first header starts at 1 and later ones at the contig offset
+    assert headers == ['#1\t7000', '#7000\t10500']
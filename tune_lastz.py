@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Search LASTZ parameters for the fastest settings that still match BLAST.
+
+Candidates (combinations of seed, step, gapped, chain and hspthresh) are
+scored with successive halving: every candidate is first aligned against a
+small region in the middle of the reference, and only the best 1/eta of
+them are promoted to the next, eta times larger region, until the
+survivors are aligned against the whole reference. Regions are nested, so
+a candidate's score on one rung stays comparable with the next. Regions
+are LASTZ [subrange]s, which only apply to a single sequence, so the
+reference must have exactly one contig.
+
+Candidates that reach the target bases_same_identity are ranked by
+runtime; the rest are ranked below them by identity. The BLAST baseline
+and every LASTZ run go through the hit cache, so repeating or extending a
+search only pays for alignments that have not been run before.
+"""
+
+import argparse
+import itertools
+import math
+import random
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from alignment_cache import CACHE_DIR_HELP, BlastDbCache, HitCache
+from benchmark_alignment import SIMILARITY_TARGET, AlignmentBenchmark
+
+# Values explored for each LASTZ option
+SEARCH_SPACE = {
+    'seed': ['12of19', '14of22', 'match12', 'match15'],
+    'step': [1, 10, 20],
+    'gapped': [True, False],
+    'chain': [True, False],
+    'hspthresh': [3000, 4500, 6000],
+}
+
+
+def candidate_params(seed: str, step: int, gapped: bool, chain: bool, hspthresh: int) -> Dict[str, str]:
+    """Turn one point of SEARCH_SPACE into run_lastz parameters."""
+    params = {'seed': seed, 'step': str(step), 'hspthresh': str(hspthresh)}
+    params['gapped' if gapped else 'nogapped'] = True
+    if chain:
+        params['chain'] = True
+    return params
+
+
+def candidate_label(params: Dict[str, str]) -> str:
+    """Short, fixed-order description of a candidate."""
+    return (f"seed={params['seed']} step={params['step']} "
+            f"{'gapped' if 'gapped' in params else 'nogapped'} "
+            f"{'chain' if 'chain' in params else 'nochain'} hspthresh={params['hspthresh']}")
+
+
+def rung_fractions(eta: int, min_fraction: float) -> List[float]:
+    """Fractions of the reference aligned on each rung, ending with the whole reference."""
+    rungs = max(0, round(math.log(1 / min_fraction, eta)))
+    return [eta ** -(rungs - i) for i in range(rungs + 1)]
+
+
+def rung_region(reference_length: int, fraction: float) -> Tuple[int, int]:
+    """Centred 0-based, half-open region covering fraction of the reference (None for all of it)."""
+    if fraction >= 1:
+        return None
+    size = max(1, int(reference_length * fraction))
+    start = (reference_length - size) // 2
+    return start, start + size
+
+
+def rank_key(result: Dict, target: float) -> Tuple:
+    """Sort key: candidates meeting target first (fastest first), then the rest by identity."""
+    if result['same_identity'] >= target:
+        return (0, result['runtime'])
+    return (1, -result['same_identity'])
+
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+    """Results not beaten on both runtime and bases_same_identity, fastest first."""
+    front = []
+    for result in sorted(results, key=lambda r: (r['runtime'], -r['same_identity'])):
+        if not front or result['same_identity'] > front[-1]['same_identity']:
+            front.append(result)
+    return front
+
+
+def evaluate(benchmark: AlignmentBenchmark, blast_vector, params: Dict[str, str],
+             region: Tuple[int, int]) -> Dict:
+    """Align one candidate on region and score it against the BLAST baseline."""
+    lastz_vector, runtime = benchmark.run_lastz(params, region=region)
+    metrics = benchmark.compare_vectors(blast_vector, lastz_vector, window_sizes=(), region=region)
+    return {
+        'label': candidate_label(params),
+        'params': params,
+        'runtime': runtime,
+        'same_identity': metrics['bases_same_identity'],
+        'coverage': metrics['lastz_coverage'],
+        'blast_coverage': metrics['blast_coverage'],
+    }
+
+
+def print_rung(rung: int, region: Tuple[int, int], results: List[Dict], promoted: int, target: float):
+    """Print one rung's candidates in rank order, marking those promoted."""
+    where = f"{region[0]:,}-{region[1]:,}" if region else "whole reference"
+    print(f"\n{'='*100}")
+    print(f"RUNG {rung}: {len(results)} candidate(s) on {where}")
+    print(f"{'='*100}")
+    print(f"{'':2}{'Candidate':<55} | {'Runtime':>9} | {'Same ID':>8} | {'Coverage':>8}")
+    print("-"*100)
+    for i, result in enumerate(results):
+        mark = '*' if i < promoted else ' '
+        hit = '+' if result['same_identity'] >= target else ' '
+        print(f"{mark}{hit}{result['label']:<55} | {result['runtime']:>8.2f}s | "
+              f"{result['same_identity']:>7.2f}% | {result['coverage']:>7.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reference', default='examples/E_coli_CFT073.fna')
+    parser.add_argument('--query', default='examples/E_coli_K12MG1655.fna')
+    parser.add_argument('--candidates', type=int, default=None,
+                        help='Randomly sample this many candidates from the search space (default: all)')
+    parser.add_argument('--eta', type=int, default=3,
+                        help='Keep 1/eta of the candidates on each rung and grow the region eta-fold (default: 3)')
+    parser.add_argument('--min-fraction', type=float, default=1/27,
+                        help='Fraction of the reference aligned on the first rung (default: 1/27)')
+    parser.add_argument('--finalists', type=int, default=3,
+                        help='Never promote fewer than this many candidates (default: 3)')
+    parser.add_argument('--target', type=float, default=SIMILARITY_TARGET,
+                        help=f'bases_same_identity to reach, in percent (default: {SIMILARITY_TARGET})')
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--cache-dir', type=Path, default=None, help=CACHE_DIR_HELP)
+    args = parser.parse_args()
+
+    candidates = [candidate_params(*values) for values in itertools.product(*SEARCH_SPACE.values())]
+    if args.candidates and args.candidates < len(candidates):
+        candidates = random.Random(args.random_seed).sample(candidates, args.candidates)
+
+    hit_cache = HitCache(args.cache_dir)
+    benchmark = AlignmentBenchmark(args.reference, args.query,
+                                   db_cache=BlastDbCache(args.cache_dir), hit_cache=hit_cache)
+    if len(benchmark.reference) != 1:
+        # run_lastz would align the whole reference on every rung, so the halving saves nothing
+        parser.error(f"{args.reference} has {len(benchmark.reference)} contigs; rung regions are "
+                     f"LASTZ [subrange]s, which need a single-sequence reference")
+
+    print(f"Tuning LASTZ: {benchmark.query_file.name} vs {benchmark.reference_file.name}")
+    print(f"Reference length: {benchmark.reference_length:,} bp")
+    print(f"Candidates: {len(candidates)} | eta: {args.eta} | target: {args.target:.1f}% same identity\n")
+
+    blast_vector, blast_time = benchmark.run_blast()
+
+    sampled = len(candidates)
+    budget = 0.0  # Work spent, in whole-reference LASTZ runs
+    results = []
+    fractions = rung_fractions(args.eta, args.min_fraction)
+    for rung, fraction in enumerate(fractions):
+        region = rung_region(benchmark.reference_length, fraction)
+        results = []
+        for params in candidates:
+            try:
+                results.append(evaluate(benchmark, blast_vector, params, region))
+            except subprocess.CalledProcessError:
+                print(f"  Dropping {candidate_label(params)}")
+        budget += len(candidates) * fraction
+        results.sort(key=lambda r: rank_key(r, args.target))
+
+        final = rung == len(fractions) - 1
+        promoted = 0 if final else max(args.finalists, math.ceil(len(results) / args.eta))
+        print_rung(rung, region, results, promoted, args.target)
+        candidates = [r['params'] for r in results[:promoted]]
+
+    print(f"\n{'='*100}")
+    print("PARETO FRONT (whole reference, runtime vs bases_same_identity)")
+    print(f"{'='*100}")
+    print(f"BLAST baseline: {blast_time:.2f}s")
+    print(f"{'Candidate':<57} | {'Runtime':>9} | {'Speedup':>8} | {'Same ID':>8}")
+    print("-"*100)
+    for result in pareto_front(results):
+        hit = '+' if result['same_identity'] >= args.target else ' '
+        print(f"{hit}{result['label']:<56} | {result['runtime']:>8.2f}s | "
+              f"{blast_time / result['runtime']:>7.2f}x | {result['same_identity']:>7.2f}%")
+
+    passing = [r for r in results if r['same_identity'] >= args.target]
+    print()
+    if passing:
+        best = min(passing, key=lambda r: r['runtime'])
+        print(f"Fastest meeting {args.target:.1f}%: {best['label']}")
+        print(f"  {best['runtime']:.2f}s ({blast_time / best['runtime']:.2f}x BLAST), "
+              f"{best['same_identity']:.2f}% same identity")
+        print(f"  Parameters: {best['params']}")
+    elif results:
+        best = max(results, key=lambda r: r['same_identity'])
+        print(f"No candidate reached {args.target:.1f}%; closest: {best['label']} "
+              f"({best['same_identity']:.2f}%)")
+
+    print(f"\nLASTZ work: {budget:.1f} whole-reference run(s), against {sampled} "
+          f"for running every candidate on the whole reference")
+    print(f"Alignment cache: {hit_cache.hits} hit(s), {hit_cache.misses} miss(es)")
+
+
+if __name__ == '__main__':
+    main()